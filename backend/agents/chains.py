@@ -1,22 +1,131 @@
-from typing import Union
+import logging
+from typing import Any, List, Union
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.language_models import BaseChatModel
-from langchain_core.runnables import Runnable
-from langchain.output_parsers import PydanticOutputParser
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda, RunnableParallel
+from pydantic import ValidationError
 
-from utils.helpers import get_chat_model
+from utils.helpers import get_chat_model, with_temperature
+from utils.jsonrepair import TolerantPydanticOutputParser
+from utils.prompt_cache import prefixed_prompt
+from utils.provider_cache import provider_prefix_cache, with_prefix_cache
+from utils.resilience import parse_with_repair, repair_model, supports_n
 from utils.schemas import Code, CodeAnalysis, TestCodeEvaluation
+from utils.singleflight import digest, model_fingerprint, single_flight
+from utils.usage import RequestAborted, usage_handler
 from . import prompts
 
+logger = logging.getLogger(__name__)
+
+
+def with_usage(chain: Runnable) -> Runnable:
+    """
+    Attaches the shared usage-accounting callback so token usage of the chain is recorded.
+    """
+    return chain.with_config(callbacks=[usage_handler])
+
+
+def coalesced(runnable: Runnable, model: BaseChatModel, name: str) -> Runnable:
+    """
+    Shares one in-flight call among identical concurrent invocations of the chain
+    step (same chain, model, temperature and rendered prompt).
+    """
+    fingerprint = model_fingerprint(model)
+    return single_flight(runnable, key=lambda prompt_value: digest(name, fingerprint, prompt_value.to_string()), name=name)
+
 
 def create_code_gen_chain(model: Union[str, BaseChatModel], temperature: float = 0.0) -> Runnable:
     """
     Creates a LangChain Runnable for code generation returning a structured Code object.
+    The instructions and documentation are a cacheable system prefix; `extra_context`
+    (documentation that is not pinned, see `utils.pinned_docs`) is optional.
+    Models with explicit provider caching answer in JSON text, since a cached
+    request cannot carry tools.
     """
     if isinstance(model, str):
         model = get_chat_model(model, temperature)
-    prompt = ChatPromptTemplate.from_template(prompts.CODE_GEN_TEMPLATE)
-    return prompt | model.with_structured_output(Code)
+    if provider_prefix_cache.supports(model):
+        parser = TolerantPydanticOutputParser(pydantic_object=Code)
+        prompt = prefixed_prompt(
+            prompts.CODE_GEN_JSON_PREFIX, prompts.CODE_GEN_SUFFIX,
+            extra_context="", format_instructions=parser.get_format_instructions(),
+        )
+        return with_usage(prompt | coalesced(with_prefix_cache(model) | parse_with_repair(parser, repair_model(model)), model, "code_gen"))
+    prompt = prefixed_prompt(prompts.CODE_GEN_PREFIX, prompts.CODE_GEN_SUFFIX, extra_context="")
+    return with_usage(prompt | coalesced(model.with_structured_output(Code), model, "code_gen"))
+
+
+def tolerate_failure(runnable: Runnable, name: str) -> Runnable:
+    """
+    Returns None instead of raising (the failure is logged), so one failed branch
+    does not fail its siblings. An exhausted token budget or a cancelled request
+    still raises.
+    """
+    def invoke(value: Any, config: RunnableConfig) -> Any:
+        try:
+            return runnable.invoke(value, config)
+        except RequestAborted:
+            raise
+        except Exception:
+            logger.warning("%s failed", name, exc_info=True)
+            return None
+
+    async def ainvoke(value: Any, config: RunnableConfig) -> Any:
+        try:
+            return await runnable.ainvoke(value, config)
+        except RequestAborted:
+            raise
+        except Exception:
+            logger.warning("%s failed", name, exc_info=True)
+            return None
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=name)
+
+
+def _codes_from_generations(generations) -> List[Code]:
+    codes = []
+    for generation in generations:
+        for call in getattr(generation.message, "tool_calls", None) or []:
+            try:
+                codes.append(Code.model_validate(call["args"]))
+            except ValidationError:
+                pass
+    return codes
+
+
+def _multi_candidate_call(model: BaseChatModel, n: int) -> Runnable:
+    """One request returning `n` completions, for models with an `n` parameter (see `supports_n`)."""
+    multi = model.model_copy(update={"n": n})
+    tool_kwargs = multi.bind_tools([Code], tool_choice="Code").kwargs
+
+    def invoke(prompt_value: PromptValue, config: RunnableConfig) -> List[Code]:
+        result = multi.generate_prompt([prompt_value], callbacks=config.get("callbacks"), **tool_kwargs)
+        return _codes_from_generations(result.generations[0])
+
+    async def ainvoke(prompt_value: PromptValue, config: RunnableConfig) -> List[Code]:
+        result = await multi.agenerate_prompt([prompt_value], callbacks=config.get("callbacks"), **tool_kwargs)
+        return _codes_from_generations(result.generations[0])
+
+    return RunnableLambda(invoke, afunc=ainvoke, name="code_candidates")
+
+
+def create_code_candidates_chain(model: Union[str, BaseChatModel], n: int = 3, temperature: float = 0.7) -> Runnable:
+    """
+    Creates a chain returning up to `n` Code candidates for the code generation inputs.
+    Models with an `n` parameter (a resilient model passes it to the models it wraps)
+    produce all candidates in one call; others are called `n` times concurrently. Candidates that fail to generate are dropped.
+    """
+    model = get_chat_model(model, temperature) if isinstance(model, str) else with_temperature(model, temperature)
+    prompt = prefixed_prompt(prompts.CODE_GEN_PREFIX, prompts.CODE_GEN_SUFFIX, extra_context="")
+    if supports_n(model):
+        return with_usage(prompt | coalesced(_multi_candidate_call(model, n), model, "code_candidates"))
+    branches = {
+        str(i): tolerate_failure(coalesced(model.with_structured_output(Code), model, f"code_candidate_{i}"), f"candidate_{i}")
+        for i in range(n)
+    }
+    collect = RunnableLambda(lambda results: [code for code in results.values() if code is not None], name="collect_candidates")
+    return with_usage(prompt | RunnableParallel(branches) | collect)
 
 
 def create_routing_chain(model: str|BaseChatModel, actions_descriptions: str) -> Runnable:
@@ -28,17 +137,19 @@ def create_routing_chain(model: str|BaseChatModel, actions_descriptions: str) ->
     prompt = ChatPromptTemplate.from_template(prompts.ROUTER_TEMPLATE).partial(
         actions_descriptions=actions_descriptions
     )
-    return prompt | model
+    return with_usage(prompt | coalesced(model, model, "routing"))
 
 
 def create_code_analysis_chain(model: str|BaseChatModel, temperature: float = 0.0) -> Runnable:
     """
     Creates a chain that analyzes code and returns a CodeAnalysis object.
+    Damaged JSON is repaired locally; only output that still does not parse is sent
+    once to the cheapest model for repair.
     """
     if isinstance(model, str):
         model = get_chat_model(model, temperature)
-    prompt = ChatPromptTemplate.from_template(prompts.CODE_ANALYSIS_TEMPLATE)
-    return prompt | model | PydanticOutputParser(pydantic_object=CodeAnalysis)
+    prompt = prefixed_prompt(prompts.CODE_ANALYSIS_PREFIX, prompts.CODE_ANALYSIS_SUFFIX)
+    return with_usage(prompt | coalesced(with_prefix_cache(model) | parse_with_repair(TolerantPydanticOutputParser(pydantic_object=CodeAnalysis), repair_model(model)), model, "code_analysis"))
 
 
 def create_test_generation_chain(model: str|BaseChatModel, temperature: float = 0.0) -> Runnable:
@@ -47,18 +158,24 @@ def create_test_generation_chain(model: str|BaseChatModel, temperature: float =
     """
     if isinstance(model, str):
         model = get_chat_model(model, temperature)
-    prompt = ChatPromptTemplate.from_template(prompts.TEST_GENERATION_TEMPLATE)
-    return prompt | model
+    prompt = prefixed_prompt(prompts.TEST_GENERATION_PREFIX, prompts.TEST_GENERATION_SUFFIX)
+    return with_usage(prompt | coalesced(with_prefix_cache(model), model, "test_generation"))
 
 
-def create_evaluation_chain(model: str|BaseChatModel, temperature: float = 0.0) -> Runnable:
+def create_evaluation_chain(model: str|BaseChatModel, temperature: float = 0.0, compact: bool = False) -> Runnable:
     """
     Creates a chain that evaluates generated tests and outputs a TestCodeEvaluation object.
+    Damaged JSON is repaired locally; only output that still does not parse is sent
+    once to the cheapest model for repair.
+    With compact=True it takes the inputs built by `utils.compaction.evaluation_inputs`.
     """
     if isinstance(model, str):
         model = get_chat_model(model, temperature)
-    prompt = ChatPromptTemplate.from_template(prompts.EVALUATION_TEMPLATE)
-    return prompt | model | PydanticOutputParser(pydantic_object=TestCodeEvaluation)
+    if compact:
+        prompt = prefixed_prompt(prompts.COMPACT_EVALUATION_PREFIX, prompts.COMPACT_EVALUATION_SUFFIX)
+    else:
+        prompt = prefixed_prompt(prompts.EVALUATION_PREFIX, prompts.EVALUATION_SUFFIX)
+    return with_usage(prompt | coalesced(with_prefix_cache(model) | parse_with_repair(TolerantPydanticOutputParser(pydantic_object=TestCodeEvaluation), repair_model(model)), model, "evaluation"))
 
 
 def create_extract_code_chain(model: str|BaseChatModel, temperature: float = 0.0) -> Runnable:
@@ -68,7 +185,7 @@ def create_extract_code_chain(model: str|BaseChatModel, temperature: float = 0.0
     if isinstance(model, str):
         model = get_chat_model(model, temperature)
     prompt = ChatPromptTemplate.from_template(prompts.CODE_EXTRACTION_TEMPLATE)
-    return prompt | model
+    return with_usage(prompt | coalesced(model, model, "extract_code"))
 
 def create_synthesis_chain(model: str|BaseChatModel, temperature: float = 0.0) -> Runnable:
     """
@@ -76,5 +193,5 @@ def create_synthesis_chain(model: str|BaseChatModel, temperature: float = 0.0) -
     """
     if isinstance(model, str):
         model = get_chat_model(model, temperature)
-    prompt = ChatPromptTemplate.from_template(prompts.SYNTHESIS_TEMPLATE)
-    return prompt | model
\ No newline at end of file
+    prompt = prefixed_prompt(prompts.SYNTHESIS_PREFIX, prompts.SYNTHESIS_SUFFIX)
+    return with_usage(prompt | coalesced(with_prefix_cache(model), model, "synthesis"))
\ No newline at end of file
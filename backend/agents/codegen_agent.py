@@ -1,17 +1,23 @@
 # ----- IMPORTS -----
 import ast
-from typing import List
+from typing import List, Optional, Sequence
 
 from dotenv import load_dotenv, find_dotenv
 from langgraph.graph import StateGraph, END
 from langchain_core.documents import Document
 from langchain.schema.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.language_models import BaseChatModel
-
-from utils.schemas import Code, FlowStep
-from utils.helpers import get_chat_model
+from langchain_core.runnables import RunnableConfig
+
+from utils.artifacts import get_artifact_store
+from utils.codecheck import SMOKE_RUN_ENABLED, rank_candidates
+from utils.schemas import Code, FlowStep, RetrievalConfig
+from utils.helpers import get_chat_model, retrieve_documents
+from utils.pinned_docs import pinned_docs
+from utils.tracing import timed_step
 from .states import CodeGenState
-from .chains import create_code_gen_chain
+from .chains import create_code_candidates_chain, create_code_gen_chain
+from .prompts import CODE_GEN_EXTRA_CONTEXT
 
 # ----- ENV SETUP -----
 load_dotenv(find_dotenv())
@@ -22,53 +28,136 @@ EMPTY_DOC = Document(page_content="No documentation")
 AGENT_NAME = "codegen_agent"
 
 # ----- NODE FUNCTIONS -----
-def retrieve_node(state: CodeGenState, retriever) -> dict:
+def resolve_framework(config: RunnableConfig, framework: str) -> str:
+    """Per-request framework from `configurable`, falling back to the graph default."""
+    return config.get("configurable", {}).get("framework") or framework
+
+
+def resolve_tenant(config: RunnableConfig) -> Optional[str]:
+    return config.get("configurable", {}).get("tenant")
+
+
+@timed_step
+def retrieve_node(state: CodeGenState, config: RunnableConfig, retriever, framework: str, retrieval: RetrievalConfig) -> dict:
     query = state["messages"][0].content if state["messages"] else ""
+    configurable = config.get("configurable", {})
+    settings = configurable.get("retrieval") or retrieval
+    if isinstance(settings, dict):
+        settings = RetrievalConfig(**settings)
     docs = [EMPTY_DOC]
     if query:
+        framework, tenant = resolve_framework(config, framework), resolve_tenant(config)
         try:
-            docs = retriever.invoke(query)
+            docs = retrieve_documents(
+                retriever, query, settings, framework, tenant, framework_requested=bool(configurable.get("framework"))
+            ) or [EMPTY_DOC]
         except Exception:
             pass
-    return {"documentation": docs, "flow": [FlowStep(step="retrieve", agent = AGENT_NAME)]}
+        if docs != [EMPTY_DOC]:
+            pinned_docs.record(framework, docs, tenant)
+    return {"documentation": get_artifact_store().put(docs), "flow": [FlowStep(step="retrieve", agent = AGENT_NAME)]}
+
+
+def documentation_inputs(docs: Sequence[Document], framework: str, tenant: Optional[str] = None) -> dict:
+    """
+    `context` (part of the cached prompt prefix) and `extra_context` prompt inputs.
+    Without pinning (the default) `context` is the retrieved documentation; with
+    pinning it is the framework's pinned documentation and `extra_context` holds
+    the retrieved documentation that is not pinned.
+    """
+    context, extra = pinned_docs.split(framework, docs, tenant)
+    return {
+        "context": context,
+        "extra_context": CODE_GEN_EXTRA_CONTEXT.format(documentation=extra) if extra else "",
+    }
+
 
+def documentation_context(state: CodeGenState, framework: str, tenant: Optional[str] = None) -> dict:
+    ref = state.get("documentation")
+    return documentation_inputs(get_artifact_store().get(ref) if ref else [], framework, tenant)
 
-def generate_node(state: CodeGenState, chain, framework: str) -> dict:
-    messages = list(state["messages"])
-    if state.get("error"):
-        messages.append(HumanMessage(content="Now, try again..."))
 
-    docs = "\n".join(doc.page_content for doc in state.get("documentation", []))
-    result: Code = chain.invoke({"context": docs, "question": messages, "framework": framework})
-    messages.append(AIMessage(content=f"{result.prefix}\nImports:\n{result.imports}\nCode:\n{result.code}"))
+@timed_step
+def generate_node(state: CodeGenState, chain, framework: str, tenant: Optional[str] = None) -> dict:
+    # Only new messages are returned; the messages reducer appends them.
+    new_messages = [HumanMessage(content="Now, try again...")] if state.get("error") else []
+    result: Code = chain.invoke({
+        **documentation_context(state, framework, tenant),
+        "question": list(state["messages"]) + new_messages,
+        "framework": framework,
+    })
+    new_messages.append(AIMessage(content=f"{result.prefix}\nImports:\n{result.imports}\nCode:\n{result.code}"))
 
     return {
-        "generation": [result],
-        "messages": messages,
+        "generation": [get_artifact_store().put(result)],
+        "code_check": None,
+        "messages": new_messages,
         "iterations": state.get("iterations", 0) + 1,
         "flow": [FlowStep(step="generate", agent = AGENT_NAME)]
     }
 
 
+@timed_step
+def generate_candidates_node(state: CodeGenState, chain, framework: str, smoke: bool, tenant: Optional[str] = None) -> dict:
+    """
+    Generates several candidates concurrently and keeps the best by local validation.
+    If none is valid, check_code sends the best one into the serial reflect loop.
+    """
+    candidates: List[Code] = chain.invoke({
+        **documentation_context(state, framework, tenant),
+        "question": state["messages"],
+        "framework": framework,
+    })
+    ranked = rank_candidates(candidates, smoke)
+    if not ranked:
+        return {
+            "iterations": state.get("iterations", 0) + 1,
+            "flow": [FlowStep(step="generate_candidates: none generated", agent = AGENT_NAME)]
+        }
+    best, check = ranked[0]
+    valid = sum(1 for _, c in ranked if c.ok)
+    return {
+        "generation": [get_artifact_store().put(best)],
+        "code_check": check,
+        "messages": [AIMessage(content=f"{best.prefix}\nImports:\n{best.imports}\nCode:\n{best.code}")],
+        "iterations": state.get("iterations", 0) + 1,
+        "flow": [FlowStep(step=f"generate_candidates: {valid}/{len(candidates)} valid", agent = AGENT_NAME)]
+    }
+
+
+@timed_step
 def check_code_node(state: CodeGenState) -> dict:
     generations = state.get("generation", [])
     if not generations:
         return {
-            "messages": state["messages"] + [SystemMessage(content="No generation")],
+            "messages": [SystemMessage(content="No generation")],
             "error": True,
             "flow": [FlowStep(step="check_code: no-generation error", agent = AGENT_NAME)]
             
         }
 
+    # A swept generation raises ArtifactNotFound: it is not a format error and
+    # regenerating cannot bring back the documentation it was built from.
+    raw = get_artifact_store().get(generations[-1])
     try:
-        code: Code = Code.model_validate(generations[-1])
+        code: Code = Code.model_validate(raw)
     except Exception:
         return {
-            "messages": state["messages"] + [SystemMessage(content="Invalid format")],
+            "messages": [SystemMessage(content="Invalid format")],
             "error": True,
             "flow": [FlowStep(step="check_code: invalid-format error", agent = AGENT_NAME)]
         }
 
+    # A ranked candidate was already checked beyond parsing; a failed smoke run
+    # sends it into the reflect loop like a syntax error.
+    check = state.get("code_check")
+    if check is not None and not check.ok:
+        return {
+            "messages": [HumanMessage(content=f"The code failed local validation:\n{check.error}")],
+            "error": True,
+            "flow": [FlowStep(step="check_code: validation error", agent = AGENT_NAME)]
+        }
+
     full_code = f"{code.imports}\n{code.code}"
     try:
         ast.parse(full_code)
@@ -79,21 +168,21 @@ def check_code_node(state: CodeGenState) -> dict:
             f"```python\n{e.text.strip() if e.text else ''}```"
         )
         return {
-            "messages": state["messages"] + [HumanMessage(content=msg)],
+            "messages": [HumanMessage(content=msg)],
             "error": True,
             "flow": [FlowStep(step="check_code:syntax error", agent = AGENT_NAME)]
         }
 
 
-def reflect_node(state: CodeGenState, chain, framework: str) -> dict:
-    docs = "\n".join(doc.page_content for doc in state.get("documentation", []))
+@timed_step
+def reflect_node(state: CodeGenState, chain, framework: str, tenant: Optional[str] = None) -> dict:
     result: Code = chain.invoke({
-        "context": docs,
+        **documentation_context(state, framework, tenant),
         "question": state["messages"],
         "framework": framework
     })
     return {
-        "messages": state["messages"] + [AIMessage(content=f"Reflection: {result.prefix}")],
+        "messages": [AIMessage(content=f"Reflection: {result.prefix}")],
         "flow":[FlowStep(step="reflect", agent = AGENT_NAME)]
     }
 
@@ -105,19 +194,48 @@ def decide_next_node(state: CodeGenState, max_iter: int, reflect: bool) -> str:
 
 
 # ----- GRAPH BUILD FUNCTION -----
-def build_codegen_graph(retriever, code_gen_model: str|BaseChatModel, framework: str = "python", max_iter: int = 3, enable_reflect: bool = True):
+def build_codegen_graph(
+    retriever,
+    code_gen_model: str|BaseChatModel,
+    framework: str = "python",
+    max_iter: int = 3,
+    enable_reflect: bool = True,
+    retrieval: Optional[RetrievalConfig] = None,
+    candidates: int = 1,
+    candidate_temperature: float = 0.7,
+    smoke_run: bool = SMOKE_RUN_ENABLED
+):
+    """
+    With candidates > 1 the first attempt generates that many candidates
+    concurrently and keeps the best after local validation (AST parse, import
+    check and, with smoke_run, a run of the code); the generate/reflect loop
+    is only entered when no candidate is valid.
+    """
     codegen_chain = create_code_gen_chain(model = code_gen_model)
+    retrieval = retrieval or RetrievalConfig()
     builder = StateGraph(CodeGenState)
 
     # Add nodes
-    builder.add_node("retrieve", lambda s: retrieve_node(s, retriever))
-    builder.add_node("generate", lambda s: generate_node(s, codegen_chain, framework))
+    builder.add_node("retrieve", lambda s, config: retrieve_node(s, config, retriever, framework, retrieval))
+    builder.add_node("generate", lambda s, config: generate_node(
+        s, codegen_chain, resolve_framework(config, framework), resolve_tenant(config)
+    ))
     builder.add_node("check_code", check_code_node)
-    builder.add_node("reflect", lambda s: reflect_node(s, codegen_chain, framework))
+    builder.add_node("reflect", lambda s, config: reflect_node(
+        s, codegen_chain, resolve_framework(config, framework), resolve_tenant(config)
+    ))
+    first_attempt = "generate"
+    if candidates > 1:
+        candidates_chain = create_code_candidates_chain(code_gen_model, candidates, candidate_temperature)
+        builder.add_node("generate_candidates", lambda s, config: generate_candidates_node(
+            s, candidates_chain, resolve_framework(config, framework), smoke_run, resolve_tenant(config)
+        ))
+        builder.add_edge("generate_candidates", "check_code")
+        first_attempt = "generate_candidates"
 
     # Set graph edges
     builder.set_entry_point("retrieve")
-    builder.add_edge("retrieve", "generate")
+    builder.add_edge("retrieve", first_attempt)
     builder.add_edge("generate", "check_code")
     builder.add_conditional_edges(
         "check_code",
@@ -130,4 +248,4 @@ def build_codegen_graph(retriever, code_gen_model: str|BaseChatModel, framework:
     )
     builder.add_edge("reflect", "generate")
 
-    return builder.compile("codegen_agent")
+    return builder.compile(name="codegen_agent")
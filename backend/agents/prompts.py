@@ -1,4 +1,9 @@
-CODE_GEN_TEMPLATE = """ 
+# Prompts used by several calls are split into a stable PREFIX, sent as the system
+# message, and a per-request SUFFIX. Keeping the prefix first and byte-identical
+# across requests lets providers serve it from their prompt/context caches.
+# Each *_TEMPLATE is the single-message form (PREFIX + SUFFIX).
+
+CODE_GEN_PREFIX = """ 
 You are a coding assistant with expertise in {framework}. 
 Here is a full set of {framework} documentation: 
 {context}
@@ -8,8 +13,22 @@ Answer the user question based on the above provided documentation.
 Ensure any code you provide can be executed with all required imports and variables defined. 
 Structure your answer with a description of the code solution. 
 Then list the imports. And finally list the functioning code block. 
-Here is the user question:
+"""
+CODE_GEN_SUFFIX = """{extra_context}Here is the user question:
 {question}
+"""
+CODE_GEN_TEMPLATE = CODE_GEN_PREFIX + CODE_GEN_SUFFIX
+# For models answering in JSON text instead of a tool call: explicit provider
+# context caches cannot be combined with tools.
+CODE_GEN_JSON_PREFIX = CODE_GEN_PREFIX + """Respond only with the JSON object described below.
+{format_instructions}
+"""
+
+# Retrieved documentation that is not part of the pinned prefix documentation.
+CODE_GEN_EXTRA_CONTEXT = """Additional documentation for this question:
+{documentation}
+---
+
 """
 
 REFLECT_TEMPLATE = """
@@ -35,7 +54,7 @@ CODE_EXTRACTION_TEMPLATE = """Extract all code snippets from the following messa
 The Message:
 {message}
 """
-CODE_ANALYSIS_TEMPLATE = """
+CODE_ANALYSIS_PREFIX = """
 You are an expert code analyst. Analyze the following Python code and provide a structured summary
 that will be useful for generating unit tests. Identify:
 1.  Main functions and classes.
@@ -77,14 +96,30 @@ Respond in a JSON format with the following structure:
     "dependencies": ["dep1", "dep2"]
 }} 
 Remember to include JSON strings without any extra formatting or signs.
-Code to analyze:
+"""
+CODE_ANALYSIS_SUFFIX = """Code to analyze:
 {code_to_analyze}
 """
+CODE_ANALYSIS_TEMPLATE = CODE_ANALYSIS_PREFIX + CODE_ANALYSIS_SUFFIX
 
-TEST_GENERATION_TEMPLATE= """
-You are an expert Python test developer. Based on the following analysis of a Python code component
+TEST_GENERATION_PREFIX = """
+You are an expert Python test developer. Based on an analysis of a Python code component
 and the original code context, write comprehensive unit tests using the `unittest` framework.
 
+Your task:
+1.  Create a Python class that inherits from `unittest.TestCase`. Name it descriptively.
+2.  Write test methods (starting with `test_`) within this class.
+3.  Each test method should target one behavior or edge case identified.
+4.  Use appropriate `self.assertXXX` methods from `unittest` for assertions.
+5.  Ensure the tests are self-contained and clearly written.
+6.  Assume necessary functions/classes from the original code are importable or accessible in the test execution scope.
+    (For example, if testing a function `my_function` from `original_code`, your test might call `source_module.my_function(...)`
+    or assume `my_function` is directly available if `original_code` was executed in the global scope of tests.
+    For now, assume the component under test is directly callable/instantiable.)
+7.  Do NOT include the `if __name__ == '__main__': unittest.main()` block.
+8.  Only provide the Python code for the test class. Do not add any explanatory text before or after the code block.
+"""
+TEST_GENERATION_SUFFIX = """
 Original Code Context (for reference, ensure your tests would import/access this correctly):
 ```python
 {original_code_snippet}
@@ -100,30 +135,38 @@ Potential Edge Cases to Test: {edge_cases}
 
 {feedback}
 
-Your task:
-1.  Create a Python class that inherits from `unittest.TestCase`. Name it descriptively.
-2.  Write test methods (starting with `test_`) within this class.
-3.  Each test method should target one behavior or edge case identified.
-4.  Use appropriate `self.assertXXX` methods from `unittest` for assertions.
-5.  Ensure the tests are self-contained and clearly written.
-6.  Assume necessary functions/classes from the original code are importable or accessible in the test execution scope.
-    (For example, if testing a function `my_function` from `original_code`, your test might call `source_module.my_function(...)`
-    or assume `my_function` is directly available if `original_code` was executed in the global scope of tests.
-    For now, assume the component `{component_name}` is directly callable/instantiable.)
-7.  Do NOT include the `if __name__ == '__main__': unittest.main()` block.
-8.  Only provide the Python code for the test class. Do not add any explanatory text before or after the code block.
-
 Component to generate tests for: `{component_name}`
 Test Class Code:
 ```python
 # [Your generated unittest.TestCase class for {component_name} goes here]
 ```
 """
-EVALUATION_TEMPLATE= """
+TEST_GENERATION_TEMPLATE = TEST_GENERATION_PREFIX + TEST_GENERATION_SUFFIX
+
+EVALUATION_PREFIX = """
 You are an expert Senior QA Engineer and Python Developer. Your task is to review a suite of generated unit tests
 against the original Python code and its prior analysis. You should assess the quality, completeness,
 and likely effectiveness of these tests. DO NOT execute the code.
 
+Based on your review of the three inputs below (original code, prior analysis, generated tests), please provide:
+1.  An overall qualitative assessment of the test suite's likely coverage and quality. Choose one: "low", "medium", "high".
+2.  A numeric score from 1 (very poor) to 10 (excellent) representing your confidence in these tests.
+3.  Specific feedback:
+    - What aspects of the original code (based on the analysis) seem well-tested?
+    - What specific functions, methods, logic paths, or edge cases (from the analysis or your own observation of the original code) appear to be untested or inadequately tested by the provided test suite?
+    - Any other suggestions for improving these tests (e.g., missing assertions, incorrect mocking (if inferable), unclear test names, testing anti-patterns).
+
+Respond in a JSON format with the following structure:
+{{
+    "qualitative_assessment": "low|medium|high",
+    "confidence_score": <float_from_1_to_10>,
+    "positive_feedback": ["Aspect 1 well-tested...", "Aspect 2..."],
+    "areas_for_improvement": ["Function X seems untested for Y case...", "Edge case Z is missing..."],
+    "other_suggestions": ["Consider testing X...", "Test Y could be clearer if..."]
+}}
+Remember to include JSON strings without any extra formatting or signs.
+"""
+EVALUATION_SUFFIX = """
 Original Python Code:
 ```python
 {original_code}
@@ -137,26 +180,45 @@ Generated Unit Tests (using unittest framework):
 ```python
 {test_code}
 ```
+"""
+EVALUATION_TEMPLATE = EVALUATION_PREFIX + EVALUATION_SUFFIX
 
-Based on your review of these three inputs, please provide:
+COMPACT_EVALUATION_PREFIX = """
+You are an expert Senior QA Engineer and Python Developer. Your task is to review a suite of generated unit tests
+against the original Python code and its prior analysis. DO NOT execute the code.
+
+Based on your review of the inputs below, please provide:
 1.  An overall qualitative assessment of the test suite's likely coverage and quality. Choose one: "low", "medium", "high".
 2.  A numeric score from 1 (very poor) to 10 (excellent) representing your confidence in these tests.
-3.  Specific feedback:
-    - What aspects of the original code (based on the analysis) seem well-tested?
-    - What specific functions, methods, logic paths, or edge cases (from the analysis or your own observation of the original code) appear to be untested or inadequately tested by the provided test suite?
-    - Any other suggestions for improving these tests (e.g., missing assertions, incorrect mocking (if inferable), unclear test names, testing anti-patterns).
+3.  Specific feedback: what is well-tested, which functions, logic paths or edge cases are untested or inadequately
+    tested, and any other suggestions (missing assertions, unclear test names, testing anti-patterns).
 
 Respond in a JSON format with the following structure:
 {{
     "qualitative_assessment": "low|medium|high",
     "confidence_score": <float_from_1_to_10>,
-    "positive_feedback": ["Aspect 1 well-tested...", "Aspect 2..."],
-    "areas_for_improvement": ["Function X seems untested for Y case...", "Edge case Z is missing..."],
-    "other_suggestions": ["Consider testing X...", "Test Y could be clearer if..."]
+    "positive_feedback": ["..."],
+    "areas_for_improvement": ["..."],
+    "other_suggestions": ["..."]
 }}
 Remember to include JSON strings without any extra formatting or signs.
 """
-SYNTHESIS_TEMPLATE = """
+COMPACT_EVALUATION_SUFFIX = """
+Original Python Code:
+```python
+{original_code}
+```
+
+{coverage_summary}
+
+{test_scope}
+```python
+{test_code}
+```
+"""
+COMPACT_EVALUATION_TEMPLATE = COMPACT_EVALUATION_PREFIX + COMPACT_EVALUATION_SUFFIX
+
+SYNTHESIS_PREFIX = """
 You are a synthesis agent tasked with producing a polished, user-facing final response based on the conversation between the supervisor and the worker agents.
 
 Your final answer must:
@@ -166,7 +228,8 @@ Your final answer must:
 - Be fluent and natural in tone, like a helpful and professional assistant
 - Format code and explanations clearly (use markdown if applicable)
 - Include helpful remarks or improvements if discovered during the process
-
+"""
+SYNTHESIS_SUFFIX = """
 User request:
 {user_request}
 
@@ -176,3 +239,4 @@ Full conversation between supervisor and agents:
 Produce the final, user-ready response below:
 
 """
+SYNTHESIS_TEMPLATE = SYNTHESIS_PREFIX + SYNTHESIS_SUFFIX
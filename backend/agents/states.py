@@ -1,31 +1,41 @@
-from langchain.schema import Document
 from langgraph.graph import MessagesState
 from typing_extensions import TypedDict, List, Dict, Any, Optional, Annotated
 import operator
-from utils.schemas import Code, CodeAnalysis, TestCodeEvaluation, FlowStep
+from utils.schemas import CodeCheck, FlowStep, UsageReport
+
+# Large artifacts are kept in utils.artifacts.get_artifact_store(); states hold their ids.
 
 class CodeGenState(MessagesState):
     """ 
     Represents the state of the code generation graph.
     Attributes:
         error: binary flag for control flow to indicate if an error occurred
-        generation: generated code solution
+        generation: artifact ids of the generated Code solutions, latest last
         iteration: number of tries
+        documentation: artifact id of the retrieved Document list
+        code_check: local validation of the latest generation, when it was a ranked candidate
     """
     error: bool = False
-    generation: Annotated[List[Code], operator.add]
+    generation: Annotated[List[str], operator.add]
+    code_check: Optional[CodeCheck]
     iterations: int
-    documentation: List[Document]
+    documentation: str
     flow: Annotated[List[FlowStep], operator.add]
     
 class TestGenState(MessagesState):
+    """
+    analyzed_code, test_code and evaluation are artifact ids of the CodeAnalysis,
+    the test suite text and the TestCodeEvaluation.
+    """
     original_code: str
-    analyzed_code: CodeAnalysis
+    analyzed_code: str
     test_code: str
-    evaluation: TestCodeEvaluation
+    evaluation: str
     flow: Annotated[List[FlowStep], operator.add]
     max_generation_attempts: int
     generation_attempts: int
+    evaluated_tests: Dict[str, str]
     
 class SupervisorState(MessagesState):
     flow: Annotated[List[FlowStep], operator.add]
+    usage: Optional[UsageReport]
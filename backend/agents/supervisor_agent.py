@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Optional
 from langchain_core.tools import tool, InjectedToolCallId
 from langgraph.prebuilt import InjectedState, create_react_agent
 from langgraph.graph import StateGraph, START, MessagesState, END
@@ -10,9 +10,17 @@ from utils.helpers import create_handoff_tool
 from .chains import create_synthesis_chain
 from . import build_codegen_graph, build_testgen_graph
 from .states import SupervisorState
-from utils.schemas import FlowStep
+from utils.schemas import FlowStep, RetrievalConfig
+from utils.tracing import timed_step
 
-def build_supervisor_agent(supervisor_model: str|BaseChatModel, worker_model: str|BaseChatModel, retriever):
+def build_supervisor_agent(
+    supervisor_model: str|BaseChatModel,
+    worker_model: str|BaseChatModel,
+    retriever,
+    framework: str = "python",
+    retrieval: Optional[RetrievalConfig] = None,
+    codegen_candidates: int = 1
+):
     synthesis_chain = create_synthesis_chain(model=worker_model)
     
     @tool(description="Synthesizes final answer from the full conversation.")
@@ -38,6 +46,7 @@ def build_supervisor_agent(supervisor_model: str|BaseChatModel, worker_model: st
                 "flow":  [FlowStep(agent = "supervisor", step = "synthesis")]
             }
         )
+    @timed_step
     def synthesis(state: SupervisorState) -> dict:
         conversation_log = "\n".join(
             f"{getattr(msg, 'role', msg.__class__.__name__)}: {msg.content}"
@@ -52,7 +61,9 @@ def build_supervisor_agent(supervisor_model: str|BaseChatModel, worker_model: st
                 "flow":  [FlowStep(agent = "supervisor", step = "synthesis")]
             }
     # Define workers
-    codegen_agent = build_codegen_graph(retriever=retriever, code_gen_model=worker_model)
+    codegen_agent = build_codegen_graph(
+        retriever=retriever, code_gen_model=worker_model, framework=framework, retrieval=retrieval, candidates=codegen_candidates
+    )
     testgen_agent = build_testgen_graph(model=worker_model)
 
     # Handoffs
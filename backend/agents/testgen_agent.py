@@ -10,7 +10,11 @@ from langgraph.types import Command
 from langchain_core.language_models import BaseChatModel
 from langgraph.types import Command
 from .states import TestGenState
-from utils.schemas import TestCodeEvaluation, FlowStep
+from utils.artifacts import get_artifact_store
+from utils.compaction import evaluation_inputs, extract_tests
+from utils.schemas import CodeAnalysis, TestCodeEvaluation, FlowStep
+from utils.tracing import timed_step
+from utils.usage import RequestAborted
 from .chains import (
     create_code_analysis_chain, 
     create_test_generation_chain, 
@@ -20,7 +24,35 @@ from .chains import (
 
 AGENT_NAME = "testgen_agent"
 
+
+# ---------- Message Summaries ----------
+# Messages carry short summaries; the full artifacts are in the artifact store.
+def _shorten(text: str, limit: int = 160) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def analysis_summary(analysis: CodeAnalysis, ref: str) -> str:
+    names = ", ".join(component.name for component in analysis.components)
+    return f"Code analysis [{ref}]: {_shorten(analysis.summary or '')} Components: {names or 'none'}."
+
+
+def tests_summary(test_code: str, components: int, ref: str) -> str:
+    return f"Generated {len(extract_tests(test_code))} tests for {components} components [{ref}]."
+
+
+def evaluation_summary(evaluation: TestCodeEvaluation, ref: str) -> str:
+    summary = (
+        f"Test evaluation [{ref}]: {evaluation.qualitative_assessment} "
+        f"(confidence {evaluation.confidence_score:g})."
+    )
+    if evaluation.areas_for_improvement:
+        summary += f" To improve ({len(evaluation.areas_for_improvement)}): {_shorten(evaluation.areas_for_improvement[0])}"
+    return summary
+
+
 # ---------- Node Functions ----------
+@timed_step
 def extract_code_node(state: TestGenState, chain) -> Dict[str, Any] | Command:
     query = state.get("messages")
     if query:
@@ -32,6 +64,7 @@ def extract_code_node(state: TestGenState, chain) -> Dict[str, Any] | Command:
         "flow": [FlowStep(agent=AGENT_NAME, step = "extract_code:failed")]
     }, goto=END)
 
+@timed_step
 def code_analysis_node(state: TestGenState, chain) -> Dict[str, Any]:
     original_code = state.get("original_code")
     if not original_code:
@@ -39,10 +72,12 @@ def code_analysis_node(state: TestGenState, chain) -> Dict[str, Any]:
     analyzed = chain.invoke({"code_to_analyze": original_code})
     if not analyzed:
         return {"messages": [SystemMessage(content="LLM analysis error")], "flow": [FlowStep(agent=AGENT_NAME, step ="code_analysis:failed:llm")]}
-    return {"analyzed_code": analyzed, "messages": [AIMessage(content=analyzed.model_dump_json(indent=2))], "flow": [FlowStep(agent=AGENT_NAME, step ="code_analysis:success")]}
+    ref = get_artifact_store().put(analyzed)
+    return {"analyzed_code": ref, "messages": [AIMessage(content=analysis_summary(analyzed, ref))], "flow": [FlowStep(agent=AGENT_NAME, step ="code_analysis:success")]}
 
+@timed_step
 def generate_tests_node(state: TestGenState, chain) -> Dict[str, Any]:
-    analyzed_code = state.get("analyzed_code")
+    analyzed_code = get_artifact_store().get(state["analyzed_code"]) if state.get("analyzed_code") else None
     original_code = state.get("original_code")
     attempts = state.get("generation_attempts", 0)
     if not analyzed_code:
@@ -54,7 +89,8 @@ def generate_tests_node(state: TestGenState, chain) -> Dict[str, Any]:
 
     feedback = ""
     if state.get("test_code") and state.get("evaluation"):
-        feedback = f"Previous test:\n{state['test_code']}\n\nEval:\n{state['evaluation'].model_dump_json(indent=2)}"
+        previous_tests, evaluation = get_artifact_store().get(state["test_code"]), get_artifact_store().get(state["evaluation"])
+        feedback = f"Previous test:\n{previous_tests}\n\nEval:\n{evaluation.model_dump_json(indent=2)}"
 
     test_codes = []
     for component in components:
@@ -70,6 +106,8 @@ def generate_tests_node(state: TestGenState, chain) -> Dict[str, Any]:
                 "feedback": feedback
             })
             test_codes.append(response.content)
+        except RequestAborted:
+            raise
         except Exception as e:
             return {"messages": [SystemMessage(content=f"Error generating test: {e}")], "flow": [ FlowStep(agent=AGENT_NAME, step = "generate_tests:failed:llm")],"generation_attempts": attempts + 1}
 
@@ -77,17 +115,19 @@ def generate_tests_node(state: TestGenState, chain) -> Dict[str, Any]:
         return {"messages": [SystemMessage(content="No test generated")], "flow": [ FlowStep(agent=AGENT_NAME, step = "generate_tests:failed:empty")]}
 
     combined = "\n\n".join(test_codes) + "\n\n# Add if __name__ == '__main__': unittest.main() if needed"
+    ref = get_artifact_store().put(combined)
     return {
-        "messages": [AIMessage(content=combined)],
-        "test_code": combined,
+        "messages": [AIMessage(content=tests_summary(combined, len(components), ref))],
+        "test_code": ref,
         "flow": [ FlowStep(agent=AGENT_NAME, step = "generate_tests:success")],
         "generation_attempts": attempts + 1,
     }
 
-def evaluate_tests_node(state: TestGenState, chain) -> Dict[str, Any]:
-    test_code = state.get("test_code")
+@timed_step
+def evaluate_tests_node(state: TestGenState, chain, compact: bool = False) -> Dict[str, Any]:
+    test_code = get_artifact_store().get(state["test_code"]) if state.get("test_code") else None
     original_code = state.get("original_code")
-    analyzed_code = state.get("analyzed_code")
+    analyzed_code = get_artifact_store().get(state["analyzed_code"]) if state.get("analyzed_code") else None
 
     if not original_code:
         return {"messages": [SystemMessage(content="No original code")], "flow": [ FlowStep(agent=AGENT_NAME, step = "evaluate_tests:failed:no_code")]}
@@ -96,29 +136,36 @@ def evaluate_tests_node(state: TestGenState, chain) -> Dict[str, Any]:
     if not analyzed_code:
         return {"messages": [SystemMessage(content="Missing analysis")], "flow": [ FlowStep(agent=AGENT_NAME, step = "evaluate_tests:failed:no_analysis")]}
 
-    try:
-        result = chain.invoke({
+    evaluated_tests = {}
+    if compact:
+        previous_evaluation = get_artifact_store().get(state["evaluation"]) if state.get("evaluation") else None
+        inputs, evaluated_tests = evaluation_inputs(
+            original_code, analyzed_code, test_code, state.get("evaluated_tests"), previous_evaluation
+        )
+    else:
+        inputs = {
             "original_code": original_code,
             "code_analysis_json": analyzed_code.model_dump_json(indent=2),
             "test_code": test_code
-        })
+        }
+    try:
+        result = chain.invoke(inputs)
+    except RequestAborted:
+        raise
     except Exception as e:
         return {"messages": [SystemMessage(content=f"Eval error: {e}")], "flow": [ FlowStep(agent=AGENT_NAME, step = "evaluate_tests:failed:exception")]}
 
     if not isinstance(result, TestCodeEvaluation):
         return {"messages": [SystemMessage(content="Invalid result format")], "flow": [ FlowStep(agent=AGENT_NAME, step = "evaluate_tests:failed:bad_output")]}
 
-    new_state = {
-        "messages": [AIMessage(content= result.model_dump_json(indent=2))],
-        "evaluation": result,
-        "flow": [FlowStep(agent=AGENT_NAME, step =f"evaluate_tests:success:{result.qualitative_assessment}")]
-    }
+    ref = get_artifact_store().put(result)
     if state["generation_attempts"] >= state.get("max_generation_attempts",3) or result.qualitative_assessment == "high":
         return Command(
             goto = END,
             update = {
-                "messages": [AIMessage(content= result.model_dump_json(indent=2)), AIMessage(content=f"# The qualitative accessment of UnitTest: {result.qualitative_assessment}\n\n {test_code}")],
-                "evaluation": result,
+                "messages": [AIMessage(content=evaluation_summary(result, ref)), AIMessage(content=f"# The qualitative accessment of UnitTest: {result.qualitative_assessment}\n\n {test_code}")],
+                "evaluation": ref,
+                "evaluated_tests": evaluated_tests,
                 "flow": [
                     FlowStep(agent=AGENT_NAME, step = f"evaluate_tests:success:{result.qualitative_assessment}"),
                     FlowStep(agent=AGENT_NAME, step =f"End Test Flow after {state.get("generation_attempts")} tries")]
@@ -127,8 +174,9 @@ def evaluate_tests_node(state: TestGenState, chain) -> Dict[str, Any]:
     return Command(
         goto="generate_tests",
         update = {
-            "messages": [AIMessage(content= result.model_dump_json(indent=2))],
-            "evaluation": result,
+            "messages": [AIMessage(content=evaluation_summary(result, ref))],
+            "evaluation": ref,
+            "evaluated_tests": evaluated_tests,
             "flow": [FlowStep(agent=AGENT_NAME, step =f"evaluate_tests:success:{result.qualitative_assessment}")]
         }
     )
@@ -140,17 +188,22 @@ def decision_to_extract(state) -> str:
         return "extract"
     return "analyze"
 # ---------- Graph Build Function ----------
-def build_testgen_graph(model: BaseChatModel| str = "gemini-2.0-flash", temperature: float = 0.0, max_attempts: int = 3):
+def build_testgen_graph(
+    model: BaseChatModel| str = "gemini-2.0-flash",
+    temperature: float = 0.0,
+    max_attempts: int = 3,
+    compact_evaluation: bool = True
+):
     code_analysis_chain = create_code_analysis_chain(model, temperature)
     test_generation_chain = create_test_generation_chain(model, temperature)
-    evaluation_chain = create_evaluation_chain(model, temperature)
+    evaluation_chain = create_evaluation_chain(model, temperature, compact=compact_evaluation)
     extract_code_chain = create_extract_code_chain(model, temperature)
 
     g = StateGraph(TestGenState)
     g.add_node("extract_code", lambda s: extract_code_node(s, extract_code_chain))
     g.add_node("code_analysis", lambda s: code_analysis_node(s, code_analysis_chain))
     g.add_node("generate_tests", lambda s: generate_tests_node(s, test_generation_chain))
-    g.add_node("evaluate_tests", lambda s: evaluate_tests_node(s, evaluation_chain))
+    g.add_node("evaluate_tests", lambda s: evaluate_tests_node(s, evaluation_chain, compact_evaluation))
 
     g.add_conditional_edges(START, decision_to_extract, {
         "extract": "extract_code",
@@ -0,0 +1,123 @@
+"""
+Wall-clock time to a valid answer of the codegen graph versus the number of
+concurrent candidates.
+
+The FakeChatModel returns Code with a syntax error for an --invalid-rate
+fraction of generations. With one candidate, an invalid answer goes through the
+serial reflect/generate loop; with N candidates the best valid one is taken and
+the loop is only the last resort.
+
+Each candidate count is measured in two modes: "parallel" calls a model without
+an `n` parameter N times concurrently, "single_call" wraps a model with `n` in a
+ResilientChatModel (as `get_chat_model` does) so the N candidates come from one
+request. Run from the backend directory:
+
+    python -m benchmarks.codegen_candidates --candidates 1 2 3 5 --invalid-rate 0.4
+"""
+import argparse
+import ast
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from agents import build_codegen_graph
+from utils.artifacts import get_artifact_store
+from utils.resilience import ResilientChatModel
+from .fakes import SAMPLE_CODE, FakeChatModel, FakeEmbeddings, FakeMultiChatModel
+from .run import CODEGEN_QUERY, make_corpus, make_store, percentile
+
+VALID = {"prefix": "A division helper.", "imports": "", "code": SAMPLE_CODE}
+INVALID = {"prefix": "A division helper.", "imports": "", "code": SAMPLE_CODE.replace("if b == 0:", "if b == 0")}
+
+
+def scripted_codes(invalid_rate: float, seed: int, size: int = 100) -> List[Dict[str, Any]]:
+    invalid = round(size * invalid_rate)
+    codes = [INVALID] * invalid + [VALID] * (size - invalid)
+    random.Random(seed).shuffle(codes)
+    return codes
+
+
+def is_valid(result: Dict[str, Any]) -> bool:
+    generations = result.get("generation") or []
+    if not generations:
+        return False
+    code = get_artifact_store().get(generations[-1])
+    try:
+        ast.parse(f"{code.imports}\n{code.code}")
+        return True
+    except SyntaxError:
+        return False
+
+
+async def measure(candidates: int, mode: str, retriever, args) -> Dict[str, Any]:
+    fake = FakeMultiChatModel if mode == "single_call" else FakeChatModel
+    model = fake(
+        latency=args.llm_latency,
+        tokens_per_second=args.tokens_per_second,
+        structured_outputs={"Code": scripted_codes(args.invalid_rate, args.seed)},
+    )
+    code_gen_model = ResilientChatModel(models=[model], hedge=False) if mode == "single_call" else model
+    graph = build_codegen_graph(retriever=retriever, code_gen_model=code_gen_model, max_iter=args.max_iter, candidates=candidates)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    valid = iterations = 0
+
+    async def one(i: int):
+        nonlocal valid, iterations
+        async with semaphore:
+            start = time.perf_counter()
+            result = await graph.ainvoke({"messages": [("user", f"{CODEGEN_QUERY} ({i})")]})
+            latencies.append(time.perf_counter() - start)
+            valid += is_valid(result)
+            iterations += result.get("iterations", 0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    wall = time.perf_counter() - start
+    return {
+        "candidates": candidates,
+        "mode": mode,
+        "valid_rate": valid / args.requests,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p99_s": percentile(latencies, 99),
+        "wall_seconds": wall,
+        "llm_calls_per_request": model.request_count / args.requests,
+        "completions_per_request": model.call_count / args.requests,
+        "attempts_per_request": iterations / args.requests,
+    }
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    store = make_store(FakeEmbeddings(), "codegen_candidates")
+    store.add_documents(make_corpus(20), framework="python")
+    retriever = store.as_retriever()
+    return [
+        await measure(n, mode, retriever, args)
+        for n in args.candidates
+        for mode in (("parallel", "single_call") if n > 1 else ("parallel",))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="*", default=[1, 2, 3, 5])
+    parser.add_argument("--invalid-rate", type=float, default=0.4)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-iter", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds to first token per LLM call.")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="codegen_candidates.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "results": results}, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Tokens per test evaluation: the full EVALUATION_TEMPLATE prompt versus the
+compact one (compact JSON, AST coverage map, unchanged tests elided on retries).
+
+Besides the built-in sample, each --sources file is turned into a synthetic case:
+its functions and methods become the analysis components, two tests are generated
+per component, and on every retry --change-fraction of the tests are rewritten,
+as when the generator addresses evaluation feedback. Run from the backend directory:
+
+    python -m benchmarks.eval_prompt_size --attempts 3
+    python -m benchmarks.eval_prompt_size --sources utils/compaction.py agents/testgen_agent.py
+"""
+import argparse
+import ast
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+import tiktoken
+from langchain.prompts import ChatPromptTemplate
+
+from agents import prompts
+from utils.compaction import evaluation_inputs
+from utils.schemas import CodeAnalysis, TestCodeEvaluation
+from .fakes import SAMPLE_ANALYSIS, SAMPLE_CODE, SAMPLE_EVALUATION, SAMPLE_TESTS
+
+ENCODING = tiktoken.get_encoding("cl100k_base")
+FULL_PROMPT = ChatPromptTemplate.from_template(prompts.EVALUATION_TEMPLATE)
+COMPACT_PROMPT = ChatPromptTemplate.from_template(prompts.COMPACT_EVALUATION_TEMPLATE)
+
+
+def tokens(prompt: ChatPromptTemplate, inputs: Dict[str, str]) -> int:
+    return len(ENCODING.encode(prompt.format(**inputs), disallowed_special=()))
+
+
+def _method(node: ast.FunctionDef) -> Dict[str, Any]:
+    doc = (ast.get_docstring(node) or f"{node.name} behaves as documented").strip().split("\n")[0]
+    return {
+        "name": node.name,
+        "signature": f"def {node.name}({ast.unparse(node.args)})",
+        "description": doc,
+        "parameters": [{"name": a.arg, "type": ast.unparse(a.annotation) if a.annotation else None} for a in node.args.args],
+        "key_behaviors": [doc],
+        "edge_cases": [f"{node.name} with empty or invalid arguments"],
+    }
+
+
+def _tests(component: str, target: str, variant: int) -> str:
+    return (
+        f"import unittest\n\nclass Test{component.title().replace('_', '')}(unittest.TestCase):\n"
+        f"    def test_{target}_behaves_as_documented(self):\n"
+        f"        result = {target}()\n"
+        f"        self.assertIsNotNone(result)\n" + "        self.assertTrue(result)\n" * variant +
+        f"\n    def test_{target}_with_empty_or_invalid_arguments(self):\n"
+        f"        with self.assertRaises(Exception):\n"
+        f"            {target}(None)\n"
+    )
+
+
+def synthetic_case(path: str) -> Tuple[str, CodeAnalysis, List[Tuple[str, str]]]:
+    """Returns (source, analysis, [(component, target)]) for a Python file."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    components, targets = [], []
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            components.append({"type": "function", **_method(node)})
+            targets.append((node.name, node.name))
+        elif isinstance(node, ast.ClassDef):
+            methods = [_method(n) for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            components.append({"type": "class", "name": node.name, "description": ast.get_docstring(node), "methods": methods})
+            targets.extend((node.name, m["name"]) for m in methods)
+    analysis = CodeAnalysis.model_validate({"summary": os.path.basename(path), "components": components})
+    return source, analysis, targets
+
+
+def measure(name: str, code: str, analysis: CodeAnalysis, suites: List[str]) -> Dict[str, Any]:
+    evaluation = TestCodeEvaluation.model_validate(SAMPLE_EVALUATION | {"qualitative_assessment": "medium"})
+    previous, attempts = None, []
+    for attempt, test_code in enumerate(suites, 1):
+        full = tokens(FULL_PROMPT, {
+            "original_code": code,
+            "code_analysis_json": analysis.model_dump_json(indent=2),
+            "test_code": test_code,
+        })
+        inputs, previous = evaluation_inputs(code, analysis, test_code, previous, evaluation if attempt > 1 else None)
+        compact = tokens(COMPACT_PROMPT, inputs)
+        attempts.append({"attempt": attempt, "full_tokens": full, "compact_tokens": compact, "saving": 1 - compact / full})
+    total_full = sum(a["full_tokens"] for a in attempts)
+    total_compact = sum(a["compact_tokens"] for a in attempts)
+    return {
+        "case": name,
+        "attempts": attempts,
+        "full_tokens_per_evaluation": total_full / len(attempts),
+        "compact_tokens_per_evaluation": total_compact / len(attempts),
+        "saving": 1 - total_compact / total_full,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", nargs="*", default=["infrastructure/vectorstore/loaders.py", "utils/compaction.py"])
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--change-fraction", type=float, default=0.3)
+    parser.add_argument("--output", default="eval_prompt_size.json")
+    args = parser.parse_args()
+
+    sample_retry = SAMPLE_TESTS.replace("divide(6, 3), 2", "divide(9, 3), 3")
+    results = [measure("sample", SAMPLE_CODE, CodeAnalysis.model_validate(SAMPLE_ANALYSIS),
+                       [SAMPLE_TESTS] + [sample_retry] * (args.attempts - 1))]
+    for path in args.sources:
+        code, analysis, targets = synthetic_case(path)
+        step = max(1, round(1 / args.change_fraction)) if args.change_fraction else 0
+        suites, variants = [], [0] * len(targets)
+        for attempt in range(args.attempts):
+            if attempt and step:
+                for i in range(attempt % step, len(targets), step):
+                    variants[i] += 1
+            suites.append("\n\n".join(_tests(c, t, v) for (c, t), v in zip(targets, variants)))
+        results.append(measure(path, code, analysis, suites))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "results": results}, f, indent=2)
+    print(json.dumps([{k: v for k, v in r.items() if k != "attempts"} for r in results], indent=2))
+
+
+if __name__ == "__main__":
+    main()
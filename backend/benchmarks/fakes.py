@@ -0,0 +1,354 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field, PrivateAttr
+
+SAMPLE_CODE = '''def divide(a: float, b: float) -> float:
+    """Divides a by b."""
+    if b == 0:
+        raise ValueError("Cannot divide by zero.")
+    return a / b
+'''
+
+SAMPLE_ANALYSIS = {
+    "summary": "Arithmetic helper.",
+    "components": [
+        {
+            "type": "function",
+            "name": "divide",
+            "description": "Divides two numbers.",
+            "signature": "def divide(a: float, b: float) -> float",
+            "parameters": [{"name": "a", "type": "float"}, {"name": "b", "type": "float"}],
+            "returns": "float",
+            "key_behaviors": ["returns the quotient"],
+            "edge_cases": ["b is zero"],
+        }
+    ],
+    "dependencies": [],
+}
+
+SAMPLE_TESTS = '''import unittest
+
+class TestDivide(unittest.TestCase):
+    def test_returns_quotient(self):
+        self.assertEqual(divide(6, 3), 2)
+
+    def test_zero_division(self):
+        with self.assertRaises(ValueError):
+            divide(1, 0)
+'''
+
+SAMPLE_EVALUATION = {
+    "qualitative_assessment": "high",
+    "confidence_score": 8.5,
+    "positive_feedback": ["Quotient and zero division are tested."],
+    "areas_for_improvement": [],
+    "other_suggestions": [],
+}
+
+# (substring of the rendered prompt, reply) pairs, checked in order.
+DEFAULT_TEXT_RESPONSES: List[Tuple[str, str]] = [
+    ("Extract all code snippets", SAMPLE_CODE),
+    ("expert code analyst", json.dumps(SAMPLE_ANALYSIS)),
+    ("expert Python test developer", SAMPLE_TESTS),
+    ("Senior QA Engineer", json.dumps(SAMPLE_EVALUATION)),
+    ("synthesis agent", "Here is the final answer.\n```python\n" + SAMPLE_CODE + "```"),
+]
+
+DEFAULT_STRUCTURED_OUTPUTS: Dict[str, Any] = {
+    "Code": {"prefix": "A division helper.", "imports": "", "code": SAMPLE_CODE},
+}
+
+
+REPAIR_MARKER = "Fix the following model output"
+COMMENT_RE = re.compile(r"^\s*//.*$\n?", re.MULTILINE)
+TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+
+
+def malform(reply: str) -> str:
+    """A JSON reply as a careless model writes it: with a comment and a trailing comma."""
+    body = reply.rstrip()[:-1].rstrip()
+    return "// model output\n" + body + ",\n}"
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model for benchmarks.
+
+    Replies are chosen from scripted responses by matching the rendered prompt,
+    structured outputs are returned as tool calls so `with_structured_output`
+    works unchanged, and handoff tools are called so the supervisor routes work.
+    Latency is modelled as a fixed time to first token, plus uncached input
+    tokens divided by `prefill_tokens_per_second`, plus output tokens divided
+    by `tokens_per_second`.
+
+    With `prefix_cache`, the model emulates automatic provider prefix caching:
+    the longest `cache_block`-aligned prefix of the prompt seen in an earlier
+    call is reported as cache_read input tokens and is not prefilled again.
+
+    Scripted values may be lists, in which case successive calls cycle through them.
+
+    Faults can be injected for resilience benchmarks: a `stall_rate` fraction of
+    calls takes `stall_seconds` longer, and a `malformed_rate` fraction of JSON
+    replies gets a `//` comment and a trailing comma. Repair prompts (see
+    `utils.resilience.REPAIR_TEMPLATE`) are answered with the cleaned output.
+    """
+    model_name: str = "fake-chat"
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    prefill_tokens_per_second: float = 0.0
+    prefix_cache: bool = False
+    cache_block: int = 1024
+    text_responses: List[Tuple[str, Any]] = Field(default_factory=lambda: list(DEFAULT_TEXT_RESPONSES))
+    structured_outputs: Dict[str, Any] = Field(default_factory=lambda: dict(DEFAULT_STRUCTURED_OUTPUTS))
+    default_response: str = "All tasks are complete."
+    stall_rate: float = 0.0
+    stall_seconds: float = 0.0
+    malformed_rate: float = 0.0
+    seed: int = 0
+
+    _calls: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _cursors: Dict[str, itertools.count] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _rng: random.Random = PrivateAttr(default=None)
+    _prefixes: set = PrivateAttr(default_factory=set)
+    _requests: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context: Any):
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def call_count(self) -> int:
+        return sum(self._calls.values())
+
+    @property
+    def calls(self) -> Dict[str, int]:
+        return dict(self._calls)
+
+    @property
+    def request_count(self) -> int:
+        """Requests made; a request can return several completions (see FakeMultiChatModel)."""
+        return self._requests
+
+    def reset_stats(self):
+        with self._lock:
+            self._calls.clear()
+            self._prefixes.clear()
+            self._requests = 0
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[Union[str, dict]] = None, **kwargs):
+        formatted = [convert_to_openai_tool(tool) for tool in tools]
+        return self.bind(tools=formatted, tool_choice=tool_choice, **kwargs)
+
+    def _pick(self, key: str, value: Any) -> Any:
+        if not isinstance(value, list):
+            return value
+        with self._lock:
+            cursor = self._cursors.setdefault(key, itertools.count())
+            return value[next(cursor) % len(value)]
+
+    def _chance(self, rate: float) -> bool:
+        if not rate:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _record(self, kind: str):
+        with self._lock:
+            self._calls[kind] = self._calls.get(kind, 0) + 1
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[List[dict]]) -> AIMessage:
+        prompt = "\n".join(str(m.content) for m in messages)
+        tool_names = [tool["function"]["name"] for tool in tools or []]
+
+        for name in tool_names:
+            if name in self.structured_outputs:
+                self._record(name)
+                args = self._pick(name, self.structured_outputs[name])
+                return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{name}"}])
+
+        handoffs = [name for name in tool_names if name.startswith("transfer_to_")]
+        if handoffs and isinstance(messages[-1], HumanMessage):
+            self._record("handoff")
+            wants_tests = "test" in str(messages[-1].content).lower()
+            target = next((n for n in handoffs if ("testgen" in n) == wants_tests), handoffs[0])
+            return AIMessage(content="", tool_calls=[{"name": target, "args": {}, "id": f"call_{target}"}])
+
+        if REPAIR_MARKER in prompt:
+            self._record("repair")
+            output = prompt.split("Output to fix:\n", 1)[-1].rsplit("\n\nParse error:", 1)[0]
+            return AIMessage(content=TRAILING_COMMA_RE.sub(r"\1", COMMENT_RE.sub("", output)).strip())
+
+        for marker, reply in self.text_responses:
+            if marker in prompt:
+                self._record(marker)
+                reply = self._pick(marker, reply)
+                if reply.lstrip().startswith("{") and self._chance(self.malformed_rate):
+                    self._record("malformed")
+                    reply = malform(reply)
+                return AIMessage(content=reply)
+        self._record("default")
+        return AIMessage(content=self.default_response)
+
+    def _cached_chars(self, prompt: str) -> int:
+        """Length of the longest block-aligned prefix of `prompt` seen before; remembers its prefixes."""
+        blocks = [prompt[:end] for end in range(self.cache_block, len(prompt) + 1, self.cache_block)]
+        keys = [hashlib.sha256(block.encode("utf-8")).digest() for block in blocks]
+        with self._lock:
+            cached = next((len(blocks[i]) for i in reversed(range(len(keys))) if keys[i] in self._prefixes), 0)
+            self._prefixes.update(keys)
+        return cached
+
+    def _result(self, messages: List[BaseMessage], message: AIMessage) -> Tuple[ChatResult, float]:
+        input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        cached_tokens = 0
+        if self.prefix_cache:
+            prompt = "\n".join(str(m.content) for m in messages)
+            cached_tokens = min(input_tokens, self._cached_chars(prompt) // 4)
+        output_text = message.content or json.dumps([call["args"] for call in message.tool_calls])
+        output_tokens = estimate_tokens(output_text)
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        if cached_tokens:
+            message.usage_metadata["input_token_details"] = {"cache_read": cached_tokens}
+        delay = self.latency
+        if self.prefill_tokens_per_second:
+            delay += (input_tokens - cached_tokens) / self.prefill_tokens_per_second
+        if self.tokens_per_second:
+            delay += output_tokens / self.tokens_per_second
+        if self._chance(self.stall_rate):
+            self._record("stall")
+            delay += self.stall_seconds
+        return ChatResult(generations=[ChatGeneration(message=message)]), delay
+
+    def _complete(self, messages: List[BaseMessage], tools: Optional[List[dict]]) -> Tuple[ChatResult, float]:
+        with self._lock:
+            self._requests += 1
+        return self._result(messages, self._respond(messages, tools))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        tools: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, delay = self._complete(messages, tools)
+        if delay:
+            time.sleep(delay)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        tools: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, delay = self._complete(messages, tools)
+        if delay:
+            await asyncio.sleep(delay)
+        return result
+
+
+class FakeMultiChatModel(FakeChatModel):
+    """
+    FakeChatModel with an `n` parameter: one request returns `n` completions.
+    The prompt is billed and prefilled once and the completions decode in
+    parallel, so a request takes as long as its slowest completion.
+    """
+    n: int = 1
+
+    def _complete(self, messages: List[BaseMessage], tools: Optional[List[dict]]) -> Tuple[ChatResult, float]:
+        with self._lock:
+            self._requests += 1
+        results = [self._result(messages, self._respond(messages, tools)) for _ in range(self.n)]
+        for result, _ in results[1:]:
+            usage = result.generations[0].message.usage_metadata
+            usage.pop("input_token_details", None)
+            usage["input_tokens"], usage["total_tokens"] = 0, usage["output_tokens"]
+        generations = [generation for result, _ in results for generation in result.generations]
+        return ChatResult(generations=generations), max(delay for _, delay in results)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings: each text maps to a unit vector seeded by
+    its hash. `latency` seconds are spent per call plus `latency_per_text` per text.
+    """
+    def __init__(self, size: int = 768, latency: float = 0.0, latency_per_text: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.calls = 0
+        self.texts = 0
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _sleep(self, n: int):
+        self.calls += 1
+        self.texts += n
+        delay = self.latency + self.latency_per_text * n
+        if delay:
+            time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._sleep(len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._sleep(1)
+        return self._embed(text)
+
+
+class LexicalEmbeddings(Embeddings):
+    """
+    Offline bag-of-words embeddings via feature hashing. Unlike FakeEmbeddings,
+    similar texts get similar vectors, so retrieval quality can be compared locally.
+    """
+    def __init__(self, size: int = 2048):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in re.findall(r"[a-z_][a-z0-9_]+", text.lower()):
+            bucket = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+            vector[bucket % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
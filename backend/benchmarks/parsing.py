@@ -0,0 +1,80 @@
+"""
+Structured output parsing: the stock PydanticOutputParser versus the tolerant
+local parser, on the sample analysis and evaluation damaged the ways models
+damage JSON. Every output a parser rejects costs one LLM re-ask.
+Run from the backend directory:
+
+    python -m benchmarks.parsing --repeat 200
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from langchain.output_parsers import PydanticOutputParser
+from langchain_core.exceptions import OutputParserException
+
+from utils.jsonrepair import TolerantPydanticOutputParser, parse_metrics
+from utils.schemas import CodeAnalysis, TestCodeEvaluation
+from .fakes import SAMPLE_ANALYSIS, SAMPLE_EVALUATION, malform
+
+
+def _pretty(data: Dict[str, Any]) -> str:
+    return json.dumps(data, indent=2)
+
+
+# (kind, damage) pairs; each damage turns a JSON object into a reply.
+DAMAGE: List[Tuple[str, Callable[[Dict[str, Any]], str]]] = [
+    ("clean", lambda d: json.dumps(d)),
+    ("fenced", lambda d: f"```json\n{_pretty(d)}\n```"),
+    ("prose", lambda d: f"Here is the analysis [as requested]:\n{_pretty(d)}\nLet me know if you need more."),
+    ("comment_trailing_comma", lambda d: malform(_pretty(d))),
+    ("example_comments", lambda d: _pretty(d).replace('",\n', '", // as in the example\n', 2)),
+    ("python_literals", lambda d: repr(d)),
+    ("truncated", lambda d: _pretty(d)[: int(len(_pretty(d)) * 0.9)]),
+    ("wrapped", lambda d: json.dumps({"result": d})),
+]
+
+
+def measure(name: str, parser: PydanticOutputParser, replies: List[Tuple[str, str]], repeat: int) -> Dict[str, Any]:
+    by_kind: Dict[str, Dict[str, int]] = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for kind, reply in replies:
+            counts = by_kind.setdefault(kind, {"ok": 0, "failed": 0})
+            try:
+                parser.parse(reply)
+                counts["ok"] += 1
+            except OutputParserException:
+                counts["failed"] += 1
+    elapsed = time.perf_counter() - start
+    total = repeat * len(replies)
+    failed = sum(c["failed"] for c in by_kind.values())
+    return {
+        "parser": name,
+        "failure_rate": failed / total,
+        "llm_reasks_per_100_outputs": 100 * failed / total,
+        "us_per_parse": elapsed / total * 1e6,
+        "failures_by_kind": {kind: c["failed"] / repeat for kind, c in by_kind.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", default="parsing_bench.json")
+    args = parser.parse_args()
+
+    results = []
+    for schema, sample in ((CodeAnalysis, SAMPLE_ANALYSIS), (TestCodeEvaluation, SAMPLE_EVALUATION)):
+        replies = [(kind, damage(sample)) for kind, damage in DAMAGE]
+        for name, cls in (("pydantic", PydanticOutputParser), ("tolerant", TolerantPydanticOutputParser)):
+            results.append({"schema": schema.__name__, **measure(name, cls(pydantic_object=schema), replies, args.repeat)})
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "results": results, "parse_metrics": parse_metrics.snapshot()}, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
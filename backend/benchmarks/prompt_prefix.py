@@ -0,0 +1,148 @@
+"""
+Billed input tokens, time to first token and prompt render time of code
+generation for repeat-framework traffic: the single-message prompt with all
+retrieved documentation ("single") versus the prefixed prompt ("prefixed"),
+where the instructions and the framework's pinned documentation are a stable
+system prefix and the remaining retrieved documentation goes with the question.
+
+The FakeChatModel emulates automatic provider prefix caching: the longest
+block-aligned prompt prefix seen in an earlier call is reported as cached input,
+is not prefilled again (--prefill-tokens-per-second) and is billed at
+CACHED_INPUT_PRICE_RATIO. Questions are drawn from a pool with Zipf-distributed
+popularity, so some documentation is retrieved much more often than the rest.
+Run from the backend directory:
+
+    python -m benchmarks.prompt_prefix --requests 300 --questions 40
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
+
+from agents import prompts
+from utils.pinned_docs import PinnedDocs
+from utils.prompt_cache import prefixed_prompt, render_cache
+from utils.usage import CACHED_INPUT_PRICE_RATIO, model_cost
+from .fakes import FakeChatModel, FakeEmbeddings
+from .run import CODEGEN_QUERY, make_corpus, make_store, percentile
+
+FRAMEWORK = "python"
+PRICED_MODEL = "gemini-2.0-flash"
+
+
+def zipf_questions(pool: int, requests: int, exponent: float, seed: int) -> List[str]:
+    questions = [f"{CODEGEN_QUERY} Variant {i}." for i in range(pool)]
+    weights = [1 / (rank + 1) ** exponent for rank in range(pool)]
+    return random.Random(seed).choices(questions, weights=weights, k=requests)
+
+
+def single_inputs(docs: Sequence[Document]) -> Dict[str, Any]:
+    return {"context": "\n".join(doc.page_content for doc in docs)}
+
+
+def prefixed_inputs(pinned: PinnedDocs) -> Callable[[Sequence[Document]], Dict[str, Any]]:
+    def inputs(docs: Sequence[Document]) -> Dict[str, Any]:
+        pinned.record(FRAMEWORK, docs)
+        context, extra = pinned.split(FRAMEWORK, docs)
+        return {
+            "context": context,
+            "extra_context": prompts.CODE_GEN_EXTRA_CONTEXT.format(documentation=extra) if extra else "",
+        }
+    return inputs
+
+
+def measure(mode: str, questions: List[str], docs_for: Callable[[str], List[Document]], args) -> Dict[str, Any]:
+    model = FakeChatModel(
+        latency=args.llm_latency,
+        prefill_tokens_per_second=args.prefill_tokens_per_second,
+        prefix_cache=True,
+        cache_block=args.cache_block,
+    )
+    if mode == "single":
+        prompt = ChatPromptTemplate.from_template(prompts.CODE_GEN_TEMPLATE).partial(extra_context="")
+        make_inputs = single_inputs
+    else:
+        prompt = prefixed_prompt(prompts.CODE_GEN_PREFIX, prompts.CODE_GEN_SUFFIX, extra_context="")
+        make_inputs = prefixed_inputs(PinnedDocs(args.pinned_docs, args.min_hits, args.refresh, frameworks=[FRAMEWORK]))
+
+    render_hits, render_misses = render_cache.hits, render_cache.misses
+    render_us, ttft, input_tokens, cached_tokens = [], [], [], []
+    for i, question in enumerate(questions):
+        inputs = {**make_inputs(docs_for(question)), "framework": FRAMEWORK, "question": f"{question} (request {i})"}
+        start = time.perf_counter()
+        prompt_value = prompt.invoke(inputs)
+        render_us.append((time.perf_counter() - start) * 1e6)
+
+        start = time.perf_counter()
+        usage = model.invoke(prompt_value).usage_metadata
+        ttft.append(time.perf_counter() - start)
+        input_tokens.append(usage["input_tokens"])
+        cached_tokens.append((usage.get("input_token_details") or {}).get("cache_read", 0))
+
+    n = len(questions)
+    billed = [total - cached * (1 - CACHED_INPUT_PRICE_RATIO) for total, cached in zip(input_tokens, cached_tokens)]
+    result = {
+        "mode": mode,
+        "requests": n,
+        "input_tokens_per_request": sum(input_tokens) / n,
+        "cached_input_tokens_per_request": sum(cached_tokens) / n,
+        "billed_input_tokens_per_request": sum(billed) / n,
+        "input_cost_usd_per_1k_requests": sum(
+            model_cost(PRICED_MODEL, total, 0, cached) for total, cached in zip(input_tokens, cached_tokens)
+        ) / n * 1000,
+        "ttft_p50_s": percentile(ttft, 50),
+        "ttft_p99_s": percentile(ttft, 99),
+        "render_us_p50": percentile(render_us, 50),
+        "render_us_p99": percentile(render_us, 99),
+    }
+    if mode == "prefixed":
+        hits, misses = render_cache.hits - render_hits, render_cache.misses - render_misses
+        result["render_cache_hit_ratio"] = hits / (hits + misses) if hits + misses else 0.0
+    return result
+
+
+def run(args) -> List[Dict[str, Any]]:
+    store = make_store(FakeEmbeddings(), "prompt_prefix")
+    store.add_documents(make_corpus(args.corpus_docs), framework=FRAMEWORK)
+    retriever = store.as_retriever(search_kwargs={"k": args.k})
+    retrieved: Dict[str, List[Document]] = {}
+
+    def docs_for(question: str) -> List[Document]:
+        # Both modes see the same documentation for a question; retrieval is not measured.
+        if question not in retrieved:
+            retrieved[question] = retriever.invoke(question)
+        return retrieved[question]
+
+    questions = zipf_questions(args.questions, args.requests, args.zipf, args.seed)
+    return [measure(mode, questions, docs_for, args) for mode in ("single", "prefixed")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--questions", type=int, default=40, help="Distinct questions in the pool.")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Exponent of the question popularity distribution.")
+    parser.add_argument("--corpus-docs", type=int, default=60)
+    parser.add_argument("--k", type=int, default=4, help="Documents retrieved per question.")
+    parser.add_argument("--pinned-docs", type=int, default=4, help="As PINNED_DOCS; 0 measures the default prefix without pinning.")
+    parser.add_argument("--min-hits", type=int, default=3)
+    parser.add_argument("--refresh", type=int, default=100)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fixed seconds to first token per call.")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=20000.0)
+    parser.add_argument("--cache-block", type=int, default=1024, help="Prefix cache granularity in characters.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="prompt_prefix.json")
+    args = parser.parse_args()
+
+    results = run(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "results": results}, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Retrieval hit-rate evaluation of the document splitters on a labelled query set.
+
+Each line of the query file is {"query": ..., "expected": ...}; a query is a hit
+at k when one of the top-k chunks contains the expected text verbatim, i.e. the
+snippet the answer needs survived chunking intact. Run from the backend directory:
+
+    python -m benchmarks.retrieval_eval --k 1 2 4
+    python -m benchmarks.retrieval_eval --docs my_docs/*.md --queries my_queries.jsonl --embeddings google
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from langchain_core.documents import Document
+
+from infrastructure.vectorstore import ChromaVectorStore
+from .fakes import LexicalEmbeddings
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def load_docs(patterns: List[str]) -> List[Document]:
+    docs = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, encoding="utf-8") as f:
+                docs.append(Document(page_content=f.read(), metadata={"source": path}))
+    return docs
+
+
+def evaluate(splitter: str, docs: List[Document], queries: List[Dict[str, str]], ks: List[int], embeddings, chunk_config) -> Dict[str, Any]:
+    store = ChromaVectorStore(
+        persistent_path=tempfile.mkdtemp(prefix="retrieval_eval_"),
+        collection_name=f"eval_{splitter}",
+        chunk_config=chunk_config,
+        embeddings=embeddings,
+        splitter=splitter,
+    )
+    start = time.perf_counter()
+    ids = store.add_documents([Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in docs])
+    ingest_seconds = time.perf_counter() - start
+
+    hits = {k: 0 for k in ks}
+    context_tokens = {k: 0 for k in ks}
+    for item in queries:
+        results = store.similarity_search(item["query"], k=max(ks))
+        for k in ks:
+            top = results[:k]
+            hits[k] += any(item["expected"] in doc.page_content for doc in top)
+            context_tokens[k] += sum(store.text_splitter._length_function(doc.page_content) for doc in top)
+    n = len(queries) or 1
+    return {
+        "splitter": splitter,
+        "chunks": len(ids),
+        "ingest_seconds": ingest_seconds,
+        "hit_rate": {k: hits[k] / n for k in ks},
+        "avg_context_tokens": {k: context_tokens[k] / n for k in ks},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", nargs="*", default=[os.path.join(DATA_DIR, "sample_docs.md")])
+    parser.add_argument("--queries", default=os.path.join(DATA_DIR, "retrieval_queries.jsonl"))
+    parser.add_argument("--k", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=20)
+    parser.add_argument("--splitters", nargs="*", default=["recursive", "code_aware"])
+    parser.add_argument("--embeddings", choices=["lexical", "google"], default="lexical")
+    parser.add_argument("--output", default="retrieval_eval.json")
+    args = parser.parse_args()
+
+    if args.embeddings == "google":
+        from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+        embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+    else:
+        embeddings = LexicalEmbeddings()
+
+    docs = load_docs(args.docs)
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+    chunk_config = {"chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap}
+
+    results = [evaluate(s, docs, queries, args.k, embeddings, chunk_config) for s in args.splitters]
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "results": results}, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
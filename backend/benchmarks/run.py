@@ -0,0 +1,212 @@
+"""
+Offline end-to-end benchmarks for the agent graphs and the vector store.
+
+Runs the real graphs and ChromaVectorStore against FakeChatModel and
+FakeEmbeddings, so no API quota is used. Run from the backend directory:
+
+    python -m benchmarks.run --requests 50 --concurrency 8 --output bench_results.json
+    python -m benchmarks.run --compare bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from agents import build_codegen_graph, build_supervisor_agent, build_testgen_graph
+from infrastructure.vectorstore import ChromaVectorStore
+from utils.singleflight import coalescing_metrics
+from utils.usage import track_usage
+from .fakes import FakeChatModel, FakeEmbeddings, SAMPLE_CODE
+
+CODEGEN_QUERY = "Write a function that divides two numbers and rejects zero."
+TESTGEN_QUERY = f"Write unit tests for this code:\n```python\n{SAMPLE_CODE}```"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def make_corpus(n_docs: int, words_per_doc: int = 600) -> List[Document]:
+    vocabulary = ["graph", "node", "state", "edge", "retriever", "prompt", "model", "chain",
+                  "tool", "message", "agent", "vector", "embedding", "query", "document"]
+    docs = []
+    for i in range(n_docs):
+        words = [vocabulary[(i * 7 + j * 3) % len(vocabulary)] for j in range(words_per_doc)]
+        docs.append(Document(page_content=" ".join(words), metadata={"source": f"doc_{i}.md"}))
+    return docs
+
+
+def make_store(embeddings: FakeEmbeddings, collection_name: str) -> ChromaVectorStore:
+    return ChromaVectorStore(
+        persistent_path=tempfile.mkdtemp(prefix="bench_chroma_"),
+        collection_name=collection_name,
+        embeddings=embeddings,
+    )
+
+
+def bench_ingestion(corpus_sizes: List[int], embedding_latency: float) -> List[Dict[str, Any]]:
+    results = []
+    for size in corpus_sizes:
+        embeddings = FakeEmbeddings(latency=embedding_latency)
+        store = make_store(embeddings, f"ingest_{size}")
+        docs = make_corpus(size)
+        start = time.perf_counter()
+        ids = store.add_documents(docs)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "corpus_docs": size,
+            "chunks": len(ids),
+            "seconds": elapsed,
+            "chunks_per_second": len(ids) / elapsed if elapsed else 0.0,
+            "embedding_calls": embeddings.calls,
+        })
+    return results
+
+
+async def bench_graph(
+    name: str,
+    graph,
+    model: FakeChatModel,
+    make_input: Callable[[int], Dict[str, Any]],
+    requests: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await graph.ainvoke(make_input(i))
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    model.reset_stats()
+    saved_before = {group: stats["saved"] for group, stats in coalescing_metrics().items()}
+    start = time.perf_counter()
+    with track_usage(token_budget=None) as usage:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    total = usage.report.total
+    saved = {group: stats["saved"] - saved_before[group] for group, stats in coalescing_metrics().items()}
+    return {
+        "graph": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "wall_seconds": wall,
+        "requests_per_second": requests / wall if wall else 0.0,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "llm_calls_per_request": model.call_count / requests if requests else 0.0,
+        "llm_calls_by_kind": model.calls,
+        "input_tokens_per_request": total.input_tokens / requests if requests else 0.0,
+        "output_tokens_per_request": total.output_tokens / requests if requests else 0.0,
+        "calls_saved_by_coalescing": saved,
+        "tokens_by_node": {node: stats.input_tokens + stats.output_tokens for node, stats in usage.report.by_node.items()},
+    }
+
+
+async def run_graph_benchmarks(args) -> List[Dict[str, Any]]:
+    model = FakeChatModel(latency=args.llm_latency, tokens_per_second=args.tokens_per_second)
+    store = make_store(FakeEmbeddings(latency=args.embedding_latency), "graphs")
+    store.add_documents(make_corpus(args.graph_corpus_docs), framework="python")
+    retriever = store.as_retriever()
+
+    graphs = {
+        "codegen": (build_codegen_graph(retriever=retriever, code_gen_model=model),
+                    lambda i: {"messages": [("user", CODEGEN_QUERY)]}),
+        "testgen": (build_testgen_graph(model=model),
+                    lambda i: {"messages": [("user", TESTGEN_QUERY)], "max_generation_attempts": 3}),
+        "supervisor": (build_supervisor_agent(supervisor_model=model, worker_model=model, retriever=retriever),
+                       lambda i: {"messages": [("user", TESTGEN_QUERY if i % 2 else CODEGEN_QUERY)]}),
+    }
+    results = []
+    for name, (graph, make_input) in graphs.items():
+        if args.graphs and name not in args.graphs:
+            continue
+        results.append(await bench_graph(name, graph, model, make_input, args.requests, args.concurrency))
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]):
+    """Prints relative change of the headline metrics between two result files."""
+    def index(results, key):
+        return {r[key]: r for r in results}
+
+    rows = []
+    for section, key, metrics in (
+        ("graphs", "graph", ("requests_per_second", "latency_p50_ms", "latency_p99_ms", "llm_calls_per_request",
+                                "input_tokens_per_request")),
+        ("ingestion", "corpus_docs", ("chunks_per_second",)),
+    ):
+        before, after = index(previous.get(section, []), key), index(current.get(section, []), key)
+        for name in before.keys() & after.keys():
+            for metric in metrics:
+                old, new = before[name][metric], after[name][metric]
+                change = (new - old) / old * 100 if old else 0.0
+                rows.append(f"{section}/{name}/{metric}: {old:.2f} -> {new:.2f} ({change:+.1f}%)")
+    print("\n".join(sorted(rows)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--graphs", nargs="*", choices=["codegen", "testgen", "supervisor"])
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds to first token per LLM call.")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0, help="Output token rate, 0 for instant.")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per embedding call.")
+    parser.add_argument("--corpus-sizes", type=int, nargs="*", default=[10, 100, 500])
+    parser.add_argument("--graph-corpus-docs", type=int, default=50)
+    parser.add_argument("--skip-ingestion", action="store_true")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Previous results file to compare against.")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    results = {
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "graphs": asyncio.run(run_graph_benchmarks(args)),
+        "ingestion": [] if args.skip_ingestion else bench_ingestion(args.corpus_sizes, args.embedding_latency),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps({"graphs": results["graphs"], "ingestion": results["ingestion"]}, indent=2))
+
+    if previous is not None:
+        compare(previous, results)
+
+
+if __name__ == "__main__":
+    main()
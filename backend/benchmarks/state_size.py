@@ -0,0 +1,130 @@
+"""
+Per-step overhead and memory per concurrent session of the agent graphs.
+
+The graphs run with an instant FakeChatModel and an in-memory checkpointer, so
+the time per superstep is LangGraph's own work (copying, merging and
+checkpointing state) plus the nodes' local work. Reported per graph:
+supersteps per session, milliseconds per step, checkpoint bytes per session
+(every checkpoint and channel blob as serialized by the checkpointer) and the
+Python heap retained per concurrent session (tracemalloc).
+
+Only the graph builders are used, so the script also runs unchanged in a
+checkout of an earlier commit to measure a previous state layout. Run from the
+backend directory:
+
+    python -m benchmarks.state_size --sessions 50 --output state_before.json   # older checkout
+    python -m benchmarks.state_size --sessions 50 --compare state_before.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+from langgraph.checkpoint.memory import MemorySaver
+
+from agents import build_codegen_graph, build_supervisor_agent, build_testgen_graph
+from .fakes import FakeChatModel, FakeEmbeddings
+from .run import CODEGEN_QUERY, TESTGEN_QUERY, make_corpus, make_store
+
+
+def serialized_bytes(value: Any) -> int:
+    """Total size of the bytes objects in nested dicts, tuples and lists."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(serialized_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(serialized_bytes(v) for v in value)
+    return 0
+
+
+async def measure(name: str, graph, make_input: Callable[[int], Dict[str, Any]], sessions: int, concurrency: int) -> Dict[str, Any]:
+    saver = MemorySaver()
+    graph.checkpointer = saver
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            try:
+                await graph.ainvoke(make_input(i), {"configurable": {"thread_id": f"{name}-{i}"}, "recursion_limit": 50})
+            except Exception:
+                errors += 1
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(sessions)))
+    wall = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    steps = sum(1 for i in range(sessions) for _ in saver.list({"configurable": {"thread_id": f"{name}-{i}"}}))
+    checkpoint_bytes = serialized_bytes(saver.storage) + serialized_bytes(getattr(saver, "blobs", {}))
+    return {
+        "graph": name,
+        "sessions": sessions,
+        "errors": errors,
+        "steps_per_session": steps / sessions,
+        "ms_per_step": wall / steps * 1000 if steps else 0.0,
+        "checkpoint_kb_per_session": checkpoint_bytes / sessions / 1024,
+        "retained_kb_per_session": (retained - baseline) / sessions / 1024,
+        "peak_kb_per_session": (peak - baseline) / sessions / 1024,
+    }
+
+
+async def run(args) -> list:
+    model = FakeChatModel()
+    store = make_store(FakeEmbeddings(), "state_size")
+    store.add_documents(make_corpus(args.corpus_docs), framework="python")
+    retriever = store.as_retriever()
+    graphs = {
+        "codegen": (build_codegen_graph(retriever=retriever, code_gen_model=model),
+                    lambda i: {"messages": [("user", f"{CODEGEN_QUERY} ({i})")]}),
+        "testgen": (build_testgen_graph(model=model),
+                    lambda i: {"messages": [("user", f"{TESTGEN_QUERY}\n# session {i}")], "max_generation_attempts": 3}),
+        "supervisor": (build_supervisor_agent(supervisor_model=model, worker_model=model, retriever=retriever),
+                       lambda i: {"messages": [("user", (TESTGEN_QUERY if i % 2 else CODEGEN_QUERY) + f"\n# session {i}")]}),
+    }
+    return [
+        await measure(name, graph, make_input, args.sessions, args.concurrency)
+        for name, (graph, make_input) in graphs.items()
+        if not args.graphs or name in args.graphs
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--graphs", nargs="*", choices=["codegen", "testgen", "supervisor"])
+    parser.add_argument("--corpus-docs", type=int, default=50)
+    parser.add_argument("--output", default="state_size.json")
+    parser.add_argument("--compare", help="Results file of an earlier run to compare against.")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "results": results}, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            before = {r["graph"]: r for r in json.load(f)["results"]}
+        for after in results:
+            old = before.get(after["graph"])
+            if old is None:
+                continue
+            for metric in ("ms_per_step", "checkpoint_kb_per_session", "retained_kb_per_session", "peak_kb_per_session"):
+                change = (after[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+                print(f"{after['graph']}/{metric}: {old[metric]:.2f} -> {after[metric]:.2f} ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Compares the Chroma and compact (int8 + memory-mapped) vector store backends on
+recall@k against exact float32 search, query latency, resident memory and disk use.
+
+Each backend is built and queried in its own subprocess so RSS numbers are not
+polluted by the other backend or by the generated data. Run from the backend directory:
+
+    python -m benchmarks.vector_bench --docs 50000 --dim 768 --k 10
+    python -m benchmarks.vector_bench --backends compact compact-ivf --nprobe 16
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import psutil
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from infrastructure.vectorstore import ChromaVectorStore
+from .run import percentile
+
+
+class LookupEmbeddings(Embeddings):
+    """Returns precomputed vectors for texts named "doc-<i>" or "query-<i>"."""
+    def __init__(self, docs: np.ndarray, queries: np.ndarray):
+        self.matrices = {"doc": docs, "query": queries}
+
+    def _embed(self, text: str) -> List[float]:
+        kind, index = text.rsplit("-", 1)
+        return self.matrices[kind][int(index)].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def make_data(n_docs: int, n_queries: int, dim: int, clusters: int, seed: int = 0):
+    """Clustered unit vectors, so nearest neighbours are meaningful and ANN has structure to exploit."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+
+    def sample(n: int) -> np.ndarray:
+        points = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(n_docs), sample(n_queries)
+
+
+def exact_neighbours(docs: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ docs.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 2**20
+
+
+def storage(backend: str) -> str:
+    """compact-ivf queries the compact files with an in-memory index on top."""
+    return "chroma" if backend == "chroma" else "compact"
+
+
+def open_store(workdir: str, backend: str, embeddings: Embeddings) -> ChromaVectorStore:
+    return ChromaVectorStore(
+        persistent_path=os.path.join(workdir, storage(backend)),
+        collection_name="bench",
+        embeddings=embeddings,
+        backend=storage(backend),
+    )
+
+
+def build(workdir: str, backend: str, batch_size: int) -> Dict[str, Any]:
+    docs = np.load(os.path.join(workdir, "docs.npy"), mmap_mode="r")
+    store = open_store(workdir, backend, LookupEmbeddings(docs, docs[:0]))
+    start = time.perf_counter()
+    for offset in range(0, len(docs), batch_size):
+        batch = [Document(page_content=f"doc-{i}", metadata={"i": i}) for i in range(offset, min(offset + batch_size, len(docs)))]
+        store.add_documents(batch, split=False)
+    return {"build_seconds": time.perf_counter() - start}
+
+
+def query(workdir: str, backend: str, k: int, nprobe: int) -> Dict[str, Any]:
+    queries = np.load(os.path.join(workdir, "queries.npy"))
+    truth = np.load(os.path.join(workdir, "truth.npy"))
+    rss_before = rss_mb()
+    store = open_store(workdir, backend, LookupEmbeddings(queries[:0], queries))
+    index_seconds = 0.0
+    if backend == "compact-ivf":
+        start = time.perf_counter()
+        store.vector_store.build_ann_index(nprobe=nprobe)
+        index_seconds = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for j in range(len(queries)):
+        start = time.perf_counter()
+        results = store.similarity_search(f"query-{j}", k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len({doc.metadata["i"] for doc in results} & set(truth[j].tolist()))
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "rss_mb": rss_mb(),
+        "rss_delta_mb": rss_mb() - rss_before,
+        "index_seconds": index_seconds,
+        "disk_mb": directory_bytes(os.path.join(workdir, storage(backend))) / 2**20,
+    }
+
+
+def run_worker(args: argparse.Namespace, phase: str, backend: str) -> Dict[str, Any]:
+    command = [
+        sys.executable, "-m", "benchmarks.vector_bench", "--phase", phase, "--backends", backend,
+        "--workdir", args.workdir, "--k", str(args.k), "--nprobe", str(args.nprobe), "--batch-size", str(args.batch_size),
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--backends", nargs="*", default=["chroma", "compact", "compact-ivf"])
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--phase", choices=["build", "query"], default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default="vector_bench.json")
+    args = parser.parse_args()
+
+    if args.phase:
+        backend = args.backends[0]
+        result = build(args.workdir, backend, args.batch_size) if args.phase == "build" else query(args.workdir, backend, args.k, args.nprobe)
+        print(json.dumps(result))
+        return
+
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="vector_bench_")
+    docs, queries = make_data(args.docs, args.queries, args.dim, args.clusters)
+    np.save(os.path.join(args.workdir, "docs.npy"), docs)
+    np.save(os.path.join(args.workdir, "queries.npy"), queries)
+    np.save(os.path.join(args.workdir, "truth.npy"), exact_neighbours(docs, queries, args.k))
+    del docs
+
+    results, builds = [], {}
+    for backend in args.backends:
+        if storage(backend) not in builds:
+            builds[storage(backend)] = run_worker(args, "build", backend)
+        results.append({"backend": backend, **builds[storage(backend)], **run_worker(args, "query", backend)})
+
+    report = {"config": {k: v for k, v in vars(args).items() if k != "phase"}, "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
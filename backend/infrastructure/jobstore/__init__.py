@@ -0,0 +1 @@
+from .sqliteStore import SQLiteJobStore
@@ -0,0 +1,185 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, List, Optional
+
+from utils.schemas import Job, JobKind, JobStatus, RetrievalConfig
+
+# Columns added after the first release, created on databases that predate them.
+_OPTION_COLUMNS = {"framework": "TEXT", "tenant": "TEXT", "retrieval": "TEXT", "token_budget": "INTEGER"}
+
+
+class SQLiteJobStore:
+    """
+    Persists background jobs in a local SQLite database so job status survives
+    process restarts.
+
+    Attributes:
+        path: Path to the SQLite database file.
+        conn: The shared SQLite connection.
+    """
+    def __init__(self, path: str = "jobs.db"):
+        """
+        Initializes the job store and creates the jobs table if needed.
+
+        Args:
+            path: Path to the SQLite database file. Use ":memory:" for a
+                  non-durable store.
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    input TEXT NOT NULL,
+                    framework TEXT,
+                    tenant TEXT,
+                    retrieval TEXT,
+                    token_budget INTEGER,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+                """
+            )
+            columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+            for column, sql_type in _OPTION_COLUMNS.items():
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {sql_type}")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+
+    def create(
+        self,
+        input_text: str,
+        kind: JobKind = "chat",
+        framework: Optional[str] = None,
+        tenant: Optional[str] = None,
+        retrieval: Optional[RetrievalConfig] = None,
+        token_budget: Optional[int] = None,
+    ) -> Job:
+        """
+        Inserts a new queued job.
+
+        Args:
+            input_text: The user input the job will run with.
+            kind: Which graph should execute the job.
+            framework: Framework the request asked for.
+            tenant: Tenant the request is routed for.
+            retrieval: Retrieval settings sent with the request.
+            token_budget: Token budget sent with the request.
+
+        Returns:
+            The created Job.
+        """
+        job = Job(
+            id=uuid.uuid4().hex, kind=kind, input=input_text, framework=framework, tenant=tenant,
+            retrieval=retrieval, token_budget=token_budget, created_at=time.time(),
+        )
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (id, kind, input, framework, tenant, retrieval, token_budget, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.id, job.kind, job.input, job.framework, job.tenant,
+                    job.retrieval.model_dump_json() if job.retrieval else None,
+                    job.token_budget, job.status, job.created_at,
+                ),
+            )
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Fetches a job by id.
+
+        Returns:
+            The Job, or None if it does not exist.
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list(self, status: Optional[JobStatus] = None, limit: int = 100) -> List[Job]:
+        """
+        Lists the most recent jobs, optionally filtered by status.
+        """
+        query = "SELECT * FROM jobs"
+        params: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self.conn.execute(query, params + (limit,)).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def mark_running(self, job_id: str) -> bool:
+        """
+        Moves a queued job to running.
+
+        Returns:
+            False if the job was no longer queued (e.g. it was cancelled).
+        """
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id: str, status: JobStatus, result: Any = None, error: Optional[str] = None) -> Optional[Job]:
+        """
+        Records the terminal status of a job. Jobs that already finished are left untouched.
+
+        Returns:
+            The updated Job, or None if it does not exist.
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+        return self.get(job_id)
+
+    def recover(self) -> List[str]:
+        """
+        Prepares the store after a restart: jobs that were running when the
+        process died are marked failed, queued jobs are returned for re-enqueueing.
+
+        Returns:
+            Ids of jobs still queued, oldest first.
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', finished_at = ? "
+                "WHERE status = 'running'",
+                (time.time(),),
+            )
+            rows = self.conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        data = dict(row)
+        if data["result"] is not None:
+            data["result"] = json.loads(data["result"])
+        if data["retrieval"] is not None:
+            data["retrieval"] = RetrievalConfig.model_validate_json(data["retrieval"])
+        return Job(**data)
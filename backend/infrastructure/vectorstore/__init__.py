@@ -1 +1,5 @@
-from .chromaStore import ChromaVectorStore
\ No newline at end of file
+from .chromaStore import ChromaVectorStore
+from .compactStore import CompactVectorStore
+from .manager import CollectionManager
+from .metadataTags import forget_metadata_tags, has_metadata_tag
+from .splitter import CodeAwareTextSplitter
@@ -1,21 +1,41 @@
-from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
 import chromadb
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List, Dict, Optional, Any
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Any, Literal
+from collections import Counter
+from dataclasses import asdict
+import os
+import shutil
+import time
+
+from utils.tracing import TracedEmbeddings, tracer
+from .splitter import CodeAwareTextSplitter
+from .loaders import get_loader, iter_files, parse_files
+from .compactStore import CompactVectorStore
+from .sourceIndex import SourceIndex
+from .metadataTags import forget_metadata_tags
 class ChromaVectorStore:
     """
     Manages a ChromaDB vector store for document storage and retrieval.
 
-    Handles loading, splitting, embedding, adding, and deleting documents,
-    primarily focusing on PDF files initially.
+    Handles loading, splitting, embedding, adding, and deleting documents.
+    Files are loaded through the loader registry in `loaders.py` (PDF, Markdown,
+    reStructuredText, HTML, Python source and plain text).
+
+    With backend="compact" the same interface is served by CompactVectorStore
+    (int8-quantized, memory-mapped vectors re-scored at full precision) instead of Chroma.
+
+    A persistent source -> chunk-count index (`sources.sqlite` in persistent_path)
+    is maintained on ingest and delete, so listing sources does not scan the collection.
+    Bulk deletes run in fixed-size pages.
 
     Attributes:
-        client: The ChromaDB persistent client instance.
+        client: The ChromaDB persistent client instance (None for the compact backend).
         embeddings: The embedding model instance (Google Generative AI).
-        vector_store: The LangChain Chroma vector store instance.
+        vector_store: The LangChain Chroma (or CompactVectorStore) vector store instance.
         text_splitter: The text splitter instance for chunking documents.
     """
     def __init__(
@@ -23,7 +43,10 @@ class ChromaVectorStore:
         persistent_path: str,
         embeddings_model: str = "models/text-embedding-004",
         collection_name: str = "my_documents",
-        chunk_config: dict = {"chunk_size": 500, "chunk_overlap": 20}
+        chunk_config: dict = {"chunk_size": 500, "chunk_overlap": 20},
+        embeddings: Optional[Embeddings] = None,
+        splitter: Literal["code_aware", "recursive"] = "code_aware",
+        backend: Literal["chroma", "compact"] = "chroma"
     ):
         """
         Initializes the VectorStore.
@@ -34,35 +57,70 @@ class ChromaVectorStore:
             collection_name: Name of the collection within ChromaDB.
             chunk_config: Dictionary with 'chunk_size' and 'chunk_overlap'
                             for the text splitter.
+            embeddings: Optional embeddings instance to use instead of the Google
+                        Generative AI model named by embeddings_model.
+            splitter: "code_aware" keeps code blocks and API signatures whole and
+                      records section paths; "recursive" is the plain token splitter.
+            backend: "chroma" or "compact". The compact backend stores the collection
+                     under `<persistent_path>/compact/<collection_name>`.
         """
-        self.client = chromadb.PersistentClient(path=persistent_path)
-        self.embeddings = GoogleGenerativeAIEmbeddings(model=embeddings_model)
-        self.vector_store = Chroma(
+        self.persistent_path = persistent_path
+        self.collection_name = collection_name
+        self.chunk_config = chunk_config
+        self.splitter = splitter
+        self.backend = backend
+        self.embeddings = TracedEmbeddings(embeddings or GoogleGenerativeAIEmbeddings(model=embeddings_model))
+        self.client = None if backend == "compact" else chromadb.PersistentClient(path=persistent_path)
+        self.vector_store = self._open_vector_store()
+        os.makedirs(persistent_path, exist_ok=True)
+        self.source_index = SourceIndex(os.path.join(persistent_path, "sources.sqlite"))
+        if not self.source_index.is_built(collection_name) and self.count() == 0:
+            self.source_index.reset(collection_name)
+        if splitter == "code_aware":
+            self.text_splitter = CodeAwareTextSplitter(**chunk_config)
+        else:
+            self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+                **chunk_config
+            )
+
+    def _open_vector_store(self):
+        if self.backend == "compact":
+            return CompactVectorStore(
+                path=os.path.join(self.persistent_path, "compact", self.collection_name),
+                embedding_function=self.embeddings,
+                collection_name=self.collection_name,
+            )
+        return Chroma(
             client=self.client,
-            collection_name=collection_name,
+            collection_name=self.collection_name,
             embedding_function=self.embeddings,
         )
-        self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            **chunk_config
-        )
 
     def load_document(self, path: str) -> list[Document]:
         """
-        Loads documents from a PDF file path and optionally splits them.
+        Loads documents from a file using the loader registered for its extension.
 
         Args:
-            path: The path to the PDF file.
-            split: Whether to split the loaded documents using the configured text splitter. Defaults to True.
+            path: The path to the file (PDF, Markdown, reStructuredText, HTML, Python or text).
 
         Returns:
-            A list of LangChain Document objects (split or unsplit).
-            Returns an empty list if loading fails.
+            A list of unsplit LangChain Document objects.
+
+        Raises:
+            ValueError: If no loader is registered for the file type.
         """
-        loader = PyMuPDFLoader(path)
-        docs = loader.load()
-        return docs
+        loader = get_loader(path)
+        if loader is None:
+            raise ValueError(f"Unsupported file type: {path}")
+        return list(loader(path))
 
-    def add_documents(self, documents: list[Document], split: bool = True) -> list[str]:
+    def add_documents(
+        self,
+        documents: list[Document],
+        split: bool = True,
+        framework: Optional[str] = None,
+        version: Optional[str] = None
+    ) -> list[str]:
         """
         Adds a list of documents to the vector store, optionally splitting them first.
 
@@ -70,68 +128,243 @@ class ChromaVectorStore:
             documents: A list of LangChain Document objects.
             split: Whether to split the documents before adding. Defaults to False,
             assuming documents might already be split or splitting is handled elsewhere.
+            framework: Optional framework name stored in each chunk's metadata so
+                       retrieval can be pre-filtered by framework.
+            version: Optional framework version stored in each chunk's metadata.
 
         Returns:
             A list of IDs for the added documents. Returns an empty list on failure.
         """
-        if split:
-            documents = self.text_splitter.split_documents(documents)
-        return self.vector_store.add_documents(documents)
+        with tracer.start_as_current_span("chroma.add_documents") as span:
+            # Annotated copies; the caller's documents are left as they were.
+            tags = {key: value for key, value in (("framework", framework), ("version", version)) if value}
+            documents = [Document(page_content=doc.page_content, metadata={**doc.metadata, **tags}) for doc in documents]
+            if split:
+                documents = self.text_splitter.split_documents(documents)
+            span.set_attribute("chroma.chunks", len(documents))
+            ids = self.vector_store.add_documents(documents)
+            self.source_index.add(self.collection_name, Counter(doc.metadata.get("source", "") for doc in documents))
+            forget_metadata_tags(self.collection_name)
+            return ids
 
-    def create_index(self, path: str) -> list[str]:
+    def create_index(self, path: str, framework: Optional[str] = None, version: Optional[str] = None) -> list[str]:
         """
         Loads, splits (by default in load_document), and adds documents from a file path.
         This is a convenience method combining load_document and add_documents.
 
         Args:
             path: The path to the PDF file.
+            framework: Optional framework name indexed as chunk metadata.
+            version: Optional framework version indexed as chunk metadata.
 
         Returns:
             A list of IDs for the added document chunks.
         """
         documents = self.load_document(path)
-        return self.add_documents(documents)
+        return self.add_documents(documents, framework=framework, version=version)
+
+    def index_files(
+        self,
+        paths: Iterable[str],
+        framework: Optional[str] = None,
+        version: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        batch_size: int = 256
+    ) -> Dict[str, Any]:
+        """
+        Loads, splits and adds many files. Parsing runs in a process pool and chunks
+        are embedded in batches as files complete, so memory stays bounded.
+
+        Args:
+            paths: File paths to index.
+            framework: Optional framework name indexed as chunk metadata.
+            version: Optional framework version indexed as chunk metadata.
+            max_workers: Size of the parse pool. Defaults to the CPU count.
+            batch_size: Number of chunks embedded and added per batch.
+
+        Returns:
+            A report with totals and per-file stats (size, parse time, chunks, error).
+        """
+        files, ids, batch = [], [], []
+        start = time.perf_counter()
+        for result in parse_files(paths, splitter=self.splitter, max_workers=max_workers, **self.chunk_config):
+            batch.extend(result.chunks)
+            if result.final:
+                files.append(asdict(result.stats))
+            while len(batch) >= batch_size:
+                ids.extend(self.add_documents(batch[:batch_size], split=False, framework=framework, version=version))
+                batch = batch[batch_size:]
+        if batch:
+            ids.extend(self.add_documents(batch, split=False, framework=framework, version=version))
+        return {
+            "files": len(files),
+            "chunks": len(ids),
+            "bytes": sum(f["size_bytes"] for f in files),
+            "seconds": time.perf_counter() - start,
+            "errors": [f for f in files if f["error"]],
+            "file_stats": files,
+        }
+
+    def index_directory(
+        self,
+        root: str,
+        extensions: Optional[Iterable[str]] = None,
+        framework: Optional[str] = None,
+        version: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        batch_size: int = 256
+    ) -> Dict[str, Any]:
+        """
+        Indexes every supported file under a directory, e.g. a repository's docs and source.
 
-    def as_retriever(self):
+        Args:
+            root: Directory to walk. Hidden directories, __pycache__, node_modules and venv are skipped.
+            extensions: Optional list of extensions to include (e.g. [".md", ".py"]).
+                        Defaults to every registered loader type.
+
+        Returns:
+            The report returned by index_files.
+        """
+        return self.index_files(iter_files(root, extensions), framework, version, max_workers, batch_size)
+
+    def as_retriever(self, search_type: str = "similarity", search_kwargs: Optional[Dict[str, Any]] = None):
         """
         Returns the vector store configured as a LangChain Retriever.
 
         Args:
+            search_type: "similarity", "mmr" or "similarity_score_threshold".
             search_kwargs: Optional dictionary of keyword arguments to pass to the
                             retriever's search methods (e.g., {'k': 5, 'filter': ...}).
 
         Returns:
             A LangChain Retriever instance.
         """
-        return self.vector_store.as_retriever()
+        return self.vector_store.as_retriever(search_type=search_type, search_kwargs=search_kwargs or {})
+
+    def iter_metadata(self, page_size: int = 1000, where: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Streams chunk metadata in pages of `page_size`, so large collections are
+        never loaded into memory at once.
+
+        Args:
+            page_size: Number of records fetched per page.
+            where: Optional metadata filter.
+
+        Yields:
+            Lists of metadata dictionaries.
+        """
+        offset = 0
+        while True:
+            page = self.vector_store.get(where=where, limit=page_size, offset=offset, include=["metadatas"])["metadatas"]
+            if not page:
+                return
+            yield page
+            offset += len(page)
+
+    def rebuild_source_index(self, page_size: int = 1000) -> Dict[str, int]:
+        """
+        Recounts chunks per source with a paginated scan and replaces the index.
+        Needed once for collections created before the index existed.
+
+        Returns:
+            The source -> chunk-count mapping.
+        """
+        counts: Counter = Counter()
+        for page in self.iter_metadata(page_size):
+            counts.update((metadata or {}).get("source", "") for metadata in page)
+        self.source_index.reset(self.collection_name, dict(counts))
+        return dict(counts)
+
+    def source_counts(self) -> Dict[str, int]:
+        """
+        Number of chunks per source, read from the source index (built by a
+        one-off paginated scan if the collection predates it).
+        """
+        if not self.source_index.is_built(self.collection_name):
+            return self.rebuild_source_index()
+        return self.source_index.counts(self.collection_name)
 
     def list_source(self) -> list[str]:
         """
-        Retrieves a list of unique source identifiers from the document metadata.
+        Retrieves a list of unique source identifiers from the source index.
 
         Returns:
             A list of unique source strings present in the collection.
             Returns an empty list if the collection is empty or an error occurs.
         """
-        metadatas = self.vector_store.get(include=["metadatas"])["metadatas"]
-        sources = set(metadata["source"] for metadata in metadatas)
-        return list(sources)
-    def delete_documents_by_source(self, source: str):
+        try:
+            return list(self.source_counts())
+        except Exception:
+            return []
+
+    def iter_delete(
+        self,
+        where: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000,
+        total: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Deletes matching chunks (all chunks if `where` is None) one page of IDs at a
+        time, yielding progress after each batch.
+
+        Args:
+            where: Optional metadata filter selecting the chunks to delete.
+            batch_size: Number of IDs fetched and deleted per batch.
+            total: Expected number of chunks, reported in progress if known.
+
+        Yields:
+            Progress dictionaries: {'deleted': int, 'total': int | None, 'seconds': float}.
+        """
+        start = time.perf_counter()
+        deleted = 0
+        previous: List[str] = []
+        while True:
+            ids = self.vector_store.get(where=where, limit=batch_size, include=[])["ids"]
+            if not ids:
+                return
+            if ids == previous:
+                raise RuntimeError(f"Deleting {len(ids)} chunks from '{self.collection_name}' had no effect.")
+            self.vector_store.delete(ids=ids)
+            deleted += len(ids)
+            previous = ids
+            yield {"deleted": deleted, "total": total, "seconds": time.perf_counter() - start}
+
+    def delete_documents_by_source(
+        self,
+        source: str,
+        batch_size: int = 1000,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> str:
         """
         Deletes all document chunks where the 'source' metadata field exactly matches
-        the provided source string.
+        the provided source string, one page of `batch_size` at a time (see
+        iter_delete). The source index is updated with the chunks actually deleted.
 
         Args:
             source: The exact source identifier (e.g., file path) of the documents to delete.
+            batch_size: Number of chunks deleted per batch.
+            progress: Optional callback receiving the progress dictionaries of iter_delete.
 
         Returns:
-            A status message indicating success or failure.
+            A status message with the number of chunks actually deleted, or the failure.
         """
+        deleted = 0
         try:
-            self.vector_store.delete(where={"source": source})
-            return f"Attempted deletion for documents with exact source '{source}'."
+            expected = self.source_index.counts(self.collection_name).get(source) if self.source_index.is_built(self.collection_name) else None
+            for step in self.iter_delete(where={"source": source}, batch_size=batch_size, total=expected):
+                deleted = step["deleted"]
+                if progress:
+                    progress(step)
+            self.source_index.remove(self.collection_name, [source])
+            return f"Deleted {deleted} documents with exact source '{source}'."
         except Exception as e:
-            return f"Error deleting documents from source '{source}': {str(e)}"
+            # Keep the index in step with the batches that were deleted.
+            if deleted:
+                self.source_index.add(self.collection_name, {source: -deleted})
+            return f"Error deleting documents from source '{source}' after {deleted} were deleted: {str(e)}"
+        finally:
+            forget_metadata_tags(self.collection_name)
+
     def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
         """
         Performs a similarity search against the vector store.
@@ -147,42 +380,105 @@ class ChromaVectorStore:
             respecting the k limit and filter. Returns empty list on error.
         """
         try:
-            results = self.vector_store.similarity_search(query=query, k=k, filter=filter)
+            with tracer.start_as_current_span("chroma.query", attributes={"chroma.k": k}) as span:
+                results = self.vector_store.similarity_search(query=query, k=k, filter=filter)
+                span.set_attribute("chroma.results", len(results))
             return results
         except Exception as e:
             return []
+    def count(self) -> int:
+        """Number of chunks in the collection."""
+        if self.backend == "compact":
+            return self.vector_store.count()
+        return self.vector_store._collection.count()
+
     def get_collection_info(self) -> Dict[str, Any]:
         """
-        Retrieves basic information about the collection, primarily the document count.
+        Retrieves basic information about the collection: its name, backend,
+        document count and on-disk size.
 
         Returns:
             A dictionary containing information like the number of documents (chunks).
-            Example: {'count': 150}
+            Example: {'name': 'my_documents', 'backend': 'chroma', 'count': 150, 'size_bytes': 1048576}
+            size_bytes covers the collection's own files for the compact backend and the
+            whole Chroma directory (shared by its collections) for the chroma backend.
             Returns {'count': 0, 'error': 'message'} on failure.
         """
+        info = {"name": self.collection_name, "backend": self.backend}
         try:
-            count = self.vector_store.count()
-            return {"count": count}
+            path = self.vector_store.path if self.backend == "compact" else self.persistent_path
+            size_bytes = sum(
+                os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files
+            )
+            return {**info, "count": self.count(), "size_bytes": size_bytes}
         except Exception as e:
-            return {"count": 0, "error": str(e)}
-    def clear_collection(self) -> str:
+            return {**info, "count": 0, "error": str(e)}
+    def clear_collection(
+        self,
+        batch_size: int = 1000,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> str:
         """
         Deletes ALL documents (chunks) from the collection. Use with caution!
 
-        This retrieves all document IDs and then deletes them. It does not delete
-        the collection itself, only its contents.
+        IDs are fetched and deleted one page of `batch_size` at a time. It does not
+        delete the collection itself, only its contents; see reset_collection for
+        the faster drop-and-recreate path.
+
+        Args:
+            batch_size: Number of chunks deleted per batch.
+            progress: Optional callback receiving the progress dictionaries of iter_delete.
 
         Returns:
             A status message indicating success or failure.
         """
         try:
-            ids_to_delete = self.vector_store.get()['ids']
-            self.vector_store.delete(ids=ids_to_delete)
+            deleted = 0
+            for step in self.iter_delete(batch_size=batch_size, total=self.count()):
+                deleted = step["deleted"]
+                if progress:
+                    progress(step)
             # Verify deletion
-            new_count = self.vector_store.count()
+            new_count = self.count()
+            forget_metadata_tags(self.collection_name)
             if new_count == 0:
-                return f"Successfully cleared all {len(ids_to_delete)} documents from collection '{self.collection_name}'."
+                self.source_index.reset(self.collection_name)
+                return f"Successfully cleared all {deleted} documents from collection '{self.collection_name}'."
             else:
                 return f"Error: Failed to clear all documents from collection '{self.collection_name}'. {new_count} items remain."
         except Exception as e:
             return f"Error clearing collection '{self.collection_name}': {str(e)}"
+
+    def reset_collection(self) -> str:
+        """
+        Drops the collection and recreates it empty. Much faster than clear_collection
+        on large collections since no IDs are fetched, but the collection's own
+        settings are recreated from defaults.
+
+        Returns:
+            A status message indicating success or failure.
+        """
+        try:
+            count = self.count()
+            if self.backend == "compact":
+                self.vector_store.close()
+                shutil.rmtree(self.vector_store.path)
+            else:
+                self.client.delete_collection(self.collection_name)
+            self.vector_store = self._open_vector_store()
+            self.source_index.reset(self.collection_name)
+            forget_metadata_tags(self.collection_name)
+            return f"Dropped and recreated collection '{self.collection_name}' ({count} documents removed)."
+        except Exception as e:
+            return f"Error resetting collection '{self.collection_name}': {str(e)}"
+
+    def close(self):
+        """
+        Releases the source index connection and, for the compact backend, the
+        collection's SQLite connection and memory maps. The Chroma client is shared
+        by every collection under persistent_path and stays open.
+        """
+        if self.backend == "compact":
+            self.vector_store.close()
+        self.source_index.close()
+        forget_metadata_tags(self.collection_name)
@@ -0,0 +1,404 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _where_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """
+    Translates a Chroma-style metadata filter into a SQL condition over the JSON
+    metadata column. Filters come from requests: keys and values are only ever
+    bound as parameters, and a malformed filter raises ValueError.
+    """
+    if not isinstance(where, dict):
+        raise ValueError(f"Filter must be a dict, got {type(where).__name__}")
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+                raise ValueError(f"{key} takes a list of filters")
+            parts = [_where_sql(item) for item in value]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            params.extend(p for _, part_params in parts for p in part_params)
+            continue
+        if not isinstance(key, str) or key.startswith("$") or '"' in key or "\\" in key:
+            raise ValueError(f"Unsupported filter key: {key!r}")
+        path = f'$."{key}"'
+        if not isinstance(value, dict):
+            value = {"$eq": value}
+        for op, operand in value.items():
+            if op in ("$in", "$nin"):
+                if not isinstance(operand, list):
+                    raise ValueError(f"{op} takes a list")
+                placeholders = ", ".join("?" for _ in operand)
+                clauses.append(f"json_extract(metadata, ?) {'IN' if op == '$in' else 'NOT IN'} ({placeholders})")
+                params.extend([path, *operand])
+            elif op in _COMPARISONS:
+                clauses.append(f"json_extract(metadata, ?) {_COMPARISONS[op]} ?")
+                params.extend([path, operand])
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+class CompactVectorStore(VectorStore):
+    """
+    A LangChain vector store that keeps embeddings compact on CPU.
+
+    Vectors are L2-normalised and stored twice in contiguous, memory-mapped files:
+    int8 codes with a per-vector scale (about 4x smaller, scanned for every query)
+    and full float32 vectors (only read to re-score the best candidates).
+    Texts and metadata live in SQLite, so metadata filters are resolved in SQL
+    before any vector is touched. An optional in-memory IVF index restricts the
+    scan to the clusters nearest the query.
+
+    Supports the subset of the Chroma API used by ChromaVectorStore: add_documents,
+    similarity/MMR search with `filter`, get(where=...), delete(ids|where) and count().
+    """
+    def __init__(
+        self,
+        path: str,
+        embedding_function: Embeddings,
+        rescore_factor: int = 4,
+        block_size: int = 65536,
+        collection_name: Optional[str] = None,
+    ):
+        """
+        Args:
+            path: Directory for the vector files and the SQLite document table.
+            embedding_function: Embeddings used for documents and queries.
+            rescore_factor: How many int8 candidates per requested result are
+                            re-scored with full precision.
+            block_size: Rows scored per NumPy block during a full scan.
+            collection_name: Name of the collection; defaults to the directory name.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.collection_name = collection_name or os.path.basename(os.path.normpath(path))
+        self._embedding = embedding_function
+        self.rescore_factor = rescore_factor
+        self.block_size = block_size
+        self._lock = threading.RLock()
+        self.db = sqlite3.connect(os.path.join(path, "docs.sqlite"), check_same_thread=False)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "row INTEGER PRIMARY KEY, id TEXT UNIQUE, text TEXT NOT NULL, "
+                "metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+            )
+        meta_path = os.path.join(path, "meta.json")
+        self.dim: Optional[int] = None
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        self._ivf: Optional[Dict[str, Any]] = None
+        self._open_arrays()
+
+    # ----- storage -----
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open_arrays(self):
+        self.size = self.db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        if not self.size:
+            self.codes = self.scales = self.vectors = None
+            self.deleted = np.zeros(0, dtype=bool)
+            return
+        shape = (self.size, self.dim)
+        self.codes = np.memmap(self._file("codes.i8"), dtype=np.int8, mode="r", shape=shape)
+        self.scales = np.memmap(self._file("scales.f32"), dtype=np.float32, mode="r", shape=(self.size,))
+        self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=shape)
+        self.deleted = np.zeros(self.size, dtype=bool)
+        rows = [row for (row,) in self.db.execute("SELECT row FROM docs WHERE deleted = 1")]
+        self.deleted[rows] = True
+
+    @staticmethod
+    def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Symmetric per-vector int8 quantization: vector ~= codes * scale."""
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def bytes_per_vector(self) -> Dict[str, int]:
+        """Bytes scanned per vector at query time versus the full-precision copy on disk."""
+        dim = self.dim or 0
+        return {"scan": dim + 4, "full_precision": dim * 4}
+
+    # ----- VectorStore API -----
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = [i or uuid.uuid4().hex for i in ids] if ids else [uuid.uuid4().hex for _ in texts]
+        vectors = np.asarray(self._embedding.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        codes, scales = self.quantize(vectors)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self._file("meta.json"), "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}")
+            # Re-adding an id replaces it: the old row becomes a tombstone.
+            self._mark_deleted("id IN (%s)" % ", ".join("?" for _ in ids), ids)
+            start = self.size
+            self.codes = self.scales = self.vectors = None
+            for name, array in (("codes.i8", codes), ("scales.f32", scales), ("vectors.f32", vectors)):
+                with open(self._file(name), "ab") as f:
+                    # Drop bytes left by an interrupted write that never reached SQLite.
+                    f.truncate(start * (array.nbytes // len(array)))
+                    f.write(np.ascontiguousarray(array).tobytes())
+            with self.db:
+                self.db.executemany(
+                    "INSERT INTO docs (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [(start + i, ids[i], texts[i], json.dumps(metadatas[i])) for i in range(len(texts))],
+                )
+            self._open_arrays()
+            if self._ivf is not None:
+                self._assign_to_ivf(np.arange(start, self.size))
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        path: str = "compact_store",
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "CompactVectorStore":
+        store = cls(path=path, embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def _mark_deleted(self, condition: str, params: List[Any]) -> int:
+        with self._lock, self.db:
+            rows = [row for (row,) in self.db.execute(f"SELECT row FROM docs WHERE deleted = 0 AND ({condition})", params)]
+            if rows:
+                self.db.execute(
+                    "UPDATE docs SET deleted = 1, id = NULL WHERE row IN (%s)" % ", ".join("?" for _ in rows), rows
+                )
+                self.deleted[[r for r in rows if r < len(self.deleted)]] = True
+        return len(rows)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids:
+            self._mark_deleted("id IN (%s)" % ", ".join("?" for _ in ids), list(ids))
+        if where:
+            sql, params = _where_sql(where)
+            self._mark_deleted(sql, params)
+        return True
+
+    def count(self) -> int:
+        return int(self.size - self.deleted.sum())
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        include = ["documents", "metadatas"] if include is None else include
+        condition, params = "deleted = 0", []
+        if ids:
+            condition += " AND id IN (%s)" % ", ".join("?" for _ in ids)
+            params.extend(ids)
+        if where:
+            sql, where_params = _where_sql(where)
+            condition += f" AND ({sql})"
+            params.extend(where_params)
+        query = f"SELECT id, text, metadata FROM docs WHERE {condition} ORDER BY row"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset or 0])
+        rows = self.db.execute(query, params).fetchall()
+        result: Dict[str, Any] = {"ids": [r[0] for r in rows]}
+        result["documents"] = [r[1] for r in rows] if "documents" in include else None
+        result["metadatas"] = [json.loads(r[2]) for r in rows] if "metadatas" in include else None
+        return result
+
+    # ----- search -----
+    def _filter_rows(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        sql, params = _where_sql(where)
+        rows = [row for (row,) in self.db.execute(f"SELECT row FROM docs WHERE deleted = 0 AND ({sql})", params)]
+        return np.asarray(rows, dtype=np.int64)
+
+    def _approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        if rows is not None:
+            scores = (self.codes[rows].astype(np.float32) @ query) * self.scales[rows]
+            return rows, scores
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, self.block_size):
+            end = min(start + self.block_size, self.size)
+            scores[start:end] = (self.codes[start:end].astype(np.float32) @ query) * self.scales[start:end]
+        scores[self.deleted] = -np.inf
+        return np.arange(self.size), scores
+
+    def search_vectors(self, query: np.ndarray, k: int, filter: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (rows, cosine similarities) of the top-k live vectors for a query vector.
+        """
+        with self._lock:
+            if not self.size:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            query = np.asarray(query, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+            rows = self._filter_rows(filter)
+            if self._ivf is not None:
+                probed = self._probe(query)
+                rows = probed if rows is None else np.intersect1d(rows, probed)
+            if rows is not None:
+                rows = rows[~self.deleted[rows]]
+                if not len(rows):
+                    return rows, np.zeros(0, dtype=np.float32)
+            rows, approx = self._approximate_scores(query, rows)
+            n_candidates = min(len(rows), max(k, k * self.rescore_factor))
+            top = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+            top = top[np.isfinite(approx[top])]
+            candidates = np.sort(rows[top])
+            exact = self.vectors[candidates] @ query
+            order = np.argsort(-exact)[:k]
+            return candidates[order], exact[order]
+
+    def _documents(self, rows: np.ndarray) -> List[Document]:
+        if not len(rows):
+            return []
+        placeholders = ", ".join("?" for _ in rows)
+        records = {
+            row: (doc_id, text, metadata)
+            for row, doc_id, text, metadata in self.db.execute(
+                f"SELECT row, id, text, metadata FROM docs WHERE row IN ({placeholders})", [int(r) for r in rows]
+            )
+        }
+        return [
+            Document(id=records[int(r)][0], page_content=records[int(r)][1], metadata=json.loads(records[int(r)][2]))
+            for r in rows
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Returns documents with their cosine distance (lower is closer), like Chroma."""
+        rows, similarities = self.search_vectors(self._embedding.embed_query(query), k, filter)
+        return list(zip(self._documents(rows), (1.0 - similarities).tolist()))
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return lambda distance: 1.0 - distance
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        query_vector = np.asarray(self._embedding.embed_query(query), dtype=np.float32)
+        rows, _ = self.search_vectors(query_vector, fetch_k, filter)
+        if not len(rows):
+            return []
+        selected = maximal_marginal_relevance(query_vector, np.asarray(self.vectors[rows]), lambda_mult=lambda_mult, k=k)
+        return self._documents(rows[selected])
+
+    # ----- optional IVF index -----
+    def build_ann_index(self, nlist: Optional[int] = None, nprobe: int = 8, iterations: int = 10, sample_size: int = 50_000, seed: int = 0):
+        """
+        Builds an in-memory inverted-file index: spherical k-means centroids over a
+        sample of the vectors, and per-centroid row lists. Queries then scan only
+        the `nprobe` lists whose centroids are closest to the query.
+        """
+        with self._lock:
+            if not self.size:
+                return
+            nlist = nlist or max(1, int(np.sqrt(self.size)))
+            rng = np.random.default_rng(seed)
+            sample = self.vectors[np.sort(rng.choice(self.size, min(sample_size, self.size), replace=False))]
+            centroids = sample[rng.choice(len(sample), min(nlist, len(sample)), replace=False)].copy()
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(len(centroids)):
+                    members = sample[assignment == c]
+                    if len(members):
+                        centroid = members.sum(axis=0)
+                        centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+            self._ivf = {"centroids": centroids, "nprobe": nprobe, "lists": [np.zeros(0, dtype=np.int64) for _ in centroids]}
+            self._assign_to_ivf(np.arange(self.size))
+
+    def _assign_to_ivf(self, rows: np.ndarray):
+        centroids = self._ivf["centroids"]
+        for start in range(0, len(rows), self.block_size):
+            block = rows[start:start + self.block_size]
+            assignment = np.argmax(self.vectors[block] @ centroids.T, axis=1)
+            for c in np.unique(assignment):
+                self._ivf["lists"][c] = np.concatenate([self._ivf["lists"][c], block[assignment == c]])
+
+    def _probe(self, query: np.ndarray) -> np.ndarray:
+        nprobe = min(self._ivf["nprobe"], len(self._ivf["centroids"]))
+        nearest = np.argsort(-(self._ivf["centroids"] @ query))[:nprobe]
+        return np.sort(np.concatenate([self._ivf["lists"][c] for c in nearest]))
+
+    def compact(self):
+        """Rewrites the vector files without deleted rows."""
+        with self._lock:
+            if not self.size or not self.deleted.any():
+                return
+            keep = np.flatnonzero(~self.deleted)
+            arrays = {
+                "codes.i8": np.asarray(self.codes[keep]),
+                "scales.f32": np.asarray(self.scales[keep]),
+                "vectors.f32": np.asarray(self.vectors[keep]),
+            }
+            self.codes = self.scales = self.vectors = None
+            for name, array in arrays.items():
+                array.tofile(self._file(name))
+            with self.db:
+                self.db.execute("DELETE FROM docs WHERE deleted = 1")
+                # Renumber through negative rows so the primary key never collides.
+                self.db.executemany("UPDATE docs SET row = ? WHERE row = ?", [(-1 - new, int(old)) for new, old in enumerate(keep)])
+                self.db.execute("UPDATE docs SET row = -1 - row")
+            self._open_arrays()
+            if self._ivf is not None:
+                self.build_ann_index(len(self._ivf["centroids"]), self._ivf["nprobe"])
+
+    def close(self):
+        """Closes the SQLite connection and unmaps the vector files; waits for a running call."""
+        with self._lock:
+            self.codes = self.scales = self.vectors = None
+            self._ivf = None
+            self.db.close()
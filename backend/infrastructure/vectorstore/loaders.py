@@ -0,0 +1,237 @@
+import ast
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Text files are read in segments of roughly this many characters, cut at a
+# blank line, so a huge file never has to be held in memory at once.
+SEGMENT_CHARS = 200_000
+# Files above this size are streamed in the calling process instead of being
+# parsed whole inside a pool worker. Formats that can only be parsed whole (HTML,
+# Python) are skipped above it.
+STREAM_THRESHOLD_BYTES = 20 * 1024 * 1024
+
+Loader = Callable[[str], Iterator[Document]]
+LOADERS: Dict[str, Loader] = {}
+
+
+def register_loader(*extensions: str):
+    """Registers a lazy loader function for the given file extensions."""
+    def decorator(fn: Loader) -> Loader:
+        for extension in extensions:
+            LOADERS[extension.lower()] = fn
+        return fn
+    return decorator
+
+
+def get_loader(path: str) -> Optional[Loader]:
+    return LOADERS.get(os.path.splitext(path)[1].lower())
+
+
+def _check_whole_file(path: str, kind: str):
+    """Raises for a file too large to parse whole; the error ends up in its ParseStats."""
+    size = os.path.getsize(path)
+    if size > STREAM_THRESHOLD_BYTES:
+        raise ValueError(f"Skipped: {kind} files are parsed whole and this one has {size} bytes (limit {STREAM_THRESHOLD_BYTES})")
+
+
+@register_loader(".pdf")
+def load_pdf(path: str) -> Iterator[Document]:
+    from langchain_community.document_loaders import PyMuPDFLoader
+    yield from PyMuPDFLoader(path).lazy_load()
+
+
+@register_loader(".md", ".markdown", ".rst", ".txt")
+def load_text(path: str) -> Iterator[Document]:
+    """Streams a text file in blank-line-aligned segments of about SEGMENT_CHARS."""
+    file_type = os.path.splitext(path)[1].lstrip(".").lower()
+    buffer: List[str] = []
+    size = segment = 0
+    in_fence = False
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.lstrip().startswith(("```", "~~~")):
+                in_fence = not in_fence
+            buffer.append(line)
+            size += len(line)
+            if size >= SEGMENT_CHARS and not line.strip() and not in_fence:
+                yield Document(page_content="".join(buffer), metadata={"source": path, "file_type": file_type, "segment": segment})
+                buffer, size, segment = [], 0, segment + 1
+    if buffer:
+        yield Document(page_content="".join(buffer), metadata={"source": path, "file_type": file_type, "segment": segment})
+
+
+@register_loader(".html", ".htm")
+def load_html(path: str) -> Iterator[Document]:
+    """Converts HTML to Markdown-like text so the splitter sees headings and code blocks."""
+    from bs4 import BeautifulSoup
+
+    _check_whole_file(path, "HTML")
+    with open(path, encoding="utf-8", errors="replace") as f:
+        soup = BeautifulSoup(f, "html.parser")
+    for tag in soup(["script", "style", "nav", "footer"]):
+        tag.decompose()
+    for pre in soup.find_all("pre"):
+        pre.replace_with(f"\n```\n{pre.get_text()}\n```\n")
+    for level in range(1, 7):
+        for heading in soup.find_all(f"h{level}"):
+            heading.replace_with(f"\n{'#' * level} {heading.get_text(' ', strip=True)}\n")
+    text = soup.get_text("\n")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    yield Document(page_content=text, metadata={"source": path, "file_type": "html", "title": title})
+
+
+@register_loader(".py")
+def load_python(path: str) -> Iterator[Document]:
+    """
+    Yields the module docstring and one document per top-level function or class,
+    headed by its qualified name so chunks keep the API signature with its body.
+    """
+    _check_whole_file(path, "Python")
+    with open(path, encoding="utf-8", errors="replace") as f:
+        source = f.read()
+    module = os.path.splitext(os.path.basename(path))[0]
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        yield Document(page_content=source, metadata={"source": path, "file_type": "python", "symbol": module})
+        return
+
+    docstring = ast.get_docstring(tree)
+    if docstring:
+        yield Document(page_content=f"# {module}\n\n{docstring}", metadata={"source": path, "file_type": "python", "symbol": module})
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        segment = ast.get_source_segment(source, node)
+        if node.decorator_list:
+            segment = "\n".join(source.splitlines()[node.decorator_list[0].lineno - 1:node.end_lineno])
+        yield Document(
+            page_content=f"# {module}.{node.name}\n\n{segment}",
+            metadata={"source": path, "file_type": "python", "symbol": f"{module}.{node.name}", "line": node.lineno},
+        )
+
+
+@dataclass
+class ParseStats:
+    path: str
+    size_bytes: int
+    parse_seconds: float = 0.0
+    documents: int = 0
+    chunks: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class ParseResult:
+    stats: ParseStats
+    chunks: List[Document] = field(default_factory=list)
+    final: bool = True  # False for intermediate batches of a streamed file
+
+
+@lru_cache(maxsize=4)
+def _splitter(chunk_size: int, chunk_overlap: int, kind: str):
+    if kind == "recursive":
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    from .splitter import CodeAwareTextSplitter
+    return CodeAwareTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def iter_file_chunks(
+    path: str,
+    stats: ParseStats,
+    chunk_size: int = 500,
+    chunk_overlap: int = 20,
+    splitter: str = "code_aware",
+) -> Iterator[List[Document]]:
+    """
+    Lazily loads a file and yields the chunks of each loaded document, updating
+    `stats` as it goes. Errors are recorded in the stats rather than raised.
+    """
+    start = time.perf_counter()
+    try:
+        text_splitter = _splitter(chunk_size, chunk_overlap, splitter)
+        # Segments are split one at a time; the heading path carries over between them.
+        options = {} if splitter == "recursive" else {"headings": {}}
+        for doc in get_loader(path)(path):
+            stats.documents += 1
+            chunks = text_splitter.split_documents([doc], **options)
+            stats.chunks += len(chunks)
+            stats.parse_seconds = time.perf_counter() - start
+            yield chunks
+    except Exception as e:
+        stats.error = str(e)
+    stats.parse_seconds = time.perf_counter() - start
+
+
+def parse_file(path: str, chunk_size: int = 500, chunk_overlap: int = 20, splitter: str = "code_aware") -> ParseResult:
+    """
+    Loads and splits a single file. Runs inside pool workers, so it only takes
+    picklable arguments and builds its splitter per process.
+    """
+    stats = ParseStats(path=path, size_bytes=os.path.getsize(path))
+    chunks = [chunk for batch in iter_file_chunks(path, stats, chunk_size, chunk_overlap, splitter) for chunk in batch]
+    return ParseResult(stats=stats, chunks=chunks)
+
+
+def iter_files(root: str, extensions: Optional[Iterable[str]] = None) -> Iterator[str]:
+    """Walks `root` yielding files that have a registered loader, skipping hidden directories."""
+    extensions = {e.lower() for e in extensions} if extensions else set(LOADERS)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".") and d not in ("__pycache__", "node_modules", "venv")]
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in extensions:
+                yield os.path.join(dirpath, filename)
+
+
+def parse_files(
+    paths: Iterable[str],
+    chunk_size: int = 500,
+    chunk_overlap: int = 20,
+    splitter: str = "code_aware",
+    max_workers: Optional[int] = None,
+) -> Iterator[ParseResult]:
+    """
+    Parses files in a process pool and yields results as they complete.
+
+    At most 2 * max_workers files are in flight, so memory stays bounded by the
+    size of the files currently being parsed. Files larger than
+    STREAM_THRESHOLD_BYTES are streamed in this process instead, as a series of
+    non-final results followed by a final one carrying the file's stats.
+    A file that cannot be read or whose worker fails gets a result with the
+    error in its stats; the other files are still parsed.
+    """
+    def result(future: Future, path: str, size: int) -> ParseResult:
+        try:
+            return future.result()
+        except Exception as e:
+            return ParseResult(stats=ParseStats(path=path, size_bytes=size, error=f"{type(e).__name__}: {e}"))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending: Dict[Future, Tuple[str, int]] = {}
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+            except OSError as e:
+                yield ParseResult(stats=ParseStats(path=path, size_bytes=0, error=str(e)))
+                continue
+            if size > STREAM_THRESHOLD_BYTES:
+                stats = ParseStats(path=path, size_bytes=size)
+                for batch in iter_file_chunks(path, stats, chunk_size, chunk_overlap, splitter):
+                    yield ParseResult(stats=stats, chunks=batch, final=False)
+                yield ParseResult(stats=stats)
+                continue
+            pending[pool.submit(parse_file, path, chunk_size, chunk_overlap, splitter)] = (path, size)
+            if len(pending) >= max_workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield result(future, *pending.pop(future))
+        for future, (path, size) in list(pending.items()):
+            yield result(future, path, size)
@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from .chromaStore import ChromaVectorStore
+
+
+def _google_embeddings(model: str) -> Embeddings:
+    from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model=model)
+
+
+class CollectionManager:
+    """
+    Serves many vector store collections from one persistent path.
+
+    Collections are opened lazily on first use, and at most `max_open`
+    ChromaVectorStore instances and `max_embedding_clients` embedding clients are
+    kept, evicting (and closing) the least recently used. A collection is opened
+    under its own lock, so a slow open does not block requests to other
+    collections. Requests are routed to a collection by tenant, then by framework,
+    then to the default collection; only allowed tenants are routed.
+    """
+    def __init__(
+        self,
+        persistent_path: str,
+        default_collection: str = "my_documents",
+        tenant_routes: Optional[Dict[str, str]] = None,
+        framework_routes: Optional[Dict[str, str]] = None,
+        collections: Optional[Dict[str, Dict[str, Any]]] = None,
+        max_open: int = 8,
+        max_embedding_clients: int = 4,
+        embeddings_model: str = "models/text-embedding-004",
+        embeddings_factory: Callable[[str], Embeddings] = _google_embeddings,
+        backend: str = "chroma",
+        allowed_tenants: Optional[Iterable[str]] = None,
+    ):
+        """
+        Args:
+            persistent_path: Directory holding every collection.
+            default_collection: Collection used when no route matches.
+            tenant_routes: Maps a tenant id to its collection name.
+            framework_routes: Maps a framework name to its collection name.
+            collections: Per-collection ChromaVectorStore overrides, e.g.
+                         {"langgraph_docs": {"embeddings_model": "...", "backend": "compact"}}.
+            max_open: Maximum number of collections kept open.
+            max_embedding_clients: Maximum number of embedding clients kept, one per model.
+            embeddings_model: Default embedding model name.
+            embeddings_factory: Builds an embedding client from a model name.
+            backend: Default vector backend, "chroma" or "compact".
+            allowed_tenants: Tenants requests may name, in addition to those in
+                             tenant_routes. Other tenants are rejected by check_tenant.
+        """
+        self.persistent_path = persistent_path
+        self.default_collection = default_collection
+        self.tenant_routes = tenant_routes or {}
+        self.framework_routes = framework_routes or {}
+        self.collections = collections or {}
+        self.max_open = max_open
+        self.max_embedding_clients = max_embedding_clients
+        self.embeddings_model = embeddings_model
+        self.embeddings_factory = embeddings_factory
+        self.backend = backend
+        self.allowed_tenants = {*self.tenant_routes, *(allowed_tenants or ())}
+        self._open: "OrderedDict[str, ChromaVectorStore]" = OrderedDict()
+        self._embeddings: "OrderedDict[str, Embeddings]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._opening: Dict[str, threading.Lock] = {}
+        self._lock = threading.RLock()
+
+    def check_tenant(self, tenant: Optional[str]):
+        """
+        Raises:
+            PermissionError: If `tenant` is given but not allowed.
+        """
+        if tenant is not None and tenant not in self.allowed_tenants:
+            raise PermissionError(f"Unknown tenant '{tenant}'")
+
+    def resolve(self, framework: Optional[str] = None, tenant: Optional[str] = None) -> str:
+        """
+        Returns the collection name for a request.
+
+        Raises:
+            PermissionError: If `tenant` is given but not allowed.
+        """
+        self.check_tenant(tenant)
+        return (
+            (tenant and self.tenant_routes.get(tenant))
+            or (framework and self.framework_routes.get(framework))
+            or self.default_collection
+        )
+
+    def _embedding_client(self, model: str) -> Embeddings:
+        with self._lock:
+            client = self._embeddings.get(model)
+            if client is None:
+                client = self._embeddings[model] = self.embeddings_factory(model)
+                while len(self._embeddings) > self.max_embedding_clients:
+                    self._embeddings.popitem(last=False)
+            self._embeddings.move_to_end(model)
+            return client
+
+    def _touch(self, name: str) -> Optional[ChromaVectorStore]:
+        with self._lock:
+            store = self._open.get(name)
+            if store is not None:
+                self._open.move_to_end(name)
+                # Only names that opened successfully are remembered.
+                self._last_access[name] = time.time()
+            return store
+
+    def get(self, name: str) -> ChromaVectorStore:
+        """Returns the open collection `name`, opening it (and closing the LRU one) if needed."""
+        store = self._touch(name)
+        if store is not None:
+            return store
+        with self._lock:
+            opening = self._opening.setdefault(name, threading.Lock())
+        with opening:
+            # Another request may have opened it while this one waited.
+            store = self._touch(name)
+            if store is not None:
+                return store
+            options = {"embeddings_model": self.embeddings_model, "backend": self.backend, **self.collections.get(name, {})}
+            embeddings = options.pop("embeddings", None) or self._embedding_client(options["embeddings_model"])
+            store = ChromaVectorStore(
+                persistent_path=self.persistent_path,
+                collection_name=name,
+                embeddings=embeddings,
+                **options,
+            )
+            evicted = []
+            with self._lock:
+                self._open[name] = store
+                self._opening.pop(name, None)
+                while len(self._open) > self.max_open:
+                    evicted.append(self._open.popitem(last=False)[1])
+                self._last_access[name] = time.time()
+        for old in evicted:
+            old.close()
+        return store
+
+    def store_for(self, framework: Optional[str] = None, tenant: Optional[str] = None) -> ChromaVectorStore:
+        return self.get(self.resolve(framework, tenant))
+
+    def retriever_for(self, framework: Optional[str] = None, tenant: Optional[str] = None) -> VectorStoreRetriever:
+        """Retriever over the collection the request routes to; search settings are applied by the caller."""
+        return self.store_for(framework, tenant).as_retriever()
+
+    def known_collections(self) -> List[str]:
+        names = {self.default_collection, *self.tenant_routes.values(), *self.framework_routes.values(), *self.collections, *self._last_access}
+        return sorted(names)
+
+    def _on_disk(self, name: str) -> bool:
+        """Whether collection `name` exists in persistent_path, checked without opening it."""
+        backend = self.collections.get(name, {}).get("backend", self.backend)
+        if backend == "compact":
+            return os.path.isdir(os.path.join(self.persistent_path, "compact", name))
+        path = os.path.join(self.persistent_path, "chroma.sqlite3")
+        if not os.path.exists(path):
+            return False
+        try:
+            with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+                return conn.execute("SELECT 1 FROM collections WHERE name = ?", (name,)).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+    def exists(self, name: str) -> bool:
+        """Whether `name` is open, configured or on disk. Never opens or creates a collection."""
+        with self._lock:
+            if name in self._open or name in self.known_collections():
+                return True
+        return self._on_disk(name)
+
+    def get_collection_info(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stats for one collection: the store's count and size, plus whether it is
+        open and when it was last accessed. Opens the collection if it is not open.
+
+        Raises:
+            KeyError: If `name` is neither configured nor on disk; nothing is created.
+        """
+        name = name or self.default_collection
+        if not self.exists(name):
+            raise KeyError(name)
+        with self._lock:
+            was_open = name in self._open
+            last_access = self._last_access.get(name)
+        info = self.get(name).get_collection_info()
+        if last_access is None:
+            last_access = self._last_access[name]
+        return {**info, "open": was_open, "last_access": last_access}
+
+    def stats(self) -> Dict[str, Any]:
+        """Manager-wide view without opening anything: open collections in LRU order and access times."""
+        with self._lock:
+            return {
+                "open": list(self._open),
+                "max_open": self.max_open,
+                "embedding_clients": list(self._embeddings),
+                "collections": [
+                    {"name": name, "open": name in self._open, "last_access": self._last_access.get(name)}
+                    for name in self.known_collections()
+                ],
+            }
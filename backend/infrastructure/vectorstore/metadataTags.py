@@ -0,0 +1,50 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# Seconds a "does this collection have chunks tagged with X" answer is reused.
+METADATA_TAG_TTL = float(os.getenv("METADATA_TAG_TTL", "300"))
+_metadata_tags: Dict[Tuple[str, str, str], Tuple[bool, float]] = {}
+_metadata_tags_lock = threading.Lock()
+
+
+def _collection_name(vectorstore: Any) -> Optional[str]:
+    """The collection of a LangChain Chroma or CompactVectorStore, None for other stores."""
+    name = getattr(vectorstore, "collection_name", None)
+    if name is None:
+        name = getattr(getattr(vectorstore, "_collection", None), "name", None)
+    return name
+
+
+def has_metadata_tag(vectorstore: Any, key: str, value: str) -> bool:
+    """
+    Whether any chunk of `vectorstore` has metadata `key` == `value` (one id-only
+    lookup). Answers are cached per collection name for METADATA_TAG_TTL seconds,
+    or until `forget_metadata_tags` is called for the collection. Stores without
+    `get` count as untagged.
+    """
+    name, now = _collection_name(vectorstore), time.time()
+    cache_key = (name, key, value)
+    if name is not None:
+        with _metadata_tags_lock:
+            entry = _metadata_tags.get(cache_key)
+        if entry and entry[1] > now:
+            return entry[0]
+    try:
+        tagged = bool(vectorstore.get(where={key: value}, limit=1, include=[])["ids"])
+    except Exception:
+        tagged = False
+    if name is not None:
+        with _metadata_tags_lock:
+            if len(_metadata_tags) >= 1024:
+                _metadata_tags.clear()
+            _metadata_tags[cache_key] = (tagged, now + METADATA_TAG_TTL)
+    return tagged
+
+
+def forget_metadata_tags(collection_name: str):
+    """Drops the cached answers for a collection whose chunks changed or that was closed."""
+    with _metadata_tags_lock:
+        for cache_key in [k for k in _metadata_tags if k[0] == collection_name]:
+            del _metadata_tags[cache_key]
@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+
+class SourceIndex:
+    """
+    Persistent source -> chunk-count index per collection, kept next to the vector
+    store so listing sources does not require scanning every chunk's metadata.
+
+    A collection is "built" once its counts are known to be complete: either it was
+    created empty under the index, or its existing chunks were scanned once.
+
+    Attributes:
+        path: Path to the SQLite database file.
+        conn: The shared SQLite connection.
+    """
+    def __init__(self, path: str):
+        """
+        Initializes the index and creates its tables if needed.
+
+        Args:
+            path: Path to the SQLite database file.
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sources (
+                    collection TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    chunks INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (collection, source)
+                )
+                """
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS built (collection TEXT PRIMARY KEY, built_at REAL NOT NULL)")
+
+    def is_built(self, collection: str) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM built WHERE collection = ?", (collection,)).fetchone() is not None
+
+    def add(self, collection: str, counts: Dict[str, int]):
+        """Adds chunk counts for newly ingested chunks, keyed by source."""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO sources (collection, source, chunks, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (collection, source) DO UPDATE SET chunks = chunks + excluded.chunks, updated_at = excluded.updated_at",
+                [(collection, source, n, now) for source, n in counts.items()],
+            )
+
+    def remove(self, collection: str, sources: Iterable[str]):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM sources WHERE collection = ? AND source = ?", [(collection, s) for s in sources]
+            )
+
+    def reset(self, collection: str, counts: Optional[Dict[str, int]] = None):
+        """Replaces a collection's counts (empty by default) and marks it built."""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM sources WHERE collection = ?", (collection,))
+            self.conn.executemany(
+                "INSERT INTO sources (collection, source, chunks, updated_at) VALUES (?, ?, ?, ?)",
+                [(collection, source, n, now) for source, n in (counts or {}).items()],
+            )
+            self.conn.execute("INSERT OR REPLACE INTO built (collection, built_at) VALUES (?, ?)", (collection, now))
+
+    def drop(self, collection: str):
+        """Forgets a collection entirely, e.g. when it is deleted."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM sources WHERE collection = ?", (collection,))
+            self.conn.execute("DELETE FROM built WHERE collection = ?", (collection,))
+
+    def counts(self, collection: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT source, chunks FROM sources WHERE collection = ? ORDER BY source", (collection,)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
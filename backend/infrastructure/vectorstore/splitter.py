@@ -0,0 +1,262 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import tiktoken
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+RST_UNDERLINE_RE = re.compile(r"^([=\-~^\"'`*+#:.])\1{2,}\s*$")
+SIGNATURE_RE = re.compile(
+    r"^\s*(@\w[\w.]*|(async\s+)?def\s+\w+\s*\(|class\s+\w+[\s(:]"
+    r"|[A-Za-z_]\w*(\.[A-Za-z_]\w*)+\s*\(.*\)\s*(->.*)?$)"
+)
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=8)
+def _encoding(name: str) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text: str, encoding_name: str = "gpt2") -> int:
+    """Token count of `text`. Not cached here: see `CodeAwareTextSplitter.split_sections`."""
+    return len(_encoding(encoding_name).encode(text, disallowed_special=()))
+
+
+@dataclass
+class Block:
+    kind: str  # "heading", "code", "api" or "prose"
+    text: str
+    level: int = 0
+
+    @property
+    def atomic(self) -> bool:
+        return self.kind in ("code", "api")
+
+
+def _is_indented(line: str) -> bool:
+    return line[:1] in (" ", "\t")
+
+
+def parse_blocks(text: str, rst_levels: Optional[List[str]] = None) -> List[Block]:
+    """
+    Splits text into headings, fenced code blocks, API signatures with their
+    docstrings, and prose paragraphs. Understands Markdown and reStructuredText headings.
+
+    `rst_levels` are the reStructuredText underline characters seen so far, in
+    level order; the list is extended in place, so a later segment of the same
+    file gets the same heading levels.
+    """
+    lines = text.splitlines()
+    blocks: List[Block] = []
+    rst_levels = [] if rst_levels is None else rst_levels
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        if FENCE_RE.match(line):
+            fence = FENCE_RE.match(line).group(1)
+            end = i + 1
+            while end < len(lines) and not lines[end].strip().startswith(fence):
+                end += 1
+            blocks.append(Block("code", "\n".join(lines[i:end + 1])))
+            i = end + 1
+            continue
+
+        heading = MD_HEADING_RE.match(line)
+        if heading:
+            blocks.append(Block("heading", line.strip(), len(heading.group(1))))
+            i += 1
+            continue
+
+        next_line = lines[i + 1] if i + 1 < len(lines) else ""
+        underline = RST_UNDERLINE_RE.match(next_line)
+        if underline and len(next_line.strip()) >= len(line.strip()) and not _is_indented(line):
+            char = underline.group(1)
+            if char not in rst_levels:
+                rst_levels.append(char)
+            blocks.append(Block("heading", line.strip(), rst_levels.index(char) + 1))
+            i += 2
+            continue
+
+        if SIGNATURE_RE.match(line):
+            # Signature plus its docstring/body: the contiguous lines after it and
+            # any indented lines, including blank lines inside the indented body.
+            end = i + 1
+            seen_blank = False
+            while end < len(lines):
+                current = lines[end]
+                if not current.strip():
+                    following = next((l for l in lines[end + 1:] if l.strip()), "")
+                    if not _is_indented(following):
+                        break
+                    seen_blank = True
+                elif not _is_indented(current) and (seen_blank or FENCE_RE.match(current) or MD_HEADING_RE.match(current)):
+                    break
+                end += 1
+            blocks.append(Block("api", "\n".join(lines[i:end]).rstrip()))
+            i = end
+            continue
+
+        end = i + 1
+        while end < len(lines) and lines[end].strip() and not (
+            FENCE_RE.match(lines[end]) or MD_HEADING_RE.match(lines[end]) or SIGNATURE_RE.match(lines[end])
+            or RST_UNDERLINE_RE.match(lines[end + 1] if end + 1 < len(lines) else "")
+        ):
+            end += 1
+        blocks.append(Block("prose", "\n".join(lines[i:end])))
+        i = end
+    return blocks
+
+
+class CodeAwareTextSplitter(TextSplitter):
+    """
+    Structure-aware splitter for documentation.
+
+    Fenced code blocks and API signatures with their docstrings are kept whole,
+    prose is split on headings and paragraphs, and every chunk records the
+    heading path it belongs to in its `section` metadata. Blocks longer than
+    `max_atomic_size` tokens are split by lines (code) or sentences (prose).
+    """
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        chunk_overlap: int = 20,
+        encoding_name: str = "gpt2",
+        max_atomic_size: Optional[int] = None,
+        **kwargs: Any,
+    ):
+        self.encoding_name = encoding_name
+        super().__init__(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=lambda text: count_tokens(text, encoding_name),
+            **kwargs,
+        )
+        self.max_atomic_size = max_atomic_size or chunk_size * 2
+
+    def _pieces(self, block: Block, length: Callable[[str], int]) -> List[str]:
+        """Breaks an oversized block into pieces no longer than chunk_size."""
+        units = block.text.splitlines() if block.atomic else SENTENCE_RE.split(block.text)
+        joiner = "\n" if block.atomic else " "
+        pieces, current, size = [], [], 0
+        for unit in units:
+            n = length(unit)
+            if current and size + n > self._chunk_size:
+                pieces.append(joiner.join(current))
+                current, size = [], 0
+            current.append(unit)
+            size += n
+        if current:
+            pieces.append(joiner.join(current))
+        return pieces
+
+    def split_sections(
+        self,
+        text: str,
+        path: Optional[List[Tuple[int, str]]] = None,
+        rst_levels: Optional[List[str]] = None,
+    ) -> List[Tuple[str, str, bool]]:
+        """
+        Returns (chunk_text, section_path, has_code) tuples for the given text.
+
+        `path` is the (level, heading) path in effect at the start of `text` and
+        `rst_levels` the reStructuredText heading characters seen before it. Both
+        are updated in place, so the next segment of the same file continues
+        under the last heading of this one.
+        """
+        chunks: List[Tuple[str, str, bool]] = []
+        path = [] if path is None else path
+        current: List[Block] = []
+        size = 0
+        # Blocks are measured repeatedly while packing; the counts only live for this call.
+        lengths: Dict[str, int] = {}
+
+        def length(text: str) -> int:
+            n = lengths.get(text)
+            if n is None:
+                n = lengths[text] = self._length_function(text)
+            return n
+
+        def section() -> str:
+            return " > ".join(title.lstrip("#").strip() for _, title in path)
+
+        def flush(keep_overlap: bool):
+            nonlocal current, size
+            body = [b for b in current if b.kind != "heading"]
+            if body:
+                chunks.append(("\n\n".join(b.text for b in current), section(), any(b.atomic for b in current)))
+            carry: List[Block] = []
+            if keep_overlap and body:
+                carry_size = 0
+                for block in reversed(current):
+                    n = length(block.text)
+                    if block.atomic or block.kind == "heading" or carry_size + n > self._chunk_overlap:
+                        break
+                    carry.insert(0, block)
+                    carry_size += n
+            current = [b for b in current if b.kind == "heading"] + carry
+            size = sum(length(b.text) for b in current)
+
+        for block in parse_blocks(text, rst_levels):
+            if block.kind == "heading":
+                flush(keep_overlap=False)
+                while path and path[-1][0] >= block.level:
+                    path.pop()
+                path.append((block.level, block.text))
+                current, size = [block], length(block.text)
+                continue
+
+            n = length(block.text)
+            if n > self._chunk_size and (not block.atomic or n > self.max_atomic_size):
+                for piece in self._pieces(block, length):
+                    piece_block = Block(block.kind, piece)
+                    piece_size = length(piece)
+                    if size + piece_size > self._chunk_size:
+                        flush(keep_overlap=True)
+                    current.append(piece_block)
+                    size += piece_size
+                continue
+            if size + n > self._chunk_size:
+                flush(keep_overlap=not block.atomic)
+            current.append(block)
+            size += n
+        flush(keep_overlap=False)
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for chunk, _, _ in self.split_sections(text)]
+
+    def split_documents(
+        self,
+        documents: Iterable[Document],
+        headings: Optional[Dict[str, Tuple[List[Tuple[int, str]], List[str]]]] = None,
+    ) -> List[Document]:
+        """
+        Splits documents into chunks with `section` and `has_code` metadata.
+        Consecutive segments of a streamed file (`segment` metadata, see
+        `loaders.load_text`) share one heading path. Pass the same `headings`
+        dict to calls that split one segment each to keep it across calls.
+        """
+        chunks = []
+        headings = {} if headings is None else headings
+        for doc in documents:
+            state: Tuple[Optional[List[Tuple[int, str]]], Optional[List[str]]] = (None, None)
+            if "segment" in doc.metadata:
+                source = doc.metadata.get("source", "")
+                if doc.metadata["segment"] == 0 or source not in headings:
+                    headings[source] = ([], [])
+                state = headings[source]
+            for text, section, has_code in self.split_sections(doc.page_content, *state):
+                metadata = dict(doc.metadata)
+                metadata["section"] = section
+                metadata["has_code"] = has_code
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
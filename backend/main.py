@@ -1,18 +1,33 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routers import chat
+from routers import chat, jobs, metrics
+from services.job_service import job_manager
 from fastapi.middleware.cors import CORSMiddleware
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from utils.tracing import setup_tracing
 
-app = FastAPI(title="Supervisor Agent API")
+setup_tracing(service_name="coder-api")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+
+app = FastAPI(title="Supervisor Agent API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Hoặc chỉ định ["http://localhost:3000"] nếu bạn dùng frontend riêng
     allow_credentials=True,
-    allow_methods=["POST"],
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
 
 app.include_router(chat.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
+FastAPIInstrumentor.instrument_app(app)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,21 +1,44 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from services.agent_service import handle_chat, handle_streaming_chat
+from pydantic import BaseModel, Field
+from services.agent_service import collection_manager, handle_chat, handle_streaming_chat
 from agents.states import SupervisorState
+from utils.artifacts import ArtifactNotFound
+from utils.schemas import RetrievalConfig
+from utils.usage import TokenBudgetExceeded
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+def check_tenant(tenant: Optional[str]):
+    try:
+        collection_manager.check_tenant(tenant)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
 class ChatInput(BaseModel):
     input: str
+    # Can only lower the server's TOKEN_BUDGET, see utils.usage.request_budget.
+    token_budget: Optional[int] = Field(None, gt=0)
+    framework: Optional[str] = None
+    tenant: Optional[str] = None
+    retrieval: Optional[RetrievalConfig] = None
 
 @router.post("/ask", response_model= SupervisorState)
 async def ask_agent(input_data: ChatInput):
     input = input_data.input
-    output = await handle_chat(input)
+    check_tenant(input_data.tenant)
+    try:
+        output = await handle_chat(input, input_data.token_budget, input_data.framework, input_data.retrieval, input_data.tenant)
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ArtifactNotFound as e:
+        raise HTTPException(status_code=410, detail=str(e))
     print(input, "\n", output)
     return output
     # return await handle_chat(input_data.input)
 @router.post("/stream", response_model= SupervisorState)
 async def stream_agent(input_data: ChatInput):
-    return StreamingResponse(handle_streaming_chat(input_data.input), media_type="text/event-stream")
+    check_tenant(input_data.tenant)
+    return StreamingResponse(handle_streaming_chat(input_data.input, input_data.token_budget, input_data.framework, input_data.retrieval, input_data.tenant), media_type="text/event-stream")
+
@@ -0,0 +1,60 @@
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from services.agent_service import collection_manager
+from services.job_service import job_manager
+from utils.schemas import Job, JobKind, JobStatus, RetrievalConfig
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+class JobInput(BaseModel):
+    input: str
+    kind: JobKind = "chat"
+    # Same options as /chat; the budget can only lower the server's TOKEN_BUDGET.
+    token_budget: Optional[int] = Field(None, gt=0)
+    framework: Optional[str] = None
+    tenant: Optional[str] = None
+    retrieval: Optional[RetrievalConfig] = None
+
+@router.post("", response_model=Job, status_code=202)
+async def submit_job(input_data: JobInput):
+    try:
+        collection_manager.check_tenant(input_data.tenant)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    return job_manager.submit(
+        input_data.input, input_data.kind, input_data.framework, input_data.tenant,
+        input_data.retrieval, input_data.token_budget,
+    )
+
+@router.get("", response_model=List[Job])
+async def list_jobs(status: Optional[JobStatus] = None, limit: int = 100):
+    return job_manager.store.list(status=status, limit=limit)
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+
+    async def event_stream():
+        async for event in job_manager.subscribe(job_id):
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@router.post("/{job_id}/cancel", response_model=Job)
+async def cancel_job(job_id: str):
+    job = await job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
@@ -0,0 +1,48 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from services.agent_service import collection_manager
+from utils.jsonrepair import parse_metrics
+from utils.pinned_docs import pinned_docs
+from utils.prompt_cache import render_cache
+from utils.provider_cache import provider_prefix_cache
+from utils.singleflight import coalescing_metrics
+from utils.usage import usage_metrics
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+@router.get("/usage")
+async def usage(window: Optional[float] = None):
+    """Token, call, latency and cost aggregates over the last `window` seconds."""
+    return usage_metrics.snapshot(window)
+
+@router.get("/coalescing")
+async def coalescing():
+    """Calls requested and calls saved by single-flight coalescing, per group (llm, retrieval, chat_request)."""
+    return coalescing_metrics()
+
+@router.get("/parsing")
+async def parsing():
+    """Structured output parses per schema: clean, repaired locally, failed, and LLM re-asks."""
+    return parse_metrics.snapshot()
+
+@router.get("/prompt-cache")
+async def prompt_cache():
+    """Prompt render cache hits, pinned documentation per framework and provider context caches."""
+    return {
+        "render": render_cache.snapshot(),
+        "pinned_docs": pinned_docs.snapshot(),
+        "provider": provider_prefix_cache.snapshot(),
+    }
+
+@router.get("/collections")
+async def collections():
+    """Open collections in LRU order and last-access times, without opening any collection."""
+    return collection_manager.stats()
+
+@router.get("/collections/{name}")
+async def collection_info(name: str):
+    """Count, size and last access of one collection; opens it if needed. Unknown names get a 404."""
+    try:
+        return collection_manager.get_collection_info(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Collection '{name}' not found")
@@ -1,27 +1,94 @@
+import json
+import os
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import find_dotenv, load_dotenv
+from typing import Dict, Optional
 
 from agents.supervisor_agent import build_supervisor_agent
-from infrastructure.vectorstore import ChromaVectorStore
+from agents.testgen_agent import build_testgen_graph
+from infrastructure.vectorstore import CollectionManager
 from agents.states import SupervisorState
-from utils.helpers import serialize_state
+from utils.artifacts import ArtifactNotFound
+from utils.helpers import get_chat_model, serialize_state
+from utils.schemas import RetrievalConfig
+from utils.singleflight import digest, request_flight
+from utils.tracing import TracingCallbackHandler
+from utils.usage import TokenBudgetExceeded, request_budget, track_usage, usage_handler
 
 
 load_dotenv(find_dotenv())
 
-retriever = ChromaVectorStore(persistent_path= "A:/Code/coder/data").as_retriever()
-chat_model = ChatGoogleGenerativeAI(model = "gemini-2.0-flash")
+# Collections are opened on first use and routed per request by tenant or framework,
+# e.g. COLLECTION_FRAMEWORK_ROUTES='{"langgraph": "langgraph_docs"}'. Requests may only
+# name tenants of COLLECTION_TENANT_ROUTES or COLLECTION_TENANTS (comma separated).
+collection_manager = CollectionManager(
+    persistent_path=os.getenv("VECTOR_STORE_PATH", "A:/Code/coder/data"),
+    tenant_routes=json.loads(os.getenv("COLLECTION_TENANT_ROUTES", "{}")),
+    allowed_tenants=[t.strip() for t in os.getenv("COLLECTION_TENANTS", "").split(",") if t.strip()],
+    framework_routes=json.loads(os.getenv("COLLECTION_FRAMEWORK_ROUTES", "{}")),
+    max_open=int(os.getenv("MAX_OPEN_COLLECTIONS", "8")),
+    backend=os.getenv("VECTOR_BACKEND", "chroma"),
+)
+# Deadlines, retries, hedging and fallbacks are configured with the LLM_* variables, see utils.resilience.
+chat_model = get_chat_model(os.getenv("CHAT_MODEL", "gemini-2.0-flash"))
 agent = build_supervisor_agent(
-    retriever= retriever,
+    retriever= collection_manager,
     supervisor_model= chat_model,
-    worker_model=chat_model
+    worker_model=chat_model,
+    # Concurrent code candidates ranked locally before falling back to the reflect loop.
+    codegen_candidates=int(os.getenv("CODEGEN_CANDIDATES", "1"))
 )
+testgen_agent = build_testgen_graph(model=chat_model)
+
+# Per-framework retrieval defaults; settings sent with a request take precedence.
+FRAMEWORK_RETRIEVAL: Dict[str, RetrievalConfig] = {
+    "python": RetrievalConfig(k=4),
+}
+
+def run_config(
+    framework: Optional[str] = None,
+    retrieval: Optional[RetrievalConfig] = None,
+    tenant: Optional[str] = None
+) -> dict:
+    configurable = {}
+    if framework:
+        configurable["framework"] = framework
+    if tenant:
+        configurable["tenant"] = tenant
+    retrieval = retrieval or FRAMEWORK_RETRIEVAL.get(framework)
+    if retrieval:
+        configurable["retrieval"] = retrieval
+    return {"callbacks": [TracingCallbackHandler(), usage_handler], "configurable": configurable}
+
+async def handle_chat(
+    input_text: str,
+    token_budget: Optional[int] = None,
+    framework: Optional[str] = None,
+    retrieval: Optional[RetrievalConfig] = None,
+    tenant: Optional[str] = None
+) -> SupervisorState:
+    token_budget = request_budget(token_budget)
+
+    async def run() -> SupervisorState:
+        with track_usage(token_budget) as usage:
+            raw_output = await agent.ainvoke({"messages": input_text}, config=run_config(framework, retrieval, tenant))
+        return SupervisorState(**raw_output, usage=usage.report)
 
-async def handle_chat(input_text: str) -> SupervisorState:
-    raw_output = await agent.ainvoke({"messages": input_text})
-    return SupervisorState(**raw_output)
+    # With COALESCE_CHAT_REQUESTS=1, identical concurrent requests share one graph run.
+    key = digest(input_text, token_budget, framework, tenant, retrieval.model_dump_json() if retrieval else None)
+    return await request_flight.ado(key, run)
 
-async def handle_streaming_chat(input_text: str):
-    async for raw_output in agent.astream(input = {"messages": input_text}, stream_mode="values"):
-        yield serialize_state(raw_output)
+async def handle_streaming_chat(
+    input_text: str,
+    token_budget: Optional[int] = None,
+    framework: Optional[str] = None,
+    retrieval: Optional[RetrievalConfig] = None,
+    tenant: Optional[str] = None
+):
+    with track_usage(request_budget(token_budget)) as usage:
+        try:
+            async for raw_output in agent.astream(input = {"messages": input_text}, stream_mode="values", config=run_config(framework, retrieval, tenant)):
+                yield serialize_state({**raw_output, "usage": usage.report})
+        except (TokenBudgetExceeded, ArtifactNotFound) as e:
+            # The response has started, so there is no 429/410; the last event reports the error.
+            yield serialize_state({"error": str(e), "usage": usage.report})
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langgraph.graph.state import CompiledStateGraph
+
+from infrastructure.jobstore import SQLiteJobStore
+from services.agent_service import agent, testgen_agent, run_config
+from utils.helpers import serialize_state
+from utils.schemas import Job, JobKind, RetrievalConfig
+from utils.usage import UsageTracker, request_budget, track_usage
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class JobManager:
+    """
+    Runs long graph executions in the background with a pool of asyncio workers.
+
+    Jobs are persisted in a SQLiteJobStore; workers pull job ids from an in-process
+    queue and execute the graph registered for the job's kind. Subscribers receive
+    status and progress events for a job as they happen.
+    """
+    def __init__(self, store: SQLiteJobStore, graphs: Dict[JobKind, CompiledStateGraph], num_workers: int = 4):
+        self.store = store
+        self.graphs = graphs
+        self.num_workers = num_workers
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._trackers: Dict[str, UsageTracker] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    async def start(self):
+        """Re-enqueues jobs left queued by a previous process and starts the workers."""
+        for job_id in self.store.recover():
+            self._queue.put_nowait(job_id)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+    async def stop(self):
+        """Cancels running jobs and stops the workers."""
+        for job_id in list(self._running):
+            await self.cancel(job_id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(
+        self,
+        input_text: str,
+        kind: JobKind = "chat",
+        framework: Optional[str] = None,
+        tenant: Optional[str] = None,
+        retrieval: Optional[RetrievalConfig] = None,
+        token_budget: Optional[int] = None,
+    ) -> Job:
+        """Queues a job; the request options are stored with it and applied as in handle_chat."""
+        if kind not in self.graphs:
+            raise ValueError(f"Unsupported job kind: {kind}")
+        job = self.store.create(input_text, kind, framework, tenant, retrieval, token_budget)
+        self._queue.put_nowait(job.id)
+        self._publish(job.id, {"event": "status", "job": job.model_dump()})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancels a job. Queued jobs never start. Running jobs are flagged, so every
+        later LLM call of the job raises RequestCancelled, including calls in the
+        executor threads that run graph nodes, and their task is cancelled. The
+        job is marked cancelled once the task has exited.
+        """
+        tracker = self._trackers.get(job_id)
+        if tracker:
+            tracker.cancel()
+        task = self._running.get(job_id)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        job = self.store.finish(job_id, "cancelled", error="Cancelled by user")
+        if job:
+            self._publish(job_id, {"event": "status", "job": job.model_dump()})
+        return job
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields the current job snapshot followed by live events until the job finishes.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            yield {"event": "status", "job": job.model_dump()}
+            if job.status in TERMINAL_STATUSES:
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] == "status" and event["job"]["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            self._subscribers[job_id].remove(queue)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    def _publish(self, job_id: str, event: Dict[str, Any]):
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait(event)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if not self.store.mark_running(job_id):
+                    continue
+                task = asyncio.create_task(self._execute(job_id))
+                self._running[job_id] = task
+                await asyncio.gather(task, return_exceptions=True)
+            finally:
+                self._running.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _execute(self, job_id: str):
+        job = self.store.get(job_id)
+        self._publish(job_id, {"event": "status", "job": job.model_dump()})
+        graph = self.graphs[job.kind]
+        final_state = None
+        seen_steps = 0
+        try:
+            with track_usage(request_budget(job.token_budget)) as usage:
+                self._trackers[job_id] = usage
+                config = run_config(job.framework, job.retrieval, job.tenant)
+                async for state in graph.astream({"messages": job.input}, stream_mode="values", config=config):
+                    final_state = state
+                    flow = state.get("flow", [])
+                    if len(flow) > seen_steps:
+                        new_steps = json.loads(serialize_state(flow[seen_steps:]))
+                        seen_steps = len(flow)
+                        self._publish(job_id, {"event": "progress", "flow": new_steps})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if usage.cancelled:
+                # cancel() records the status once the task has exited.
+                raise
+            job = self.store.finish(job_id, "failed", error=str(e))
+        else:
+            result = json.loads(serialize_state({**(final_state or {}), "usage": usage.report}))
+            job = self.store.finish(job_id, "succeeded", result=result)
+        finally:
+            self._trackers.pop(job_id, None)
+        self._publish(job_id, {"event": "status", "job": job.model_dump()})
+
+
+job_manager = JobManager(
+    store=SQLiteJobStore(os.getenv("JOBS_DB_PATH", "jobs.db")),
+    graphs={"chat": agent, "testgen": testgen_agent},
+    num_workers=int(os.getenv("JOB_WORKERS", "4")),
+)
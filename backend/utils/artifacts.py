@@ -0,0 +1,267 @@
+"""
+Content-addressed store for large graph artifacts.
+
+Graph states keep short artifact ids instead of retrieved documents, analyses,
+test suites and evaluations, so LangGraph copies, merges and checkpoints a few
+bytes per step instead of the artifacts. Identical artifacts get the same id
+and are stored once. The process-wide store is created on first use, see
+`get_artifact_store`.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from langchain_core.documents import Document
+from pydantic import BaseModel
+
+from utils.schemas import Code, CodeAnalysis, TestCodeEvaluation
+
+# Models that can be stored, by class name.
+ARTIFACT_TYPES: Dict[str, Type[BaseModel]] = {cls.__name__: cls for cls in (Document, Code, CodeAnalysis, TestCodeEvaluation)}
+
+
+def _encode(value: Any) -> Tuple[str, Any]:
+    """(kind, JSON-able data) for a string, a stored model type or a list of one model type."""
+    if isinstance(value, str):
+        return "text", value
+    if isinstance(value, BaseModel) and type(value).__name__ in ARTIFACT_TYPES:
+        return type(value).__name__, value.model_dump(mode="json")
+    if isinstance(value, list):
+        if not value:
+            return "list:text", []
+        if all(type(v) is type(value[0]) and type(v).__name__ in ARTIFACT_TYPES for v in value):
+            return f"list:{type(value[0]).__name__}", [v.model_dump(mode="json") for v in value]
+    raise TypeError(f"Cannot store {type(value).__name__} as an artifact")
+
+
+class ArtifactNotFound(KeyError):
+    """An artifact id that is unknown or whose artifact was swept."""
+
+    def __str__(self) -> str:
+        # KeyError quotes its message.
+        return str(self.args[0]) if self.args else ""
+
+
+def _decode(kind: str, data: Any) -> Any:
+    if kind == "text":
+        return data
+    if kind.startswith("list:"):
+        item = kind[len("list:"):]
+        return [_decode(item, d) for d in data]
+    return ARTIFACT_TYPES[kind].model_validate(data)
+
+
+class ArtifactStore:
+    """
+    Write-through store: artifacts are written once to `path` as JSON files named
+    by the SHA-256 of their content and kept decoded in an LRU cache of up to
+    `cache_bytes` (measured by their JSON size) for reads.
+
+    `path` is created private to the current user (mode 0700). At most every
+    `sweep_interval` seconds a put sweeps the directory: files not written or read
+    from disk for `ttl` seconds are deleted, then the oldest files until at most
+    `max_bytes` remain. Artifacts in the in-memory cache and files used within the
+    last `min_age` seconds (longer than any graph run) are never swept, so running
+    graphs keep their artifacts even if the disk budget is exceeded for a while.
+    Reading a swept artifact raises ArtifactNotFound.
+
+    Args:
+        path: Directory for artifact files.
+        cache_bytes: Budget of the in-memory cache.
+        ttl: Seconds an unused artifact file is kept; at least `min_age`.
+        max_bytes: Budget of the artifact files on disk.
+        sweep_interval: Minimum seconds between sweeps.
+        min_age: Seconds a used artifact file is kept regardless of `max_bytes`.
+    """
+    def __init__(
+        self,
+        path: str,
+        cache_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 24 * 3600,
+        max_bytes: int = 1024 * 1024 * 1024,
+        sweep_interval: float = 600,
+        min_age: float = 3600,
+    ):
+        self.path = path
+        self.cache_bytes = cache_bytes
+        self.min_age = min_age
+        self.ttl = max(ttl, min_age)
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        # makedirs leaves an existing directory alone; one owned by another user fails here.
+        os.chmod(path, 0o700)
+        self._last_sweep = 0.0
+        self._sweeping = False
+        self.swept = 0
+        self._cache: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self.puts = 0
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, ref: str) -> str:
+        return os.path.join(self.path, ref[-2:], f"{ref}.json")
+
+    def _cache_put(self, ref: str, value: Any, size: int) -> List[str]:
+        """Caches `value` and returns the evicted ids, whose files the caller touches."""
+        if ref in self._cache:
+            self._cache.move_to_end(ref)
+            return []
+        self._cache[ref] = (value, size)
+        self._cached_bytes += size
+        evicted = []
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            old, (_, old_size) = self._cache.popitem(last=False)
+            self._cached_bytes -= old_size
+            evicted.append(old)
+        return evicted
+
+    def _uncached(self, evicted: List[str]):
+        # Cached artifacts are spared by sweeps; once evicted their files count as just used.
+        for ref in evicted:
+            _touch(self._file(ref))
+
+    def put(self, value: Any) -> str:
+        """Stores `value` and returns its id, e.g. "codeanalysis-3f2a...". Storing it again is free."""
+        kind, data = _encode(value)
+        payload = json.dumps({"kind": kind, "data": data}, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        ref = f"{kind.replace('list:', '').lower()}-{hashlib.sha256(payload).hexdigest()[:24]}"
+        with self._lock:
+            self.puts += 1
+            if ref in self._cache:
+                self._cache.move_to_end(ref)
+                return ref
+        file = self._file(ref)
+        if os.path.exists(file):
+            _touch(file)
+        else:
+            os.makedirs(os.path.dirname(file), mode=0o700, exist_ok=True)
+            tmp = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, file)
+            with self._lock:
+                self.writes += 1
+        with self._lock:
+            evicted = self._cache_put(ref, value, len(payload))
+        self._uncached(evicted)
+        self._maybe_sweep()
+        return ref
+
+    def _maybe_sweep(self):
+        now = time.time()
+        with self._lock:
+            if self._sweeping or now - self._last_sweep < self.sweep_interval:
+                return
+            self._sweeping, self._last_sweep = True, now
+        try:
+            self.sweep(now)
+        finally:
+            with self._lock:
+                self._sweeping = False
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Deletes expired artifact files, then the oldest over `max_bytes`, sparing
+        cached artifacts and files used in the last `min_age` seconds. Returns the
+        number deleted.
+        """
+        now = now or time.time()
+        with self._lock:
+            cached = set(self._cache)
+        files = []
+        for directory, _, names in os.walk(self.path):
+            for name in names:
+                file = os.path.join(directory, name)
+                try:
+                    stat = os.stat(file)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, file))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        deleted = 0
+        for mtime, size, file in files:
+            if (mtime > now - self.ttl and total <= self.max_bytes) or mtime > now - self.min_age:
+                break
+            if os.path.basename(file)[:-len(".json")] in cached:
+                continue
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+            total -= size
+            deleted += 1
+        with self._lock:
+            self.swept += deleted
+        return deleted
+
+    def get(self, ref: str) -> Any:
+        """The artifact stored under `ref`. Raises ArtifactNotFound for unknown or swept ids."""
+        with self._lock:
+            cached = self._cache.get(ref)
+            if cached is not None:
+                self._cache.move_to_end(ref)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+        file = self._file(ref)
+        try:
+            with open(file, "rb") as f:
+                payload = f.read()
+        except FileNotFoundError:
+            raise ArtifactNotFound(f"Artifact {ref} is unknown or expired") from None
+        _touch(file)
+        stored = json.loads(payload)
+        value = _decode(stored["kind"], stored["data"])
+        with self._lock:
+            evicted = self._cache_put(ref, value, len(payload))
+        self._uncached(evicted)
+        return value
+
+    def __contains__(self, ref: str) -> bool:
+        return ref in self._cache or os.path.exists(self._file(ref))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "cached": len(self._cache),
+                "cached_bytes": self._cached_bytes,
+                "puts": self.puts,
+                "writes": self.writes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "swept": self.swept,
+            }
+
+
+def _touch(file: str):
+    """Marks `file` as used so sweeps keep it; it may have been swept concurrently."""
+    try:
+        os.utime(file)
+    except FileNotFoundError:
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_artifact_store() -> ArtifactStore:
+    """
+    The process-wide store, created on first use in ARTIFACT_STORE_PATH
+    (default ~/.cache/coder/artifacts).
+    """
+    return ArtifactStore(
+        os.getenv("ARTIFACT_STORE_PATH") or os.path.join(os.path.expanduser("~"), ".cache", "coder", "artifacts"),
+        cache_bytes=int(os.getenv("ARTIFACT_CACHE_MB", "64")) * 1024 * 1024,
+        ttl=float(os.getenv("ARTIFACT_TTL", str(24 * 3600))),
+        max_bytes=int(os.getenv("ARTIFACT_MAX_MB", "1024")) * 1024 * 1024,
+        min_age=float(os.getenv("ARTIFACT_MIN_AGE", "3600")),
+    )
@@ -0,0 +1,84 @@
+"""
+Local validation and ranking of generated code candidates: AST parse, a check
+that every imported top-level module can be found (without importing it) and an
+optional smoke run in a separate interpreter.
+"""
+import ast
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from utils.schemas import Code, CodeCheck
+
+# Smoke runs execute generated code; keep them off unless the host is sandboxed.
+SMOKE_RUN_ENABLED = os.getenv("CODEGEN_SMOKE_RUN", "0") == "1"
+SMOKE_RUN_TIMEOUT = float(os.getenv("CODEGEN_SMOKE_RUN_TIMEOUT", "5"))
+
+
+def full_source(code: Code) -> str:
+    return f"{code.imports}\n{code.code}"
+
+
+def missing_imports(tree: ast.AST) -> List[str]:
+    """Top-level modules imported by `tree` that cannot be found on this interpreter."""
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.add(node.module.split(".")[0])
+    missing = []
+    for module in sorted(modules):
+        try:
+            if importlib.util.find_spec(module) is None:
+                missing.append(module)
+        except (ImportError, ValueError):
+            missing.append(module)
+    return missing
+
+
+def smoke_run(source: str, timeout: float = SMOKE_RUN_TIMEOUT) -> Tuple[bool, Optional[str]]:
+    """Runs `source` in an isolated interpreter in a scratch directory. Returns (ok, error)."""
+    with tempfile.TemporaryDirectory(prefix="codegen_smoke_") as cwd:
+        try:
+            result = subprocess.run(
+                [sys.executable, "-I", "-c", source], cwd=cwd, capture_output=True, text=True, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            return False, f"Timed out after {timeout}s"
+    if result.returncode != 0:
+        return False, (result.stderr.strip().splitlines() or ["exit code %d" % result.returncode])[-1]
+    return True, None
+
+
+def check_code(code: Code, smoke: bool = False) -> CodeCheck:
+    source = full_source(code)
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        return CodeCheck(syntax_ok=False, error=f"Line {e.lineno}, Offset {e.offset}: {e.msg}")
+    missing = missing_imports(tree)
+    if missing:
+        return CodeCheck(syntax_ok=True, missing_imports=missing, error=f"Modules not found: {', '.join(missing)}")
+    if not smoke:
+        return CodeCheck(syntax_ok=True)
+    ok, error = smoke_run(source)
+    return CodeCheck(syntax_ok=True, smoke_ok=ok, error=error)
+
+
+def rank_candidates(candidates: Sequence[Code], smoke: bool = False) -> List[Tuple[Code, CodeCheck]]:
+    """
+    Validates the candidates and returns (candidate, check) pairs, best first.
+    Ties keep the generation order.
+    """
+    if smoke and len(candidates) > 1:
+        with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+            checks = list(pool.map(lambda c: check_code(c, smoke), candidates))
+    else:
+        checks = [check_code(c, smoke) for c in candidates]
+    order = sorted(range(len(candidates)), key=lambda i: checks[i].rank, reverse=True)
+    return [(candidates[i], checks[i]) for i in order]
@@ -0,0 +1,229 @@
+"""
+Prompt compaction for test evaluation.
+
+Instead of the indented analysis JSON and the whole test suite on every attempt,
+the evaluator gets compact JSON, a coverage map worked out locally from the test
+AST, and on retries the suite with the tests unchanged since its previous review
+reduced to their signatures. Imports, fixtures (setUp/tearDown) and helpers are
+always sent, and a change to them counts as a change to every test.
+"""
+import ast
+import hashlib
+import json
+import math
+import re
+import textwrap
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from utils.schemas import CodeAnalysis, TestCodeEvaluation
+
+COVERAGE_INTRO = (
+    "Coverage map (compact JSON, derived from the test code): for each component from the prior analysis, "
+    "the tests that reference it, the key behaviors and edge cases each test appears to cover, and those "
+    "no test appears to cover. Treat it as a hint and verify against the tests:\n"
+)
+ANALYSIS_INTRO = "Prior Code Analysis (key components, behaviors and edge cases that should be tested, compact JSON):\n"
+
+STOPWORDS = {
+    "the", "and", "for", "are", "with", "that", "this", "when", "should", "returns", "return", "value",
+    "values", "input", "inputs", "given", "from", "into", "not", "its", "handles", "correctly", "test",
+    "tests", "self", "assert", "case", "cases",
+}
+WORD_RE = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+IDENTIFIER_RE = re.compile(r"[A-Za-z_]\w*")
+# Digest key of everything in the suite but the tests; not a valid test name.
+FIXTURES_KEY = "<fixtures>"
+
+
+def _prune(value: Any) -> Any:
+    if isinstance(value, dict):
+        pruned = {k: _prune(v) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [_prune(v) for v in value if v not in (None, "", [], {})]
+    return value
+
+
+def compact_json(value: Any) -> str:
+    """JSON without indentation or whitespace, dropping nulls and empty fields."""
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    return json.dumps(_prune(value), separators=(",", ":"), ensure_ascii=False)
+
+
+def extract_tests(test_code: str) -> Dict[str, str]:
+    """
+    Maps each test ("TestClass.test_method" or a module-level "test_function") to
+    its source. Components are generated separately, so repeated names get a "#n" suffix.
+    Returns an empty dict if the test code does not parse.
+    """
+    try:
+        tree = ast.parse(test_code)
+    except SyntaxError:
+        return {}
+    return {
+        name: textwrap.dedent(" " * node.col_offset + (ast.get_source_segment(test_code, node) or ""))
+        for name, node in _test_nodes(tree)
+    }
+
+
+def _test_nodes(tree: ast.Module) -> List[Tuple[str, ast.AST]]:
+    """(name, function node) of the tests in `tree`, in source order, named as in `extract_tests`."""
+    nodes: List[Tuple[str, ast.AST]] = []
+    seen = set()
+
+    def add(name: str, node: ast.AST):
+        key, n = name, 2
+        while key in seen:
+            key, n = f"{name}#{n}", n + 1
+        seen.add(key)
+        nodes.append((key, node))
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name.startswith("test"):
+                    add(f"{node.name}.{item.name}", item)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            add(node.name, node)
+    return nodes
+
+
+def elide_tests(test_code: str, keep: Set[str], stub: bool = True) -> str:
+    """
+    `test_code` with the tests not named in `keep` reduced to a `...` stub of their
+    signature (or removed, with `stub=False`), keeping imports, classes, fixtures
+    and helpers as written. Returns `test_code` unchanged if it does not parse.
+    """
+    try:
+        tree = ast.parse(test_code)
+    except SyntaxError:
+        return test_code
+    lines = test_code.splitlines()
+    for name, node in reversed(_test_nodes(tree)):
+        if name in keep:
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        replacement = [f"{' ' * node.col_offset}{prefix} {node.name}({ast.unparse(node.args)}): ...  # unchanged"]
+        lines[start:node.end_lineno] = replacement if stub else []
+    return "\n".join(lines)
+
+
+def _words(text: str) -> set:
+    return {w.lower() for w in WORD_RE.findall(text) if len(w) > 2 and w.lower() not in STOPWORDS}
+
+
+def _targets(analysis: CodeAnalysis) -> List[Tuple[str, List[str], List[str]]]:
+    """(name, key behaviors, edge cases) for every function and class method in the analysis."""
+    targets = []
+    for component in analysis.components:
+        if component.type == "function":
+            targets.append((component.name, component.key_behaviors, component.edge_cases))
+        elif component.methods:
+            for method in component.methods:
+                targets.append((f"{component.name}.{method.name}", method.key_behaviors, method.edge_cases))
+        else:
+            targets.append((component.name, [], []))
+    return targets
+
+
+def coverage_summary(analysis: CodeAnalysis, tests: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    For each analysed component, the tests that reference it and which of its key
+    behaviors and edge cases each test appears to cover, judged by keyword overlap
+    between the analysis text and the test's name and body.
+    """
+    identifiers = {name: set(IDENTIFIER_RE.findall(source)) for name, source in tests.items()}
+    words = {name: _words(name + " " + source) for name, source in tests.items()}
+    summary = []
+    for target, behaviors, edge_cases in _targets(analysis):
+        short = target.rsplit(".", 1)[-1]
+        exercising = [name for name in tests if short in identifiers[name]]
+        entry: Dict[str, Any] = {"component": target, "tests": exercising}
+        uncovered = []
+        for label, items in (("behaviors", behaviors), ("edge_cases", edge_cases)):
+            covered = {}
+            for text in items:
+                keywords = _words(text)
+                needed = max(1, math.ceil(len(keywords) / 3))
+                by = [name for name in (exercising or tests) if len(keywords & words[name]) >= needed]
+                if by:
+                    covered[text] = by
+                else:
+                    uncovered.append(text)
+            entry[label] = covered
+        entry["uncovered"] = uncovered
+        summary.append(entry)
+    return summary
+
+
+def _digest(source: str) -> str:
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+
+
+def test_digests(tests: Dict[str, str]) -> Dict[str, str]:
+    return {name: _digest(source) for name, source in tests.items()}
+
+
+def evaluation_inputs(
+    original_code: str,
+    analysis: CodeAnalysis,
+    test_code: str,
+    previous_tests: Optional[Dict[str, str]] = None,
+    previous_evaluation: Optional[TestCodeEvaluation] = None,
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Builds the variables of COMPACT_EVALUATION_TEMPLATE.
+
+    Args:
+        original_code: The code under test.
+        analysis: The prior code analysis.
+        test_code: The full current test suite.
+        previous_tests: Test digests sent in the previous evaluation, if any.
+        previous_evaluation: The previous evaluation, sent alongside a partial suite.
+
+    Returns:
+        The prompt variables and the digests of the current tests (and, under
+        FIXTURES_KEY, of the rest of the suite), to be stored as `previous_tests`
+        for the next attempt.
+    """
+    tests = extract_tests(test_code)
+    digests = test_digests(tests)
+    if tests:
+        fixtures = elide_tests(test_code, set(), stub=False)
+        # Blank lines left around removed tests do not count as fixture changes.
+        digests[FIXTURES_KEY] = _digest("\n".join(line for line in fixtures.splitlines() if line.strip()))
+    if not tests:
+        return {
+            "original_code": original_code,
+            "coverage_summary": ANALYSIS_INTRO + compact_json(analysis),
+            "test_scope": "Generated Unit Tests (using unittest framework):",
+            "test_code": test_code,
+        }, digests
+
+    inputs = {
+        "original_code": original_code,
+        "coverage_summary": COVERAGE_INTRO + compact_json(coverage_summary(analysis, tests)),
+        "test_scope": "Generated Unit Tests (using unittest framework):",
+        "test_code": test_code,
+    }
+    # Changed imports, fixtures or helpers can change what every test does; send the whole suite.
+    if previous_tests and previous_evaluation and previous_tests.get(FIXTURES_KEY) == digests[FIXTURES_KEY]:
+        changed = [name for name in tests if previous_tests.get(name) != digests[name]]
+        unchanged = [name for name in tests if name not in changed]
+        removed = [name for name in previous_tests if name not in tests and name != FIXTURES_KEY]
+        if unchanged:
+            inputs["test_scope"] = (
+                "The suite was revised after your previous review. Tests marked '# unchanged' are shown "
+                "as signatures only; judge the suite as a whole. "
+                + compact_json({
+                    "unchanged_tests": unchanged,
+                    "removed_tests": removed,
+                    "previous_evaluation": previous_evaluation.model_dump(),
+                })
+            )
+            inputs["test_code"] = elide_tests(test_code, set(changed))
+    return inputs, digests
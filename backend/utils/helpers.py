@@ -8,28 +8,112 @@ from langgraph.prebuilt import InjectedState
 from langgraph.graph import MessagesState
 from langgraph.types import Command
 import json
+from typing import Any, Optional
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStoreRetriever
 
-from infrastructure.vectorstore import ChromaVectorStore
+from infrastructure.vectorstore import ChromaVectorStore, has_metadata_tag
+from utils.schemas import RetrievalConfig
+from utils.resilience import ResilientChatModel
+from utils.singleflight import digest, retrieval_flight
 
-def get_chat_model(model_name: str, temperature: float = 0.0) -> BaseChatModel:
-    if model_name.startswith("gemini-"):
-        return ChatGoogleGenerativeAI(model=model_name, temperature = temperature)
-    else:
+def get_chat_model(model_name: str, temperature: float = 0.0, resilient: bool = True) -> BaseChatModel:
+    """
+    Returns the chat model for `model_name`. Unless `resilient` is False it is wrapped
+    with deadlines, retries, hedging and the LLM_FALLBACK_MODELS fallback chain
+    (comma separated, default gemini-2.0-flash-lite).
+    """
+    if not resilient:
+        return _google_model(model_name, temperature)
+    fallbacks = [name.strip() for name in os.getenv("LLM_FALLBACK_MODELS", "gemini-2.0-flash-lite").split(",")]
+    names = [model_name] + [name for name in fallbacks if name and name != model_name]
+    # Retries and deadlines belong to the wrapper; the client's own retries would multiply
+    # them, and its request timeout ends calls the wrapper has abandoned.
+    timeout = float(os.getenv("LLM_TIMEOUT", "60"))
+    return ResilientChatModel.from_env([
+        _google_model(name, temperature, max_retries=0, timeout=timeout) for name in names
+    ])
+
+def _google_model(model_name: str, temperature: float, **kwargs: Any) -> BaseChatModel:
+    if not model_name.startswith("gemini-"):
         raise ValueError(f"Unsupported model_name: {model_name}")
+    return ChatGoogleGenerativeAI(model=model_name, temperature = temperature, **kwargs)
+
+def with_temperature(model: BaseChatModel, temperature: float) -> BaseChatModel:
+    """A copy of `model` (and of the models it wraps) sampling at `temperature`."""
+    if isinstance(model, ResilientChatModel):
+        return model.model_copy(update={"models": [with_temperature(m, temperature) for m in model.models]})
+    if "temperature" in type(model).model_fields:
+        return model.model_copy(update={"temperature": temperature})
+    return model
 
 def get_retriever(
     persistent_path: str ,
     embeddings_model: str = "models/text-embedding-004",
     collection_name: str = "my_documents",
-    chunk_config: dict = {"chunk_size": 500,"chunk_overlap": 20 }
+    chunk_config: dict = {"chunk_size": 500,"chunk_overlap": 20 },
+    backend: str = "chroma"
     ):
     vectorstore = ChromaVectorStore(    
         persistent_path=persistent_path,
         embeddings_model=embeddings_model,
         collection_name=collection_name,
-        chunk_config=chunk_config
+        chunk_config=chunk_config,
+        backend=backend
     )
     return vectorstore.as_retriever()
+
+def _search(retriever: VectorStoreRetriever, query: str, settings: RetrievalConfig, framework: Optional[str]) -> list[Document]:
+    configured = retriever.model_copy(update={
+        "search_type": settings.search_type,
+        "search_kwargs": settings.search_kwargs(framework),
+    })
+    # Identical concurrent queries against the same store share one search.
+    key = digest(id(retriever.vectorstore), configured.search_type, sorted(configured.search_kwargs.items()), query)
+    return retrieval_flight.do(key, lambda: configured.invoke(query))
+
+
+def retrieve_documents(
+    retriever: BaseRetriever,
+    query: str,
+    settings: RetrievalConfig,
+    framework: Optional[str] = None,
+    tenant: Optional[str] = None,
+    framework_requested: bool = False
+) -> list[Document]:
+    """
+    Runs a retrieval with the given settings. A collection manager (anything with
+    `retriever_for`) is first routed to the tenant's or framework's collection.
+    Vector store retrievers are re-configured with the search type, k and metadata
+    filters.
+
+    The framework filter is applied when the request asked for the framework
+    (`framework_requested`) or the collection has chunks tagged with it, so
+    untagged collections are not searched twice for a default framework. Only
+    when the collection has no chunks tagged with the requested framework or
+    version is an empty result retried without those filters; in a tagged
+    collection an empty result stands, so other frameworks' documents are never
+    returned in their place.
+    """
+    if hasattr(retriever, "retriever_for"):
+        retriever = retriever.retriever_for(framework=framework, tenant=tenant)
+    if not isinstance(retriever, VectorStoreRetriever):
+        return retriever.invoke(query)
+    store = retriever.vectorstore
+    framework_tagged = bool(framework and settings.filter_by_framework and has_metadata_tag(store, "framework", framework))
+    if not (framework_requested or framework_tagged):
+        settings = settings.model_copy(update={"filter_by_framework": False})
+    docs = _search(retriever, query, settings, framework)
+    untagged = (
+        (settings.filter_by_framework and framework and not framework_tagged)
+        or (settings.version and not has_metadata_tag(store, "version", settings.version))
+    )
+    if not docs and untagged:
+        unfiltered = settings.model_copy(update={"filter_by_framework": False, "version": None})
+        docs = _search(retriever, query, unfiltered, None)
+    return docs
+
 def create_handoff_tool(*, agent_name: str, description: str | None = None):
     name = f"transfer_to_{agent_name}"
     description = description or f"Ask {agent_name} for help."
@@ -45,9 +129,11 @@ def create_handoff_tool(*, agent_name: str, description: str | None = None):
             "name": name,
             "tool_call_id": tool_call_id,
         }
+        # Only the supervisor's tool-calling message is new to the parent graph; the
+        # messages reducer appends it and the tool reply without copying the rest of the state.
         return Command(
             goto=agent_name,  
-            update={**state, "messages": state["messages"] + [tool_message]},
+            update={"messages": [state["messages"][-1], tool_message]},
             graph=Command.PARENT,  
         )
     return handoff_tool
@@ -0,0 +1,239 @@
+"""
+Tolerant local parsing of JSON written by LLMs.
+
+Models wrap JSON in markdown fences, add prose around it, copy the `//` comments
+of the prompt's example, leave trailing commas, use Python literals or stop
+mid-object. `repair_json` fixes these in one pass without touching string
+contents, so structured outputs only need an LLM re-ask when the damage is
+beyond that.
+"""
+import json
+import re
+import threading
+from typing import Any, Dict, List
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import Generation
+from pydantic import ValidationError
+
+FENCE_RE = re.compile(r"```[ \t]*(?:json|JSON|javascript|js)?[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+NUMBER_RE = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+LEADING_DOT_RE = re.compile(r"^(-?)\.")
+WORD_RE = re.compile(r"[A-Za-z_$][\w$-]*")
+LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+CLOSERS = {"{": "}", "[": "]"}
+ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+JSON_ESCAPES = set('"\\/bfnrt')
+HEX4_RE = re.compile(r"[0-9a-fA-F]{4}")
+
+
+def _unfence(text: str) -> str:
+    """
+    The fenced block the reply opens with (after optional prose) if it contains
+    JSON, or the text itself. Fences inside or after the JSON, e.g. code in a
+    string value, are left to the bracket matching.
+    """
+    match = FENCE_RE.search(text)
+    if match is None:
+        return text
+    brackets = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if brackets and min(brackets) < match.start():
+        return text
+    body = match.group(1)
+    return body if "{" in body or "[" in body else text
+
+
+def _last_significant(out: List[str]) -> str:
+    for chunk in reversed(out):
+        stripped = chunk.rstrip()
+        if stripped:
+            return stripped[-1]
+    return ""
+
+
+def _drop_trailing_comma(out: List[str]):
+    while out and not out[-1].strip():
+        out.pop()
+    if out and out[-1].rstrip().endswith(","):
+        out[-1] = out[-1].rstrip()[:-1]
+
+
+def repair_json(text: str) -> str:
+    """
+    Rewrites LLM output into strict JSON: strips fences and surrounding prose,
+    removes `//`, `#` and `/* */` comments and trailing commas, converts
+    single-quoted strings and Python literals, quotes bare keys, escapes raw
+    newlines in strings, inserts missing commas between values and closes
+    brackets left open by a truncated reply. Only the first top-level value is kept.
+    """
+    text = _unfence(text)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text.strip()
+    i, n = min(starts), len(text)
+    out: List[str] = []
+    stack: List[str] = []
+
+    def begin_value():
+        # A value or key right after another value means a comma is missing.
+        last = _last_significant(out)
+        if last and (last in '"}]' or last.isalnum()):
+            out.append(",")
+
+    while i < n and (stack or not out):
+        c = text[i]
+        if c in "\"'":
+            begin_value()
+            quote, j, chunk = c, i + 1, ['"']
+            while j < n and text[j] != quote:
+                if text[j] == "\\" and j + 1 < n:
+                    escaped = text[j + 1]
+                    if escaped == "'":
+                        chunk.append("'")
+                    elif escaped in JSON_ESCAPES or escaped == "u" and HEX4_RE.match(text, j + 2):
+                        chunk.append("\\" + escaped)
+                    else:
+                        # Not a JSON escape (e.g. a regex's \d): keep the backslash literally.
+                        chunk.append("\\\\" + ESCAPES.get(escaped, escaped))
+                    j += 2
+                    continue
+                if text[j] == '"':
+                    chunk.append('\\"')
+                else:
+                    chunk.append(ESCAPES.get(text[j], text[j]))
+                j += 1
+            chunk.append('"')
+            out.append("".join(chunk))
+            i = j + 1
+        elif c in "{[":
+            begin_value()
+            stack.append(c)
+            out.append(c)
+            i += 1
+        elif c in "}]":
+            _drop_trailing_comma(out)
+            if _last_significant(out) == ":":
+                out.append("null")
+            while stack and CLOSERS[stack[-1]] != c:
+                out.append(CLOSERS[stack.pop()])
+            if stack:
+                stack.pop()
+                out.append(c)
+            i += 1
+        elif c == "/" and text.startswith("//", i) or c == "#":
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+        elif c == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        elif c in ",:":
+            if c == "," and _last_significant(out) in ",[{":
+                i += 1
+                continue
+            out.append(c)
+            i += 1
+        elif c.isspace():
+            out.append(c)
+            i += 1
+        else:
+            match = NUMBER_RE.match(text, i) if c in "-.0123456789" else None
+            match = match or WORD_RE.match(text, i)
+            if not match:
+                i += 1
+                continue
+            word = match.group(0)
+            begin_value()
+            if word in LITERALS:
+                out.append(LITERALS[word])
+            elif NUMBER_RE.fullmatch(word):
+                out.append(LEADING_DOT_RE.sub(r"\g<1>0.", word).rstrip(".") if "." in word else word)
+            else:
+                # A bare key (or an unquoted string value).
+                out.append(json.dumps(word))
+            i = match.end()
+
+    # A truncated reply: close whatever is still open.
+    _drop_trailing_comma(out)
+    if stack and _last_significant(out) == ":":
+        out.append("null")
+    while stack:
+        out.append(CLOSERS[stack.pop()])
+    return "".join(out).strip()
+
+
+class ParseMetrics:
+    """
+    Outcomes of parsing structured model outputs, per schema: clean JSON,
+    repaired locally, failed (and sent to the LLM for repair), and LLM re-asks.
+    Re-asked outputs are parsed and counted like any other output.
+    """
+    OUTCOMES = ("clean", "repaired", "failed", "llm_reasks")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, schema: str, outcome: str):
+        with self._lock:
+            counts = self._counts.setdefault(schema, dict.fromkeys(self.OUTCOMES, 0))
+            counts[outcome] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for schema, counts in self._counts.items():
+                parsed = counts["clean"] + counts["repaired"] + counts["failed"]
+                result[schema] = {
+                    **counts,
+                    "outputs": parsed,
+                    "failure_rate": counts["failed"] / parsed if parsed else 0.0,
+                    "local_repair_rate": counts["repaired"] / parsed if parsed else 0.0,
+                }
+            return result
+
+
+parse_metrics = ParseMetrics()
+
+
+class TolerantPydanticOutputParser(PydanticOutputParser):
+    """
+    PydanticOutputParser that validates strict JSON directly and otherwise
+    repairs it locally (see `repair_json`) before validating against the model.
+    Raises OutputParserException only when the repaired JSON still does not fit.
+    """
+    def _validate(self, data: Any) -> Any:
+        try:
+            return self.pydantic_object.model_validate(data)
+        except ValidationError:
+            # Some models wrap the object in a single key, e.g. {"CodeAnalysis": {...}}.
+            if isinstance(data, dict) and len(data) == 1:
+                inner = next(iter(data.values()))
+                if isinstance(inner, dict):
+                    return self.pydantic_object.model_validate(inner)
+            raise
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        return self.parse(result[0].text)
+
+    def parse(self, text: str) -> Any:
+        schema = self.pydantic_object.__name__
+        try:
+            parsed = self.pydantic_object.model_validate_json(text)
+            parse_metrics.record(schema, "clean")
+            return parsed
+        except ValueError:
+            pass
+        # Schemas are objects, so brackets in any prose before the first "{" are skipped.
+        start = text.find("{")
+        try:
+            parsed = self._validate(json.loads(repair_json(text[start:] if start >= 0 else text)))
+        except ValueError as e:
+            parse_metrics.record(schema, "failed")
+            raise OutputParserException(f"Failed to parse {schema} from completion: {e}", llm_output=text) from e
+        parse_metrics.record(schema, "repaired")
+        return parsed
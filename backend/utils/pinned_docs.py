@@ -0,0 +1,158 @@
+"""
+Pinned documentation for the code generation prompt prefix (opt-in).
+
+With PINNED_DOCS > 0, the documents retrieved most often for the frameworks in
+PINNED_DOCS_FRAMEWORKS become the documentation part of the code generation
+prefix, so requests about different questions on the same framework share a
+byte-identical prefix; the other retrieved documents go into the suffix. Pinned
+documents are sent even when they are not relevant to the question, so pinning
+only pays off where a provider reuses long prefixes. By default nothing is
+pinned and the prefix holds the retrieved documentation as retrieved.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.documents import Document
+
+from utils.prompt_cache import estimate_tokens
+from utils.singleflight import digest
+
+# Documents pinned per framework; 0 (the default) disables pinning.
+PINNED_DOCS = int(os.getenv("PINNED_DOCS", "0"))
+PINNED_DOCS_MIN_HITS = int(os.getenv("PINNED_DOCS_MIN_HITS", "3"))
+PINNED_DOCS_REFRESH = int(os.getenv("PINNED_DOCS_REFRESH", "100"))
+# Frameworks and tenants (comma separated) whose documentation is pinned. Requests
+# without a tenant share the frameworks' pinned documentation; tenants not listed
+# get none, so client-supplied names cannot grow the table.
+PINNED_DOCS_FRAMEWORKS = os.getenv("PINNED_DOCS_FRAMEWORKS", "")
+PINNED_DOCS_TENANTS = os.getenv("PINNED_DOCS_TENANTS", "")
+PINNED_DOCS_MAX_KEYS = int(os.getenv("PINNED_DOCS_MAX_KEYS", "64"))
+
+
+def _names(value: Union[str, Sequence[str]]) -> FrozenSet[str]:
+    if isinstance(value, str):
+        value = value.split(",")
+    return frozenset(name.strip() for name in value if name.strip())
+
+
+class PinnedDocs:
+    """
+    The documents retrieved most often per (tenant, framework), used as the
+    stable documentation in the code generation prefix.
+
+    Documents are counted by content. The pinned set of a (tenant, framework) is
+    recomputed only every `refresh` recorded retrievals, so the prefix stays
+    byte-identical in between; retrieved documents that are not pinned go into
+    the per-request suffix. Tenants never share pinned documents.
+
+    Only `frameworks` are pinned, for requests without a tenant or from one of
+    `tenants`; other retrievals are not recorded. At most `max_keys`
+    (tenant, framework) pairs are tracked, the least recently recorded dropped.
+
+    Attributes:
+        size: Maximum pinned documents per framework; 0 disables pinning.
+        min_hits: Retrievals a document needs before it can be pinned.
+        refresh: Recorded retrievals between recomputations of the pinned set.
+        max_tracked: Documents counted per framework; the least retrieved are dropped.
+        frameworks: Frameworks whose documentation is pinned.
+        tenants: Tenants with their own pinned documentation.
+        max_keys: (tenant, framework) pairs tracked.
+    """
+    def __init__(
+        self,
+        size: int = PINNED_DOCS,
+        min_hits: int = PINNED_DOCS_MIN_HITS,
+        refresh: int = PINNED_DOCS_REFRESH,
+        max_tracked: int = 1000,
+        frameworks: Union[str, Sequence[str]] = PINNED_DOCS_FRAMEWORKS,
+        tenants: Union[str, Sequence[str]] = PINNED_DOCS_TENANTS,
+        max_keys: int = PINNED_DOCS_MAX_KEYS,
+    ):
+        self.size = size
+        self.min_hits = min_hits
+        self.refresh = refresh
+        self.max_tracked = max_tracked
+        self.frameworks = _names(frameworks)
+        self.tenants = _names(tenants)
+        self.max_keys = max_keys
+        self._counts: "OrderedDict[Tuple[Optional[str], str], Dict[str, List[Any]]]" = OrderedDict()
+        self._recorded: Dict[Tuple[Optional[str], str], int] = {}
+        self._pinned: Dict[Tuple[Optional[str], str], Tuple[FrozenSet[str], str]] = {}
+        self._lock = threading.Lock()
+
+    def pins(self, framework: str, tenant: Optional[str] = None) -> bool:
+        return bool(self.size) and framework in self.frameworks and (tenant is None or tenant in self.tenants)
+
+    def record(self, framework: str, docs: Sequence[Document], tenant: Optional[str] = None):
+        if not self.pins(framework, tenant):
+            return
+        key = (tenant, framework)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = {}
+                while len(self._counts) > self.max_keys:
+                    evicted, _ = self._counts.popitem(last=False)
+                    self._recorded.pop(evicted, None)
+                    self._pinned.pop(evicted, None)
+            else:
+                self._counts.move_to_end(key)
+            for doc in docs:
+                entry = counts.setdefault(digest(doc.page_content), [0, doc.page_content])
+                entry[0] += 1
+            if len(counts) > self.max_tracked:
+                for doc_id, _ in sorted(counts.items(), key=lambda kv: kv[1][0])[: len(counts) - self.max_tracked]:
+                    del counts[doc_id]
+            recorded = self._recorded[key] = self._recorded.get(key, 0) + 1
+            if key not in self._pinned or recorded % self.refresh == 0:
+                pinned = self._top(counts)
+                if pinned:
+                    self._pinned[key] = pinned
+
+    def _top(self, counts: Dict[str, List[Any]]) -> Optional[Tuple[FrozenSet[str], str]]:
+        eligible = [(doc_id, entry) for doc_id, entry in counts.items() if entry[0] >= self.min_hits]
+        top = sorted(eligible, key=lambda kv: (-kv[1][0], kv[0]))[: self.size]
+        if not top:
+            return None
+        # Ordered by id, not by count, so the text only changes when the set does.
+        top.sort(key=lambda kv: kv[0])
+        return frozenset(doc_id for doc_id, _ in top), "\n".join(entry[1] for _, entry in top)
+
+    def split(self, framework: str, docs: Sequence[Document], tenant: Optional[str] = None) -> Tuple[str, str]:
+        """
+        (pinned documentation, documentation of the `docs` that are not pinned).
+        Until a framework has pinned documents, all of `docs` is returned first.
+        """
+        pinned = self._pinned.get((tenant, framework)) if self.pins(framework, tenant) else None
+        if not pinned:
+            return "\n".join(doc.page_content for doc in docs), ""
+        pinned_ids, pinned_text = pinned
+        extra = [doc.page_content for doc in docs if digest(doc.page_content) not in pinned_ids]
+        return pinned_text, "\n".join(extra)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._recorded.clear()
+            self._pinned.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Totals per framework; tenants are counted, not named."""
+        with self._lock:
+            result: Dict[str, Dict[str, int]] = {}
+            for (tenant, framework), counts in self._counts.items():
+                totals = result.setdefault(framework, dict.fromkeys(
+                    ("tenants", "recorded", "tracked", "pinned", "pinned_tokens"), 0
+                ))
+                pinned = self._pinned.get((tenant, framework))
+                totals["tenants"] += tenant is not None
+                totals["recorded"] += self._recorded.get((tenant, framework), 0)
+                totals["tracked"] += len(counts)
+                totals["pinned"] += len(pinned[0]) if pinned else 0
+                totals["pinned_tokens"] += estimate_tokens(pinned[1]) if pinned else 0
+            return result
+
+
+pinned_docs = PinnedDocs()
@@ -0,0 +1,147 @@
+"""
+Prompt prefix caching.
+
+Prompts are split into a stable prefix, sent as the system message, and a
+per-request suffix, sent as the human message (see `agents.prompts`). A
+byte-identical prefix at the start of the prompt is what providers reuse
+implicitly (automatic prefix caching). Pinning frequently retrieved
+documentation into the code generation prefix (`utils.pinned_docs`) and
+explicit Gemini context caches (`utils.provider_cache`) are opt-in.
+
+Locally, templates are parsed once (`compile_template`) and rendered prefixes
+are kept in an LRU (`PromptRenderCache`), so a repeated prefix is neither
+re-rendered nor re-allocated.
+"""
+import os
+import string
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompt_values import ChatPromptValue
+from langchain_core.runnables import Runnable, RunnableLambda
+
+PROMPT_RENDER_CACHE_SIZE = int(os.getenv("PROMPT_RENDER_CACHE_SIZE", "256"))
+
+# (name, conversion, format spec) of a replacement field.
+Placeholder = Tuple[str, Optional[str], str]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+class CompiledTemplate:
+    """
+    An f-string prompt template parsed once. Rendering joins the literal parts
+    with the formatted values instead of re-parsing the template on every call.
+
+    Attributes:
+        template: The template source.
+        variables: Names of the template variables, sorted.
+    """
+    def __init__(self, template: str):
+        self.template = template
+        self._parts: List[Union[str, Placeholder]] = []
+        for literal, field, conversion, spec in string.Formatter().parse(template):
+            if literal:
+                self._parts.append(literal)
+            if field is not None:
+                self._parts.append((field, conversion, spec or ""))
+        self.variables = sorted({part[0] for part in self._parts if isinstance(part, tuple)})
+
+    def render(self, values: Dict[str, Any]) -> str:
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise KeyError(f"Prompt is missing variables {missing}")
+        out = []
+        for part in self._parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            field, conversion, spec = part
+            value = values[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "a":
+                value = ascii(value)
+            elif conversion == "s":
+                value = str(value)
+            out.append(format(value, spec))
+        return "".join(out)
+
+
+@lru_cache(maxsize=None)
+def compile_template(template: str) -> CompiledTemplate:
+    return CompiledTemplate(template)
+
+
+class PromptRenderCache:
+    """
+    LRU of rendered prompt prefixes keyed by template and variable values.
+    A hit returns the same SystemMessage object, without rendering.
+
+    Attributes:
+        size: Maximum number of rendered prefixes kept.
+        hits: Renders served from the cache.
+        misses: Renders that had to format the template.
+    """
+    def __init__(self, size: int = PROMPT_RENDER_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, Tuple[str, ...]], SystemMessage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def system_message(self, template: CompiledTemplate, values: Dict[str, Any]) -> SystemMessage:
+        key = (template.template, tuple(str(values.get(name)) for name in template.variables))
+        with self._lock:
+            message = self._entries.get(key)
+            if message is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return message
+            self.misses += 1
+        message = SystemMessage(content=template.render(values))
+        if self.size:
+            with self._lock:
+                self._entries[key] = message
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return message
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            renders = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / renders if renders else 0.0,
+            }
+
+
+render_cache = PromptRenderCache()
+
+
+def prefixed_prompt(prefix: str, suffix: str, **partial_variables: Any) -> Runnable:
+    """
+    Chat prompt with `prefix` rendered as the system message and `suffix` as the
+    human message. Takes the same inputs as `ChatPromptTemplate.from_template(prefix + suffix)`;
+    `partial_variables` are defaults for inputs that may be omitted.
+    """
+    prefix_template, suffix_template = compile_template(prefix), compile_template(suffix)
+
+    def render(inputs: Dict[str, Any]) -> ChatPromptValue:
+        values = {**partial_variables, **inputs}
+        return ChatPromptValue(messages=[
+            render_cache.system_message(prefix_template, values),
+            HumanMessage(content=suffix_template.render(values)),
+        ])
+
+    async def arender(inputs: Dict[str, Any]) -> ChatPromptValue:
+        return render(inputs)
+
+    return RunnableLambda(render, afunc=arender, name="prefixed_prompt")
@@ -0,0 +1,220 @@
+"""
+Explicit provider-side prompt prefix caches (opt-in with PROVIDER_PROMPT_CACHE=1).
+
+The system message of a prefixed prompt (see `utils.prompt_cache.prefixed_prompt`)
+is stored as a Gemini context cache and only the remaining messages are sent.
+Without PROVIDER_PROMPT_CACHE, `with_prefix_cache` returns the model unchanged
+and providers can still reuse the prefix implicitly.
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from utils.prompt_cache import estimate_tokens
+from utils.resilience import ResilientChatModel
+from utils.singleflight import SingleFlight, digest
+from utils.usage import RequestAborted
+
+try:
+    from google.generativeai import caching as genai_caching
+except ImportError:
+    genai_caching = None
+
+# Explicit context caches are billed for storage; keep them off unless enabled.
+PROVIDER_PROMPT_CACHE = os.getenv("PROVIDER_PROMPT_CACHE", "0") == "1"
+PROVIDER_CACHE_MIN_TOKENS = int(os.getenv("PROVIDER_CACHE_MIN_TOKENS", "4096"))
+PROVIDER_CACHE_TTL = float(os.getenv("PROVIDER_CACHE_TTL", "3600"))
+
+
+class ProviderPrefixCache:
+    """
+    Explicit provider-side context caches for long, stable prompt prefixes
+    (Gemini `CachedContent`, via the google-generativeai package).
+
+    A cache is created per (model, prefix) on first use and re-created when its
+    TTL runs out; concurrent first uses share one creation. Creation failures
+    are remembered for `retry_after` seconds, during which the full prompt is sent.
+    Only models with a `cached_content` field are supported, and a cached
+    request cannot also carry tools, so tool-calling chains are not wrapped.
+
+    Attributes:
+        enabled: Whether caches are created at all.
+        min_tokens: Smallest prefix (estimated tokens) worth caching.
+        ttl: Lifetime of a created cache in seconds.
+        retry_after: Seconds before retrying a failed creation.
+    """
+    def __init__(
+        self,
+        enabled: bool = PROVIDER_PROMPT_CACHE,
+        min_tokens: int = PROVIDER_CACHE_MIN_TOKENS,
+        ttl: float = PROVIDER_CACHE_TTL,
+        retry_after: float = 300.0,
+    ):
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.created = 0
+        self.hits = 0
+        self.failures = 0
+        self.fallbacks = 0
+        self._entries: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+        self._flight = SingleFlight("provider_prompt_cache", enabled=True)
+        self._lock = threading.Lock()
+
+    def supports(self, model: BaseChatModel) -> bool:
+        models = model.models if isinstance(model, ResilientChatModel) else [model]
+        return (
+            self.enabled
+            and genai_caching is not None
+            and all("cached_content" in type(m).model_fields for m in models)
+        )
+
+    @staticmethod
+    def _model_name(model: BaseChatModel) -> str:
+        name = getattr(model, "model", "")
+        return name if name.startswith("models/") else f"models/{name}"
+
+    def _lookup(self, key: Tuple[str, str]) -> Tuple[bool, Optional[str]]:
+        """(fresh, cache name) of the entry for `key`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                return False, None
+            if entry[0] is not None:
+                self.hits += 1
+            return True, entry[0]
+
+    def _create(self, key: Tuple[str, str], prefix: str) -> Optional[str]:
+        fresh, name = self._lookup(key)
+        if fresh:
+            return name
+        try:
+            cache = genai_caching.CachedContent.create(
+                model=key[0], system_instruction=prefix, ttl=timedelta(seconds=self.ttl)
+            )
+            # Stop using a cache shortly before the provider expires it.
+            entry = (cache.name, time.time() + self.ttl * 0.9)
+            outcome = "created"
+        except Exception:
+            entry = (None, time.time() + self.retry_after)
+            outcome = "failures"
+        with self._lock:
+            # Expired entries are never read again; drop them so the table only holds live caches.
+            now = time.time()
+            for expired in [k for k, (_, expires) in self._entries.items() if expires <= now]:
+                del self._entries[expired]
+            self._entries[key] = entry
+            setattr(self, outcome, getattr(self, outcome) + 1)
+        return entry[0]
+
+    def _cached_copy(self, model: BaseChatModel, names: Dict[int, Optional[str]]) -> Optional[BaseChatModel]:
+        if isinstance(model, ResilientChatModel):
+            inner = [self._cached_copy(m, names) for m in model.models]
+            return None if any(m is None for m in inner) else model.model_copy(update={"models": inner})
+        name = names.get(id(model))
+        return model.model_copy(update={"cached_content": name}) if name else None
+
+    def _keys(self, model: BaseChatModel, prefix: str) -> Dict[int, Tuple[str, str]]:
+        models = model.models if isinstance(model, ResilientChatModel) else [model]
+        prefix_id = digest(prefix)
+        return {id(m): (self._model_name(m), prefix_id) for m in models}
+
+    def cached_model(self, model: BaseChatModel, prefix: str) -> Optional[BaseChatModel]:
+        """
+        A copy of `model` (and of the models it wraps) bound to a context cache
+        holding `prefix` as system instruction, or None if that is not possible.
+        """
+        if not self.supports(model) or estimate_tokens(prefix) < self.min_tokens:
+            return None
+        names = {}
+        for model_id, key in self._keys(model, prefix).items():
+            fresh, name = self._lookup(key)
+            names[model_id] = name if fresh else self._flight.do(key, lambda key=key: self._create(key, prefix))
+        return self._cached_copy(model, names)
+
+    async def acached_model(self, model: BaseChatModel, prefix: str) -> Optional[BaseChatModel]:
+        if not self.supports(model) or estimate_tokens(prefix) < self.min_tokens:
+            return None
+        names = {}
+        for model_id, key in self._keys(model, prefix).items():
+            fresh, name = self._lookup(key)
+            if not fresh:
+                # Creation is a blocking network call.
+                name = await asyncio.to_thread(self._flight.do, key, lambda key=key: self._create(key, prefix))
+            names[model_id] = name
+        return self._cached_copy(model, names)
+
+    def invalidate(self, model: BaseChatModel, prefix: str):
+        """Drops the entries for `prefix`, e.g. after a cached call failed; they are re-created on next use."""
+        with self._lock:
+            self.fallbacks += 1
+            for key in self._keys(model, prefix).values():
+                self._entries.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled and genai_caching is not None,
+                "entries": sum(1 for name, _ in self._entries.values() if name),
+                "created": self.created,
+                "hits": self.hits,
+                "failures": self.failures,
+                "fallbacks": self.fallbacks,
+            }
+
+
+provider_prefix_cache = ProviderPrefixCache()
+
+
+def _split_prefix(prompt_value: PromptValue) -> Tuple[Optional[str], List[BaseMessage]]:
+    messages = prompt_value.to_messages()
+    if len(messages) > 1 and isinstance(messages[0], SystemMessage) and isinstance(messages[0].content, str):
+        return messages[0].content, messages[1:]
+    return None, messages
+
+
+def with_prefix_cache(model: BaseChatModel, cache: ProviderPrefixCache = provider_prefix_cache) -> Runnable:
+    """
+    `model`, taking a prefixed prompt. When the provider cache can hold the
+    prompt's system message, a copy of the model bound to that cache is called
+    with the remaining messages only. If the cached call fails, the entry is
+    dropped and the full prompt is sent. Returns `model` itself when the model
+    does not support explicit caching.
+    """
+    if not cache.supports(model):
+        return model
+
+    def invoke(prompt_value: PromptValue, config: RunnableConfig) -> BaseMessage:
+        prefix, rest = _split_prefix(prompt_value)
+        cached = cache.cached_model(model, prefix) if prefix else None
+        if cached is not None:
+            try:
+                return cached.invoke(rest, config)
+            except RequestAborted:
+                raise
+            except Exception:
+                cache.invalidate(model, prefix)
+        return model.invoke(prompt_value, config)
+
+    async def ainvoke(prompt_value: PromptValue, config: RunnableConfig) -> BaseMessage:
+        prefix, rest = _split_prefix(prompt_value)
+        cached = await cache.acached_model(model, prefix) if prefix else None
+        if cached is not None:
+            try:
+                return await cached.ainvoke(rest, config)
+            except RequestAborted:
+                raise
+            except Exception:
+                cache.invalidate(model, prefix)
+        return await model.ainvoke(prompt_value, config)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name="prefix_cached_model")
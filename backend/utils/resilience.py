@@ -0,0 +1,369 @@
+import asyncio
+import contextvars
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional, Sequence, Union
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableBinding, RunnableConfig, RunnableLambda
+from pydantic import Field, PrivateAttr, field_validator
+
+from utils.jsonrepair import parse_metrics
+from utils.tracing import WRAPPER_METADATA_KEY
+from utils.usage import RequestAborted
+
+# Stalled synchronous calls cannot be killed, only abandoned; they finish in this pool.
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_THREADS", "64")), thread_name_prefix="llm-call")
+# Abandoned calls allowed to occupy the pool. Beyond this, attempts run on the caller's
+# thread without hedging, bounded by the model's own request timeout, instead of
+# queueing behind stalled calls.
+MAX_ABANDONED_CALLS = int(os.getenv("LLM_MAX_ABANDONED", "16"))
+_abandoned = 0
+_abandoned_lock = threading.Lock()
+
+
+def _abandon(futures) -> None:
+    """Counts still-running futures as abandoned until they finish."""
+    global _abandoned
+
+    def done(_):
+        global _abandoned
+        with _abandoned_lock:
+            _abandoned -= 1
+
+    for future in futures:
+        with _abandoned_lock:
+            _abandoned += 1
+        future.add_done_callback(done)
+
+
+def _pool_saturated() -> bool:
+    with _abandoned_lock:
+        return _abandoned >= MAX_ABANDONED_CALLS
+
+REPAIR_TEMPLATE = """Fix the following model output so that it is valid JSON matching the schema below.
+Return only the JSON, with no code fences or comments.
+
+Schema:
+{format_instructions}
+
+Output to fix:
+{output}
+
+Parse error: {error}
+"""
+
+
+def model_name(model: BaseChatModel) -> str:
+    return str(getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__)
+
+
+class ResilientChatModel(BaseChatModel):
+    """
+    Chat model wrapper adding per-call deadlines, retries with jittered exponential
+    backoff, hedged requests and a fallback chain.
+
+    Each attempt has `timeout` seconds. Once a model has `hedge_min_samples`
+    latencies recorded, an attempt still running after the `hedge_quantile`
+    latency gets a second, identical request; whichever answers first wins.
+    After `retries` failed retries the next model in `models` is tried.
+    Wrapped models should have their own retries disabled and a request
+    timeout, so abandoned calls end and are not retried in the background
+    (see `utils.helpers.get_chat_model`).
+
+    Tools and structured output are bound to each underlying model at call time,
+    so `bind_tools` and `with_structured_output` work as with the wrapped model.
+    With `n` > 1 every attempt asks the wrapped model for `n` completions in one
+    request; the wrapped models need an `n` field (see `supports_n`).
+    The wrapper's own run is tagged in its metadata so usage is only counted for
+    the underlying calls, including retries and hedges.
+    """
+    models: List[BaseChatModel]
+    timeout: float = 60.0
+    retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    hedge: bool = True
+    hedge_quantile: float = 95.0
+    hedge_min_samples: int = 20
+    hedge_min_delay: float = 0.5
+    n: int = 1
+    metadata: Optional[Dict[str, Any]] = Field(default_factory=lambda: {WRAPPER_METADATA_KEY: True})
+
+    _latencies: Dict[str, Deque[float]] = PrivateAttr(default_factory=dict)
+    _stats: Dict[str, int] = PrivateAttr(default_factory=lambda: {
+        "calls": 0, "timeouts": 0, "errors": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "fallbacks": 0,
+        "inline_calls": 0,
+    })
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @field_validator("models")
+    @classmethod
+    def _check_models(cls, models: List[BaseChatModel]) -> List[BaseChatModel]:
+        if not models:
+            raise ValueError("ResilientChatModel needs at least one model")
+        return models
+
+    @classmethod
+    def from_env(cls, models: Sequence[BaseChatModel]) -> "ResilientChatModel":
+        """Policy from LLM_TIMEOUT, LLM_RETRIES and LLM_HEDGE (set to 0 to disable hedging)."""
+        return cls(
+            models=list(models),
+            timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+            retries=int(os.getenv("LLM_RETRIES", "2")),
+            hedge=os.getenv("LLM_HEDGE", "1") != "0",
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "resilient"
+
+    @property
+    def model_name(self) -> str:
+        return model_name(self.models[0])
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return getattr(self.models[0], "temperature", None)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "hedge_delays": {name: self._hedge_delay(name) for name in self._latencies}}
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[Union[str, dict]] = None, **kwargs):
+        return self.bind(bound_tools=list(tools), tool_choice=tool_choice, tool_kwargs=kwargs)
+
+    # ----- bookkeeping -----
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _record_latency(self, name: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(name, deque(maxlen=200)).append(seconds)
+
+    def _hedge_delay(self, name: str) -> Optional[float]:
+        """The `hedge_quantile` latency of the model, or None until enough calls were seen."""
+        samples = sorted(self._latencies.get(name, ()))
+        if not self.hedge or len(samples) < self.hedge_min_samples:
+            return None
+        rank = max(0, math.ceil(self.hedge_quantile / 100 * len(samples)) - 1)
+        return max(self.hedge_min_delay, samples[rank])
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(backoff_max, backoff_base * 2^attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _runnable(self, model: BaseChatModel, bound_tools=None, tool_choice=None, tool_kwargs=None, **kwargs) -> Runnable:
+        runnable = model.model_copy(update={"n": self.n}) if self.n > 1 and "n" in type(model).model_fields else model
+        if bound_tools:
+            runnable = model.bind_tools(bound_tools, tool_choice=tool_choice, **(tool_kwargs or {}))
+        return runnable.bind(**kwargs) if kwargs else runnable
+
+    # ----- sync -----
+    def _call(self, runnable: Runnable, name: str, messages: List[BaseMessage], config: RunnableConfig) -> List[ChatGeneration]:
+        start = time.perf_counter()
+        if self.n > 1:
+            # invoke() keeps only the first completion; generate() returns all n.
+            model, kwargs = (runnable.bound, runnable.kwargs) if isinstance(runnable, RunnableBinding) else (runnable, {})
+            generations = model.generate([messages], callbacks=config.get("callbacks"), **kwargs).generations[0]
+        else:
+            generations = [ChatGeneration(message=runnable.invoke(messages, config))]
+        self._record_latency(name, time.perf_counter() - start)
+        return generations
+
+    def _hedged(self, runnable: Runnable, name: str, messages: List[BaseMessage], config: RunnableConfig) -> List[ChatGeneration]:
+        def submit() -> Future:
+            # Each thread gets its own copy of the context so usage tracking follows the request.
+            return _executor.submit(contextvars.copy_context().run, self._call, runnable, name, messages, config)
+
+        if _pool_saturated():
+            self._count("inline_calls")
+            return self._call(runnable, name, messages, config)
+        deadline = time.monotonic() + self.timeout
+        pending = {submit()}
+        delay = self._hedge_delay(name)
+        if delay is not None and delay < self.timeout:
+            done, _ = wait(pending, timeout=delay)
+            if not done:
+                self._count("hedges")
+                pending.add(submit())
+        first = next(iter(pending))
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        self._count("hedge_wins")
+                    _abandon(pending)
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        _abandon(pending)
+        self._count("timeouts")
+        raise TimeoutError(f"{name} did not answer within {self.timeout}s")
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._count("calls")
+        config: RunnableConfig = {"callbacks": run_manager.get_child() if run_manager else None}
+        if stop:
+            kwargs["stop"] = stop
+        error: Optional[BaseException] = None
+        for index, model in enumerate(self.models):
+            if index:
+                self._count("fallbacks")
+            runnable, name = self._runnable(model, **kwargs), model_name(model)
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self._count("retries")
+                    time.sleep(self._backoff(attempt))
+                try:
+                    return ChatResult(generations=self._hedged(runnable, name, messages, config))
+                except RequestAborted:
+                    raise
+                except Exception as e:
+                    self._count("errors")
+                    error = e
+        raise error
+
+    # ----- async -----
+    async def _acall(self, runnable: Runnable, name: str, messages: List[BaseMessage], config: RunnableConfig) -> List[ChatGeneration]:
+        start = time.perf_counter()
+        if self.n > 1:
+            model, kwargs = (runnable.bound, runnable.kwargs) if isinstance(runnable, RunnableBinding) else (runnable, {})
+            generations = (await model.agenerate([messages], callbacks=config.get("callbacks"), **kwargs)).generations[0]
+        else:
+            generations = [ChatGeneration(message=await runnable.ainvoke(messages, config))]
+        self._record_latency(name, time.perf_counter() - start)
+        return generations
+
+    async def _ahedged(self, runnable: Runnable, name: str, messages: List[BaseMessage], config: RunnableConfig) -> List[ChatGeneration]:
+        deadline = time.monotonic() + self.timeout
+        first = asyncio.ensure_future(self._acall(runnable, name, messages, config))
+        pending = {first}
+        try:
+            delay = self._hedge_delay(name)
+            if delay is not None and delay < self.timeout:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    self._count("hedges")
+                    pending.add(asyncio.ensure_future(self._acall(runnable, name, messages, config)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not pending:
+                raise error
+            self._count("timeouts")
+            raise TimeoutError(f"{name} did not answer within {self.timeout}s")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._count("calls")
+        config: RunnableConfig = {"callbacks": run_manager.get_child() if run_manager else None}
+        if stop:
+            kwargs["stop"] = stop
+        error: Optional[BaseException] = None
+        for index, model in enumerate(self.models):
+            if index:
+                self._count("fallbacks")
+            runnable, name = self._runnable(model, **kwargs), model_name(model)
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self._count("retries")
+                    await asyncio.sleep(self._backoff(attempt))
+                try:
+                    return ChatResult(generations=await self._ahedged(runnable, name, messages, config))
+                except RequestAborted:
+                    raise
+                except Exception as e:
+                    self._count("errors")
+                    error = e
+        raise error
+
+
+def supports_n(model: BaseChatModel) -> bool:
+    """Whether `model` (and every model it wraps) can return several completions per request."""
+    if isinstance(model, ResilientChatModel):
+        return all(supports_n(m) for m in model.models)
+    return "n" in type(model).model_fields
+
+
+def repair_model(model: BaseChatModel) -> BaseChatModel:
+    """
+    The cheapest model available for repairs: the last fallback of a resilient
+    model, kept behind the same deadline and retries but without hedging.
+    """
+    if isinstance(model, ResilientChatModel):
+        return model.model_copy(update={"models": [model.models[-1]], "hedge": False})
+    return model
+
+
+def parse_with_repair(parser: BaseOutputParser, model: BaseChatModel) -> Runnable:
+    """
+    Parses a model message; if parsing fails, asks `model` once to fix the output
+    against the parser's format instructions instead of failing the node.
+    """
+    repair_chain = ChatPromptTemplate.from_template(REPAIR_TEMPLATE) | model | parser
+    schema = getattr(getattr(parser, "pydantic_object", None), "__name__", type(parser).__name__)
+
+    def parse(message: Union[AIMessage, str], config: RunnableConfig) -> Any:
+        text = message if isinstance(message, str) else str(message.content)
+        try:
+            return parser.parse(text)
+        except OutputParserException as e:
+            parse_metrics.record(schema, "llm_reasks")
+            return repair_chain.invoke(
+                {"format_instructions": parser.get_format_instructions(), "output": text, "error": str(e)}, config
+            )
+
+    async def aparse(message: Union[AIMessage, str], config: RunnableConfig) -> Any:
+        text = message if isinstance(message, str) else str(message.content)
+        try:
+            return parser.parse(text)
+        except OutputParserException as e:
+            parse_metrics.record(schema, "llm_reasks")
+            return await repair_chain.ainvoke(
+                {"format_instructions": parser.get_format_instructions(), "output": text, "error": str(e)}, config
+            )
+
+    return RunnableLambda(parse, afunc=aparse, name="parse_with_repair")
@@ -1,5 +1,5 @@
-from typing import List, Optional, Literal, Union, Any
-from pydantic import BaseModel, Field
+from typing import List, Dict, Optional, Literal, Union, Any
+from pydantic import BaseModel, Field, computed_field, model_validator
 
 class Code(BaseModel):
     prefix: str = Field(..., description="The description of the code")
@@ -45,6 +45,136 @@ class TestCodeEvaluation(BaseModel):
     areas_for_improvement: List[str] = Field(default_factory=list) 
     other_suggestions: List[str] = Field(default_factory=list)
 
+class RetrievalConfig(BaseModel):
+    k: int = 4
+    score_threshold: Optional[float] = None
+    mmr: bool = False
+    fetch_k: int = 20
+    lambda_mult: float = Field(0.5, ge=0.0, le=1.0, description="MMR diversity: 0 is most diverse, 1 is most relevant")
+    filter: Dict[str, Any] = Field(default_factory=dict, description="Metadata pre-filter, e.g. {'source': 'docs.pdf'}")
+    filter_by_framework: bool = True
+    version: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _check_threshold(self):
+        # The MMR search has no score threshold; reject rather than silently ignore it.
+        if self.mmr and self.score_threshold is not None:
+            raise ValueError("score_threshold cannot be combined with mmr")
+        return self
+
+    @property
+    def search_type(self) -> str:
+        if self.mmr:
+            return "mmr"
+        if self.score_threshold is not None:
+            return "similarity_score_threshold"
+        return "similarity"
+
+    def search_kwargs(self, framework: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Builds the retriever search kwargs, combining the metadata filters into a Chroma `where` clause.
+        """
+        kwargs: Dict[str, Any] = {"k": self.k}
+        if self.mmr:
+            kwargs.update(fetch_k=max(self.fetch_k, self.k), lambda_mult=self.lambda_mult)
+        elif self.score_threshold is not None:
+            kwargs["score_threshold"] = self.score_threshold
+        conditions = dict(self.filter)
+        if framework and self.filter_by_framework:
+            conditions.setdefault("framework", framework)
+        if self.version:
+            conditions.setdefault("version", self.version)
+        if len(conditions) == 1:
+            kwargs["filter"] = conditions
+        elif conditions:
+            kwargs["filter"] = {"$and": [{key: value} for key, value in conditions.items()]}
+        return kwargs
+
+class CodeCheck(BaseModel):
+    """Local validation of a generated Code candidate, see utils.codecheck."""
+    syntax_ok: bool
+    missing_imports: List[str] = Field(default_factory=list)
+    smoke_ok: Optional[bool] = None
+    error: Optional[str] = None
+
+    @property
+    def imports_ok(self) -> bool:
+        return not self.missing_imports
+
+    @property
+    def ok(self) -> bool:
+        """
+        Parses and the smoke run (if enabled) did not fail. Imports are checked
+        against this server's environment, not the user's, so they only rank.
+        """
+        return self.syntax_ok and self.smoke_ok is not False
+
+    @property
+    def rank(self) -> tuple:
+        """Higher is better: parses, then imports resolve, then the smoke run passes (or was skipped)."""
+        return (self.syntax_ok, self.imports_ok, self.smoke_ok is not False, self.smoke_ok is True)
+
 class FlowStep(BaseModel):
     step: str
-    agent: str 
\ No newline at end of file
+    agent: str
+    duration_ms: Optional[float] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+class UsageStats(BaseModel):
+    calls: int = 0
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+    latency_ms: float = 0.0
+    cost_usd: float = 0.0
+
+class UsageReport(BaseModel):
+    total: UsageStats = Field(default_factory=UsageStats)
+    by_agent: Dict[str, UsageStats] = Field(default_factory=dict)
+    by_node: Dict[str, UsageStats] = Field(default_factory=dict)
+    token_budget: Optional[int] = None
+    budget_exceeded: bool = False
+
+JobKind = Literal["chat", "testgen"]
+JobStatus = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+
+class Job(BaseModel):
+    id: str
+    kind: JobKind = "chat"
+    input: str
+    # Request options, applied as for /chat when the job runs.
+    framework: Optional[str] = None
+    tenant: Optional[str] = None
+    retrieval: Optional[RetrievalConfig] = None
+    token_budget: Optional[int] = None
+    status: JobStatus = "queued"
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @computed_field
+    @property
+    def queue_time(self) -> Optional[float]:
+        """Seconds spent waiting for a worker."""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.created_at
+
+    @computed_field
+    @property
+    def run_time(self) -> Optional[float]:
+        """Seconds spent executing the graph."""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    @computed_field
+    @property
+    def wait_time(self) -> Optional[float]:
+        """Total seconds from submission to completion."""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.created_at 
\ No newline at end of file
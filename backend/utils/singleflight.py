@@ -0,0 +1,175 @@
+import asyncio
+import copy
+import hashlib
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from utils.usage import RequestAborted, capture_usage, replay_usage
+
+# Set SINGLE_FLIGHT=1 to coalesce identical in-flight LLM and retrieval calls.
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "0") == "1"
+
+
+def digest(*parts: Any) -> str:
+    """Short stable key for possibly large call inputs such as rendered prompts."""
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: the first caller for a key runs the call
+    and every caller arriving before it finishes receives (a copy of) the same
+    result or exception. Works for threads (`do`) and coroutines (`ado`).
+
+    The LLM usage of the shared call is recorded against every caller's usage
+    tracker. If the leader fails with a `RequestAborted` error (its own token
+    budget or cancellation), followers run the call themselves instead.
+
+    Attributes:
+        name: Name reported in the metrics.
+        calls: Number of calls requested.
+        saved: Number of calls served by another caller's in-flight call.
+    """
+    def __init__(self, name: str, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self.calls = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+        self._sync: Dict[Hashable, Future] = {}
+        self._async: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return fn()
+        with self._lock:
+            self.calls += 1
+            future = self._sync.get(key)
+            leader = future is None
+            if leader:
+                future = self._sync[key] = Future()
+            else:
+                self.saved += 1
+        if not leader:
+            try:
+                result, events = future.result()
+            except RequestAborted:
+                return self._own_call(fn)
+            replay_usage(events)
+            return copy.deepcopy(result)
+        try:
+            with capture_usage() as events:
+                result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result((result, events))
+            return result
+        finally:
+            with self._lock:
+                self._sync.pop(key, None)
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await fn()
+        loop_key = (id(asyncio.get_running_loop()), key)
+        while True:
+            with self._lock:
+                self.calls += 1
+                future = self._async.get(loop_key)
+                leader = future is None
+                if leader:
+                    future = self._async[loop_key] = asyncio.get_running_loop().create_future()
+                else:
+                    self.saved += 1
+            if leader:
+                break
+            try:
+                result, events = await asyncio.shield(future)
+            except RequestAborted:
+                return await self._own_acall(fn)
+            except asyncio.CancelledError:
+                # The leader was cancelled (e.g. its client went away): run the call ourselves.
+                if not future.cancelled():
+                    raise
+                with self._lock:
+                    self.calls -= 1
+                    self.saved -= 1
+            else:
+                replay_usage(events)
+                return copy.deepcopy(result)
+        try:
+            with capture_usage() as events:
+                result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved so an unawaited future does not log a warning
+            raise
+        else:
+            future.set_result((result, events))
+            return result
+        finally:
+            with self._lock:
+                self._async.pop(loop_key, None)
+
+    def _own_call(self, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.saved -= 1
+        return fn()
+
+    async def _own_acall(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        with self._lock:
+            self.saved -= 1
+        return await fn()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "saved": self.saved,
+                "saved_ratio": self.saved / self.calls if self.calls else 0.0,
+                "in_flight": len(self._sync) + len(self._async),
+            }
+
+
+llm_flight = SingleFlight("llm")
+retrieval_flight = SingleFlight("retrieval")
+request_flight = SingleFlight("chat_request", enabled=os.getenv("COALESCE_CHAT_REQUESTS", "0") == "1")
+
+
+def coalescing_metrics() -> Dict[str, Any]:
+    """Calls requested and calls saved by coalescing, per flight group."""
+    return {flight.name: flight.snapshot() for flight in (llm_flight, retrieval_flight, request_flight)}
+
+
+def model_fingerprint(model: BaseChatModel) -> str:
+    """Identifies a chat model by class, model name and temperature."""
+    name = getattr(model, "model_name", None) or getattr(model, "model", None)
+    return f"{type(model).__name__}:{name}:{getattr(model, 'temperature', None)}"
+
+
+def single_flight(
+    runnable: Runnable,
+    key: Callable[[Any], Hashable],
+    flight: SingleFlight = llm_flight,
+    name: str = "single_flight",
+) -> Runnable:
+    """
+    Wraps a runnable so concurrent invocations whose `key(input)` is equal share one call.
+    """
+    def invoke(value: Any, config: RunnableConfig) -> Any:
+        return flight.do(key(value), lambda: runnable.invoke(value, config))
+
+    async def ainvoke(value: Any, config: RunnableConfig) -> Any:
+        return await flight.ado(key(value), lambda: runnable.ainvoke(value, config))
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=name)
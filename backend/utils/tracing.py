@@ -0,0 +1,254 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.outputs import LLMResult
+from langgraph.types import Command
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.trace import Span, Status, StatusCode
+
+tracer = trace.get_tracer("coder")
+
+# Token usage of the LLM calls made by the node currently executing, see `timed_step`.
+_step_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("step_usage", default=None)
+
+# Metadata flag of chat models that only wrap other models (see utils.resilience); their
+# usage is the sum of the wrapped calls, which are reported separately.
+WRAPPER_METADATA_KEY = "llm_wrapper"
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Writes finished spans as JSON lines to a local file for offline inspection.
+    """
+    def __init__(self, path: str = "traces.jsonl"):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = [json.dumps(json.loads(span.to_json())) for span in spans]
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def setup_tracing(service_name: str = "coder", exporter: Optional[str] = None) -> TracerProvider:
+    """
+    Configures the global tracer provider.
+
+    Args:
+        service_name: Value of the `service.name` resource attribute.
+        exporter: "console", "file", "otlp" or "none". Defaults to the
+                  OTEL_TRACES_EXPORTER environment variable, then "file".
+                  The file exporter writes to OTEL_TRACES_FILE (traces.jsonl).
+
+    Returns:
+        The configured TracerProvider.
+    """
+    exporter = exporter or os.getenv("OTEL_TRACES_EXPORTER", "file")
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    if exporter == "console":
+        provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+    elif exporter == "file":
+        provider.add_span_processor(BatchSpanProcessor(FileSpanExporter(os.getenv("OTEL_TRACES_FILE", "traces.jsonl"))))
+    elif exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    elif exporter != "none":
+        raise ValueError(f"Unsupported trace exporter: {exporter}")
+    trace.set_tracer_provider(provider)
+    return provider
+
+
+def token_usage(response: LLMResult) -> Dict[str, int]:
+    """
+    Extracts input/output token counts from an LLM result, looking at the
+    message usage metadata first and the provider's llm_output second.
+    `cached_input_tokens` are the input tokens read from a provider context cache.
+    """
+    input_tokens = output_tokens = cached_input_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+                cached_input_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+    if not input_tokens and not output_tokens and response.llm_output:
+        usage = response.llm_output.get("token_usage") or response.llm_output.get("usage_metadata") or {}
+        input_tokens = usage.get("prompt_tokens", usage.get("input_tokens", 0))
+        output_tokens = usage.get("completion_tokens", usage.get("output_tokens", 0))
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "cached_input_tokens": cached_input_tokens}
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler that opens an OpenTelemetry span for every
+    LangGraph node, LLM call and retriever query, nested by LangChain run ids.
+
+    Spans are parented explicitly through the run id map and never made current:
+    the handler is not run inline, so under `ainvoke`/`astream` its callbacks run
+    in other contexts and an attached context could not be detached. Spans opened
+    with the current context (Chroma queries, embeddings) nest under the
+    surrounding request span instead of the retriever span.
+    """
+    def __init__(self):
+        self._spans: Dict[UUID, Span] = {}
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+        self._wrappers: set = set()
+
+    def _parent_context(self, parent_run_id: Optional[UUID]):
+        while parent_run_id is not None:
+            if parent_run_id in self._spans:
+                return trace.set_span_in_context(self._spans[parent_run_id])
+            parent_run_id = self._parents.get(parent_run_id)
+        return None
+
+    def _start(self, name: str, run_id: UUID, parent_run_id: Optional[UUID], attributes: Dict[str, Any]) -> Span:
+        span = tracer.start_span(name, context=self._parent_context(parent_run_id), attributes=attributes)
+        self._spans[run_id] = span
+        return span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None):
+        self._parents.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(Status(StatusCode.ERROR, str(error)))
+        span.end()
+
+    # --- chains / graph nodes ---
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        self._parents[run_id] = parent_run_id
+        node = (metadata or {}).get("langgraph_node")
+        name = kwargs.get("name")
+        if node and node == name:
+            self._start(f"node.{node}", run_id, parent_run_id, {
+                "langgraph.node": node,
+                "langgraph.step": (metadata or {}).get("langgraph_step", -1),
+            })
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # --- LLM calls ---
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start_llm(serialized, run_id, parent_run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start_llm(serialized, run_id, parent_run_id, metadata)
+
+    def _start_llm(self, serialized, run_id, parent_run_id, metadata):
+        self._parents[run_id] = parent_run_id
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name", "llm")
+        wrapper = bool((metadata or {}).get(WRAPPER_METADATA_KEY))
+        if wrapper:
+            self._wrappers.add(run_id)
+        self._start("llm.call", run_id, parent_run_id, {
+            "llm.model": model,
+            "llm.wrapper": wrapper,
+            "langgraph.node": (metadata or {}).get("langgraph_node", ""),
+        })
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        usage = token_usage(response)
+        span = self._spans.get(run_id)
+        if span is not None:
+            span.set_attribute("llm.usage.input_tokens", usage["input_tokens"])
+            span.set_attribute("llm.usage.output_tokens", usage["output_tokens"])
+            span.set_attribute("llm.usage.cached_input_tokens", usage["cached_input_tokens"])
+        step_usage = _step_usage.get()
+        if step_usage is not None and run_id not in self._wrappers:
+            step_usage["input_tokens"] += usage["input_tokens"]
+            step_usage["output_tokens"] += usage["output_tokens"]
+        self._wrappers.discard(run_id)
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._wrappers.discard(run_id)
+        self._end(run_id, error)
+
+    # --- retrieval ---
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._parents[run_id] = parent_run_id
+        self._start("retriever.query", run_id, parent_run_id, {"retriever.query": query})
+
+    def on_retriever_end(self, documents: Sequence[Document], *, run_id, **kwargs):
+        span = self._spans.get(run_id)
+        if span is not None:
+            span.set_attribute("retriever.documents", len(documents))
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
+class TracedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings instance and records a span per embedding batch.
+    """
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with tracer.start_as_current_span("embeddings.batch", attributes={"embeddings.batch_size": len(texts)}):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with tracer.start_as_current_span("embeddings.query"):
+            return self.embeddings.embed_query(text)
+
+
+def _flow_steps(result: Any) -> List[Any]:
+    update = result.update if isinstance(result, Command) else result
+    if isinstance(update, dict):
+        return update.get("flow", [])
+    return []
+
+
+def timed_step(fn: Callable) -> Callable:
+    """
+    Decorates a graph node so the FlowSteps it returns carry its duration and
+    the tokens consumed by the LLM calls it made.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        usage = {"input_tokens": 0, "output_tokens": 0}
+        token = _step_usage.set(usage)
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            _step_usage.reset(token)
+        duration_ms = (time.perf_counter() - start) * 1000
+        for step in _flow_steps(result):
+            if step.duration_ms is None:
+                step.duration_ms = duration_ms
+                step.input_tokens = usage["input_tokens"]
+                step.output_tokens = usage["output_tokens"]
+        return result
+    return wrapper
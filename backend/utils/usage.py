@@ -0,0 +1,282 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from utils.schemas import UsageReport, UsageStats
+from utils.tracing import WRAPPER_METADATA_KEY, token_usage
+
+# USD per 1M (input, output) tokens.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+}
+
+# Fraction of the input price charged for input tokens read from a provider context cache.
+CACHED_INPUT_PRICE_RATIO = float(os.getenv("CACHED_INPUT_PRICE_RATIO", "0.25"))
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("TOKEN_BUDGET", "0")) or None
+
+
+def request_budget(requested: Optional[int] = None) -> Optional[int]:
+    """
+    The token budget of a request asking for `requested` tokens: a client can
+    lower the server's TOKEN_BUDGET but never raise or remove it.
+    """
+    if requested is None:
+        return DEFAULT_TOKEN_BUDGET
+    if DEFAULT_TOKEN_BUDGET is None:
+        return requested
+    return min(requested, DEFAULT_TOKEN_BUDGET)
+
+
+class RequestAborted(RuntimeError):
+    """
+    Base of errors that stop one request (its budget, its cancellation) and say
+    nothing about the call itself; coalesced callers of other requests retry.
+    """
+
+
+class TokenBudgetExceeded(RequestAborted):
+    """Raised before an LLM call when the request has used up its token budget."""
+
+
+class RequestCancelled(RequestAborted):
+    """Raised before an LLM call of a request that has been cancelled."""
+
+
+def model_cost(model: str, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
+    """Cost in USD; `cached_input_tokens` (included in `input_tokens`) are charged at the cached rate."""
+    name = model.split("/")[-1]
+    input_price, output_price = next(
+        (prices for prefix, prices in sorted(MODEL_PRICES.items(), key=lambda kv: -len(kv[0])) if name.startswith(prefix)),
+        (0.0, 0.0),
+    )
+    cached = min(cached_input_tokens, input_tokens)
+    billed_input = input_tokens - cached + cached * CACHED_INPUT_PRICE_RATIO
+    return (billed_input * input_price + output_tokens * output_price) / 1_000_000
+
+
+def _add(stats: UsageStats, input_tokens: int, output_tokens: int, latency_ms: float, cost_usd: float, cached_input_tokens: int = 0):
+    stats.calls += 1
+    stats.input_tokens += input_tokens
+    stats.cached_input_tokens += cached_input_tokens
+    stats.output_tokens += output_tokens
+    stats.latency_ms += latency_ms
+    stats.cost_usd += cost_usd
+
+
+class UsageTracker:
+    """
+    Accumulates token usage of a single request, broken down per agent and per node,
+    and enforces an optional token budget.
+    """
+    def __init__(self, token_budget: Optional[int] = None):
+        self.token_budget = token_budget
+        self.report = UsageReport(token_budget=token_budget)
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def record(self, agent: str, node: str, input_tokens: int, output_tokens: int, latency_ms: float, cost_usd: float,
+               cached_input_tokens: int = 0):
+        with self._lock:
+            for stats in (
+                self.report.total,
+                self.report.by_agent.setdefault(agent, UsageStats()),
+                self.report.by_node.setdefault(f"{agent}.{node}", UsageStats()),
+            ):
+                _add(stats, input_tokens, output_tokens, latency_ms, cost_usd, cached_input_tokens)
+
+    def cancel(self):
+        """Makes every later LLM call of the request raise RequestCancelled, in any thread."""
+        self.cancelled = True
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise RequestCancelled("Request was cancelled")
+
+    def check_budget(self):
+        total = self.report.total.input_tokens + self.report.total.output_tokens
+        if self.token_budget is not None and total >= self.token_budget:
+            self.report.budget_exceeded = True
+            raise TokenBudgetExceeded(f"Token budget of {self.token_budget} exhausted ({total} tokens used)")
+
+
+_current_tracker: ContextVar[Optional[UsageTracker]] = ContextVar("usage_tracker", default=None)
+
+# (agent, node, input_tokens, output_tokens, latency_ms, cost_usd, cached_input_tokens) of one call.
+UsageEvent = Tuple[str, str, int, int, float, float, int]
+_captured: ContextVar[Optional[List[UsageEvent]]] = ContextVar("captured_usage", default=None)
+
+
+@contextmanager
+def track_usage(token_budget: Optional[int] = DEFAULT_TOKEN_BUDGET) -> Iterator[UsageTracker]:
+    """
+    Collects the usage of every LLM call made inside the block into a new UsageTracker.
+    """
+    tracker = UsageTracker(token_budget)
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
+
+@contextmanager
+def capture_usage() -> Iterator[List[UsageEvent]]:
+    """
+    Collects the usage recorded inside the block (including nested captures), so
+    it can be attributed to other requests that shared the calls, see `replay_usage`.
+    """
+    events: List[UsageEvent] = []
+    outer = _captured.get()
+    token = _captured.set(events)
+    try:
+        yield events
+    finally:
+        _captured.reset(token)
+        if outer is not None:
+            outer.extend(events)
+
+
+def replay_usage(events: List[UsageEvent]):
+    """
+    Records usage captured in a call made by another request against the current
+    request's tracker (not the process-wide metrics, which counted it once).
+    """
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        for event in events:
+            tracker.record(*event)
+    captured = _captured.get()
+    if captured is not None:
+        captured.extend(events)
+
+
+class UsageMetrics:
+    """
+    Process-wide rolling aggregates of LLM usage, kept for `window` seconds.
+    """
+    def __init__(self, window: float = 3600.0):
+        self.window = window
+        self.lifetime = UsageStats()
+        self._events: Deque[Tuple[float, str, str, str, int, int, float, float, int]] = deque()
+        self._lock = threading.Lock()
+
+    def record(self, model: str, agent: str, node: str, input_tokens: int, output_tokens: int, latency_ms: float, cost_usd: float,
+               cached_input_tokens: int = 0):
+        now = time.time()
+        with self._lock:
+            _add(self.lifetime, input_tokens, output_tokens, latency_ms, cost_usd, cached_input_tokens)
+            self._events.append((now, model, agent, node, input_tokens, output_tokens, latency_ms, cost_usd, cached_input_tokens))
+            while self._events and self._events[0][0] < now - self.window:
+                self._events.popleft()
+
+    def snapshot(self, window: Optional[float] = None) -> Dict[str, Any]:
+        window = min(window or self.window, self.window)
+        since = time.time() - window
+        total, by_model, by_agent, by_node = UsageStats(), {}, {}, {}
+        with self._lock:
+            events = [event for event in self._events if event[0] >= since]
+        for _, model, agent, node, input_tokens, output_tokens, latency_ms, cost_usd, cached_input_tokens in events:
+            for stats in (
+                total,
+                by_model.setdefault(model, UsageStats()),
+                by_agent.setdefault(agent, UsageStats()),
+                by_node.setdefault(f"{agent}.{node}", UsageStats()),
+            ):
+                _add(stats, input_tokens, output_tokens, latency_ms, cost_usd, cached_input_tokens)
+        return {
+            "window_seconds": window,
+            "total": total.model_dump(),
+            "by_model": {k: v.model_dump() for k, v in by_model.items()},
+            "by_agent": {k: v.model_dump() for k, v in by_agent.items()},
+            "by_node": {k: v.model_dump() for k, v in by_node.items()},
+            "lifetime": self.lifetime.model_dump(),
+        }
+
+
+usage_metrics = UsageMetrics()
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    Records token usage, call count and latency of every LLM call into the
+    current request's UsageTracker and the process-wide UsageMetrics.
+
+    A single shared instance is attached to every chain; LangChain de-duplicates
+    handlers, so it is safe to also pass it in the run config.
+
+    Calls that are cancelled or abandoned may never report an end or an error,
+    so started calls are tracked in start order and dropped once they are older
+    than `max_run_age` seconds or more than `max_runs` are pending.
+    """
+    raise_error = True
+    run_inline = True
+
+    def __init__(self, metrics: UsageMetrics, max_runs: int = 4096, max_run_age: float = 3600.0):
+        self.metrics = metrics
+        self.max_runs = max_runs
+        self.max_run_age = max_run_age
+        self._runs: "OrderedDict[UUID, Tuple[float, str, str, str]]" = OrderedDict()
+        self._runs_lock = threading.Lock()
+
+    def _start(self, serialized, run_id: UUID, metadata: Optional[Dict[str, Any]]):
+        tracker = _current_tracker.get()
+        if tracker is not None:
+            tracker.check_cancelled()
+            tracker.check_budget()
+        metadata = metadata or {}
+        if metadata.get(WRAPPER_METADATA_KEY):
+            # Only the wrapped calls (retries, hedges and fallbacks included) are recorded.
+            return
+        namespace = metadata.get("langgraph_checkpoint_ns", "")
+        node = metadata.get("langgraph_node", "unknown")
+        agent = namespace.split("|")[0].split(":")[0] if namespace else node
+        model = metadata.get("ls_model_name") or (serialized or {}).get("kwargs", {}).get("model", "unknown")
+        now = time.perf_counter()
+        with self._runs_lock:
+            self._runs[run_id] = (now, model, agent, node)
+            while self._runs and (
+                len(self._runs) > self.max_runs or next(iter(self._runs.values()))[0] < now - self.max_run_age
+            ):
+                self._runs.popitem(last=False)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(serialized, run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(serialized, run_id, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        with self._runs_lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, model, agent, node = run
+        latency_ms = (time.perf_counter() - start) * 1000
+        usage = token_usage(response)
+        cost = model_cost(model, usage["input_tokens"], usage["output_tokens"], usage["cached_input_tokens"])
+        self.metrics.record(model, agent, node, usage["input_tokens"], usage["output_tokens"], latency_ms, cost, usage["cached_input_tokens"])
+        tracker = _current_tracker.get()
+        if tracker is not None:
+            tracker.record(agent, node, usage["input_tokens"], usage["output_tokens"], latency_ms, cost, usage["cached_input_tokens"])
+        captured = _captured.get()
+        if captured is not None:
+            captured.append((agent, node, usage["input_tokens"], usage["output_tokens"], latency_ms, cost, usage["cached_input_tokens"]))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._runs_lock:
+            self._runs.pop(run_id, None)
+
+
+usage_handler = UsageCallbackHandler(usage_metrics)